@@ -0,0 +1,167 @@
+"""
+Bulk guest freeze for the program. Preparing a pool of parent VMs for instant cloning means running the same guest
+operations on every one of them: make a temporary directory, upload the freeze script, make it executable and start
+it. Here that sequence runs on many VMs at once over the session pool, the uploads share one keep-alive HTTPS
+connection pool, and every started script is followed with ListProcessesInGuest until it exits or the VM freezes.
+
+-=baka0taku=-
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Event
+from time import monotonic
+from typing import NamedTuple
+from pyVmomi import vim
+from DataTree import DataTree
+from FuncLib import run_guest_script
+from SessionPool import pool_sessions, pooled_call
+from TaskTracker import error_text
+
+# VMs worked on at the same time
+DEFAULT_WORKERS = 8
+
+# seconds a started script is followed before giving up on it
+DEFAULT_TRACK_SECONDS = 120
+
+# seconds between two ListProcessesInGuest calls for the same VM
+POLL_SECONDS = 5
+
+# freeze scripts by name, as (file name, content)
+FREEZE_SCRIPTS = {
+    'Windows Restart Script': (
+        'freeze.bat',
+        r'"C:\Program Files\VMware\VMware Tools\rpctool.exe" "instantclone.freeze" && shutdown /r /t 001'),
+    'Windows Fast Script': (
+        'fast-freeze.ps1',
+        r'cd "C:\Program Files\VMware\VMware Tools"; .\rpctool.exe "instantclone.freeze"; ping 127.0.0.1; '
+        r'Get-NetAdapter | Enable-NetAdapter; shutdown /l > output'),
+    'Linux/BSD Restart Script': (
+        'freeze.sh',
+        r'vmware-rpctool "instantclone.freeze" && init 6')
+}
+
+
+class FreezeResult(NamedTuple):
+    """
+    Outcome of the freeze of one VM. state is 'frozen', 'exited', 'running' or 'failed'.
+    """
+    vm: str
+    ok: bool
+    state: str
+    pid: int
+    exit_code: int
+    seconds: float
+    error: str
+
+
+# counts of the results by state
+def summarize(results: list) -> dict:
+    summary = {'total': len(results), 'ok': sum(1 for result in results if result.ok)}
+    for result in results:
+        summary[result.state] = summary.get(result.state, 0) + 1
+    return summary
+
+
+class BulkFreeze:
+    """
+    Runs a freeze script on many VMs with at most workers of them in progress at once. on_result is called from the
+    worker threads with each FreezeResult as it is known. stop() lets the VMs in progress finish and skips the rest.
+    """
+
+    def __init__(self, data: DataTree, user: str, password: str, script_type: str, workers: int = None,
+                 track_seconds: float = DEFAULT_TRACK_SECONDS, on_result=None) -> None:
+        self.data = data
+        self.creds = vim.vm.guest.NamePasswordAuthentication(username=user, password=password)
+        self.script_type = script_type
+        self.file_name, self.file_content = FREEZE_SCRIPTS[script_type]
+        # one VM per pooled session, without a pool the calls share the main connections and the default still
+        # overlaps the uploads
+        pooled = any(source.pool is not None for source in data.sources.values())
+        self.workers = workers or (pool_sessions(data) if pooled else DEFAULT_WORKERS)
+        self.track_seconds = track_seconds
+        self.on_result = on_result
+        self.stopped = Event()
+        self.http = None
+
+    # one keep-alive HTTPS session for every upload, sized so no worker waits for a connection
+    def open_http(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+        http = requests.Session()
+        http.verify = False
+        adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+        http.mount('https://', adapter)
+        http.mount('http://', adapter)
+        return http
+
+    # upload and start the script on one VM, runs on a pooled session with the managers bound to it
+    def start_script(self, vm: vim.VirtualMachine, file_manager: vim.vm.guest.FileManager,
+                     process_manager: vim.vm.guest.ProcessManager) -> int:
+        return run_guest_script(file_manager=file_manager, process_manager=process_manager, vm=vm, creds=self.creds,
+                                script_type=self.script_type, file_name=self.file_name,
+                                file_content=self.file_content, http=self.http)
+
+    # the guest process of a started script, None once the guest can no longer be asked
+    def process_of(self, vm: vim.VirtualMachine, process_manager: vim.vm.guest.ProcessManager, pid: int):
+        try:
+            processes = process_manager.ListProcessesInGuest(vm=vm, auth=self.creds, pids=[pid])
+        except (vim.fault.GuestOperationsUnavailable, vim.fault.InvalidState, vim.fault.InvalidPowerState):
+            return None
+        return processes[0] if processes else None
+
+    @staticmethod
+    def is_frozen(vm: vim.VirtualMachine) -> bool:
+        return bool(vm.runtime.instantCloneFrozen)
+
+    # freeze one VM and follow its script, never raises
+    def freeze_one(self, vm: vim.VirtualMachine) -> FreezeResult:
+        name = self.data.real_name(vm) or vm._moId
+        started = monotonic()
+        try:
+            guest_ops = self.data.content_of(vm).guestOperationsManager
+            file_manager = guest_ops.fileManager
+            process_manager = guest_ops.processManager
+            pid = pooled_call(self.data, self.start_script, vm, file_manager, process_manager)
+        except Exception as e:
+            return FreezeResult(name, False, 'failed', 0, None, monotonic() - started, error_text(e))
+        # a frozen VM stops answering guest operations, so the script rarely gets to exit
+        while monotonic() - started < self.track_seconds and not self.stopped.is_set():
+            self.stopped.wait(POLL_SECONDS)
+            try:
+                process = pooled_call(self.data, self.process_of, vm, process_manager, pid)
+                if process is None or process.endTime is None:
+                    if pooled_call(self.data, self.is_frozen, vm):
+                        return FreezeResult(name, True, 'frozen', pid, None, monotonic() - started, None)
+                    continue
+            except Exception as e:
+                return FreezeResult(name, False, 'failed', pid, None, monotonic() - started, error_text(e))
+            error = None if process.exitCode == 0 else 'Script exited with ' + str(process.exitCode) + '.'
+            return FreezeResult(name, error is None, 'exited', pid, process.exitCode, monotonic() - started, error)
+        return FreezeResult(name, False, 'running', pid, None, monotonic() - started,
+                            'Not frozen after ' + str(round(monotonic() - started)) + ' seconds.')
+
+    def run_one(self, vm: vim.VirtualMachine) -> FreezeResult:
+        if self.stopped.is_set():
+            result = FreezeResult(self.data.real_name(vm) or vm._moId, False, 'failed', 0, None, 0.0, 'Stopped.')
+        else:
+            result = self.freeze_one(vm)
+        if self.on_result is not None:
+            self.on_result(result)
+        return result
+
+    # freeze every VM, returns the results in VM order
+    def run(self, vms: list) -> list:
+        self.http = self.open_http()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = {executor.submit(self.run_one, vm): index for index, vm in enumerate(vms)}
+                results = [None] * len(vms)
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+        finally:
+            self.http.close()
+            self.http = None
+        return results
+
+    def stop(self) -> None:
+        self.stopped.set()
+        return
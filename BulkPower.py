@@ -0,0 +1,266 @@
+"""
+Bulk power operations for the program. A pre-flight collection reads the power state, tools state and the way up to
+the datacenter of a whole selection of VMs in one paged PropertyCollector call per vCenter. Power-on then goes out as
+one Datacenter.PowerOnMultiVM_Task per datacenter so DRS places the VMs together, and the other operations fan out
+over the session pool.
+
+-=baka0taku=-
+"""
+from concurrent.futures import as_completed
+from typing import NamedTuple
+from pyVmomi import vim, vmodl
+from DataTree import DataTree
+from Inventory import props_to_dict, retrieve_objects
+from SessionPool import pooled_map
+from TaskTracker import error_text, watch_task, watch_tasks
+
+# VM properties read by the pre-flight
+PREFLIGHT_PROPERTIES = ['runtime.powerState', 'guest.toolsRunningStatus', 'config.template', 'parent',
+                        'resourcePool']
+
+# bulk actions and their labels
+ACTIONS = {
+    'on': 'Power On',
+    'off': 'Power Off',
+    'reset': 'Reset',
+    'shutdown': 'Shutdown Guest',
+    'reboot': 'Reboot Guest'
+}
+
+# actions that start a task, the others are guest operations that return at once
+TASK_ACTIONS = {
+    'off': lambda vm: vm.PowerOffVM_Task(),
+    'reset': lambda vm: vm.ResetVM_Task()
+}
+GUEST_ACTIONS = {
+    'shutdown': lambda vm: vm.ShutdownGuest(),
+    'reboot': lambda vm: vm.RebootGuest()
+}
+
+
+class PowerInfo(NamedTuple):
+    """
+    Pre-flight state of one VM. datacenter is None when it could not be found.
+    """
+    vm: vim.VirtualMachine
+    name: str
+    power: str
+    tools: str
+    template: bool
+    datacenter: vim.Datacenter
+
+
+class PowerResult(NamedTuple):
+    """
+    Outcome of a bulk action on one VM. state is 'done', 'sent', 'skipped' or 'failed'.
+    """
+    vm: str
+    ok: bool
+    state: str
+    error: str
+
+
+# traversal specs from a VM up through folders, resource pools and clusters to its datacenter
+def build_parent_specs() -> list:
+    traversal_spec = vmodl.query.PropertyCollector.TraversalSpec
+    selection_spec = vmodl.query.PropertyCollector.SelectionSpec
+    to_folder = selection_spec(name='folderParent')
+    to_pool = selection_spec(name='poolParent')
+    to_cluster = selection_spec(name='crParent')
+    return [
+        traversal_spec(name='vmParent', type=vim.VirtualMachine, path='parent', skip=False, selectSet=[to_folder]),
+        traversal_spec(name='vmPool', type=vim.VirtualMachine, path='resourcePool', skip=False,
+                       selectSet=[to_pool]),
+        traversal_spec(name='folderParent', type=vim.Folder, path='parent', skip=False, selectSet=[to_folder]),
+        traversal_spec(name='poolParent', type=vim.ResourcePool, path='parent', skip=False,
+                       selectSet=[to_pool, to_cluster, to_folder]),
+        traversal_spec(name='crParent', type=vim.ComputeResource, path='parent', skip=False, selectSet=[to_folder])
+    ]
+
+
+# why a VM is left out of an action, None when it is not
+def skip_reason(action: str, info: PowerInfo) -> str:
+    if action == 'on':
+        if info.template:
+            return 'Templates cannot be powered on.'
+        if info.power == 'poweredOn':
+            return 'Already powered on.'
+    elif action == 'off':
+        if info.power == 'poweredOff':
+            return 'Already powered off.'
+    elif info.power != 'poweredOn':
+        return 'Not powered on.'
+    elif action in GUEST_ACTIONS and info.tools != 'guestToolsRunning':
+        return 'VMware Tools not running.'
+    return None
+
+
+class BulkPower:
+    """
+    Power operations on a selection of VMs. Call preflight() once, then run() one of the ACTIONS. on_result is called
+    with every PowerResult as it is known, from whichever thread learned it.
+    """
+
+    def __init__(self, data: DataTree, vms: list, on_result=None) -> None:
+        self.data = data
+        self.vms = vms
+        self.on_result = on_result
+        # object key -> PowerInfo
+        self.infos = dict()
+
+    # read the state of every VM in one collection per vCenter, returns the number of VMs found
+    def preflight(self) -> int:
+        specs = build_parent_specs()
+        prop_set = [
+            vmodl.query.PropertyCollector.PropertySpec(type=vim.VirtualMachine, all=False,
+                                                       pathSet=PREFLIGHT_PROPERTIES),
+            vmodl.query.PropertyCollector.PropertySpec(type=vim.Folder, all=False, pathSet=['parent']),
+            vmodl.query.PropertyCollector.PropertySpec(type=vim.ResourcePool, all=False, pathSet=['parent']),
+            vmodl.query.PropertyCollector.PropertySpec(type=vim.ComputeResource, all=False, pathSet=['parent'])
+        ]
+        self.infos = dict()
+        for source, source_vms in self.data.group_by_source(self.vms).items():
+            filter_spec = vmodl.query.PropertyCollector.FilterSpec()
+            filter_spec.objectSet = [vmodl.query.PropertyCollector.ObjectSpec(obj=vm, skip=False, selectSet=specs)
+                                     for vm in source_vms]
+            filter_spec.propSet = prop_set
+            vm_props = dict()
+            parents = dict()
+            for obj_content in retrieve_objects(source.content.propertyCollector, [filter_spec]):
+                props = props_to_dict(obj_content)
+                key = self.data.key_of(obj_content.obj)
+                if isinstance(obj_content.obj, vim.VirtualMachine):
+                    vm_props[key] = (obj_content.obj, props)
+                else:
+                    parents[key] = props.get('parent')
+            for key, (vm, props) in vm_props.items():
+                self.infos[key] = PowerInfo(vm=vm,
+                                            name=self.data.real_name(vm) or vm._moId,
+                                            power=str(props.get('runtime.powerState')),
+                                            tools=str(props.get('guest.toolsRunningStatus')),
+                                            template=bool(props.get('config.template')),
+                                            datacenter=self.datacenter_of(props, parents))
+        return len(self.infos)
+
+    # follow the collected parents of a VM up to its datacenter
+    def datacenter_of(self, props: dict, parents: dict) -> vim.Datacenter:
+        entity = props.get('parent') or props.get('resourcePool')
+        seen = set()
+        while entity is not None and not isinstance(entity, vim.Datacenter):
+            key = self.data.key_of(entity)
+            if key in seen:
+                return None
+            seen.add(key)
+            entity = parents.get(key)
+        return entity
+
+    # number of VMs in each power state
+    def counts(self) -> dict:
+        counts = dict()
+        for info in self.infos.values():
+            counts[info.power] = counts.get(info.power, 0) + 1
+        return counts
+
+    def report(self, result: PowerResult) -> PowerResult:
+        if self.on_result is not None:
+            self.on_result(result)
+        return result
+
+    # run an action on every VM of the pre-flight and wait for its tasks unless wait_tasks is False, returns the
+    # results
+    def run(self, action: str, wait_tasks: bool = True) -> list:
+        results = list()
+        todo = list()
+        for info in self.infos.values():
+            reason = skip_reason(action, info)
+            if reason is None:
+                todo.append(info)
+            else:
+                results.append(self.report(PowerResult(info.name, True, 'skipped', reason)))
+        if action == 'on':
+            results.extend(self.power_on(todo, wait_tasks))
+        else:
+            results.extend(self.fan_out(action, todo, wait_tasks))
+        return results
+
+    # one PowerOnMultiVM_Task per datacenter, DRS picks the hosts for the whole group
+    def power_on(self, infos: list, wait_tasks: bool) -> list:
+        results = list()
+        groups = dict()
+        for info in infos:
+            if info.datacenter is None:
+                results.append(self.report(PowerResult(info.name, False, 'failed', 'No datacenter found.')))
+                continue
+            groups.setdefault(self.data.key_of(info.datacenter), list()).append(info)
+        # fully automated placement so VMs in manual DRS clusters start instead of waiting for a recommendation
+        option = [vim.option.OptionValue(key='OverrideAutomationLevel', value='fullyAutomated')]
+        # send every datacenter's task before waiting on any of them
+        sent = list()
+        for group in groups.values():
+            try:
+                task = group[0].datacenter.PowerOnMultiVM_Task(vm=[info.vm for info in group], option=option)
+                sent.append((watch_task(task), group))
+            except vmodl.MethodFault as e:
+                results.extend(self.report(PowerResult(info.name, False, 'failed', error_text(e))) for info in group)
+        vm_tasks = list()
+        for future, group in sent:
+            error = future.exception()
+            if error is not None:
+                results.extend(self.report(PowerResult(info.name, False, 'failed', error_text(error)))
+                               for info in group)
+                continue
+            power_on_result = future.result()
+            by_key = {self.data.key_of(info.vm): info for info in group}
+            for attempted in power_on_result.attempted or []:
+                info = by_key.pop(self.data.key_of(attempted.vm), None)
+                if info is None:
+                    continue
+                if wait_tasks and attempted.task is not None:
+                    vm_tasks.append((attempted.task, info))
+                else:
+                    results.append(self.report(PowerResult(info.name, True, 'sent', None)))
+            for not_attempted in power_on_result.notAttempted or []:
+                info = by_key.pop(self.data.key_of(not_attempted.vm), None)
+                if info is not None:
+                    results.append(self.report(PowerResult(info.name, False, 'failed',
+                                                           error_text(not_attempted.fault))))
+            for info in by_key.values():
+                results.append(self.report(PowerResult(info.name, False, 'failed', 'Not placed by DRS.')))
+        # the power on tasks of every VM are watched with one list view change per connection
+        futures = watch_tasks([task for task, info in vm_tasks])
+        results.extend(self.collect({future: info for future, (task, info) in zip(futures, vm_tasks)}))
+        return results
+
+    # send an action to every VM at once over the session pool
+    def fan_out(self, action: str, infos: list, wait_tasks: bool) -> list:
+        results = list()
+        vm_futures = dict()
+        by_key = {self.data.key_of(info.vm): info for info in infos}
+
+        def send(vm):
+            if action in TASK_ACTIONS:
+                return watch_task(TASK_ACTIONS[action](vm))
+            GUEST_ACTIONS[action](vm)
+            return None
+        for vm, future, error in pooled_map(self.data, send, [info.vm for info in infos]):
+            info = by_key[self.data.key_of(vm)]
+            if error is not None:
+                results.append(self.report(PowerResult(info.name, False, 'failed', error_text(error))))
+            elif future is not None and wait_tasks:
+                vm_futures[future] = info
+            else:
+                results.append(self.report(PowerResult(info.name, True, 'sent' if future else 'done', None)))
+        results.extend(self.collect(vm_futures))
+        return results
+
+    # wait for the tasks of some VMs, futures maps task futures to PowerInfo
+    def collect(self, futures: dict) -> list:
+        results = list()
+        for future in as_completed(futures):
+            info = futures[future]
+            error = future.exception()
+            if error is None:
+                results.append(self.report(PowerResult(info.name, True, 'done', None)))
+            else:
+                results.append(self.report(PowerResult(info.name, False, 'failed', error_text(error))))
+        return results
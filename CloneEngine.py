@@ -0,0 +1,248 @@
+"""
+Bulk cloning for the program. Clone tasks are kept in flight concurrently instead of being sent one after another,
+with limits per host and per datastore so one ESXi host or LUN is not buried, deterministic clone names, retries for
+faults that are worth retrying and a throughput report at the end. With a SessionPool the tasks are sent over several
+sessions at once.
+
+-=baka0taku=-
+"""
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from math import ceil
+from queue import Empty, Queue
+from time import monotonic, sleep
+from typing import NamedTuple
+from pyVmomi import vim, vmodl
+from CloneSpec import (INSTANT_CLONE_TAG, LINKED_CLONE_TAG, clone_name, instant_clone_spec, linked_clone_spec,
+                       next_clone_names, release_clone_names)
+from DataTree import DataTree
+from SessionPool import pool_sessions, pooled_call
+from Stats import retrieve_properties
+from TaskTracker import error_text, watch_task
+
+DEFAULT_MAX_IN_FLIGHT = 16
+DEFAULT_PER_HOST = 4
+DEFAULT_PER_DATASTORE = 4
+DEFAULT_RETRIES = 2
+
+# first retry waits this many seconds, every further retry doubles it
+RETRY_DELAY = 2
+
+# faults that usually clear up on their own
+TRANSIENT_FAULTS = (
+    vim.fault.TaskInProgress,
+    vmodl.fault.HostCommunication,
+    vim.fault.ConcurrentAccess,
+    vim.fault.FileLocked
+)
+
+# parent properties needed to place and submit clones
+PARENT_PROPERTIES = [
+    'parent',
+    'runtime.host',
+    'runtime.powerState',
+    'datastore',
+    'snapshot.currentSnapshot'
+]
+
+
+class CloneReport(NamedTuple):
+    """
+    Outcome of a bulk clone run. Latencies are seconds from submitting a task to its completion.
+    """
+    requested: int
+    created: list
+    failed: list
+    retries: int
+    seconds: float
+    clones_per_minute: float
+    p50_latency: float
+    p95_latency: float
+
+
+class CloneJob:
+    """
+    One clone waiting to be sent, in flight, or waiting to be retried.
+    """
+
+    def __init__(self, parent: vim.VirtualMachine, props: dict, name: str, data: DataTree) -> None:
+        self.parent = parent
+        self.props = props
+        self.name = name
+        host = props.get('runtime.host')
+        self.host = None if host is None else data.key_of(host)
+        self.datastores = tuple(data.key_of(ds) for ds in props.get('datastore') or [])
+        self.attempt = 0
+        self.ready_at = 0.0
+        self.submitted_at = 0.0
+
+
+# nearest rank percentile of a list of numbers
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class BulkCloneEngine:
+    """
+    Sends linked or instant clone tasks for many parents with bounded concurrency. At most max_in_flight tasks run at
+    once, and no more than per_host / per_datastore of them touch the same host or datastore. on_result is called from
+    the run thread with (clone name, error or None) as each clone finishes.
+    """
+
+    def __init__(self, data: DataTree, clone_type: str = 'linked', max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                 per_host: int = DEFAULT_PER_HOST, per_datastore: int = DEFAULT_PER_DATASTORE,
+                 retries: int = DEFAULT_RETRIES, on_result=None) -> None:
+        self.data = data
+        self.clone_type = clone_type
+        self.max_in_flight = max_in_flight
+        self.per_host = per_host
+        self.per_datastore = per_datastore
+        self.retries = retries
+        self.on_result = on_result
+        self.host_load = Counter()
+        self.datastore_load = Counter()
+        self.in_flight = 0
+
+    # reason a parent cannot be cloned, None when it can
+    def check_parent(self, props: dict) -> str:
+        if props.get('runtime.host') is None:
+            return 'Parent not found.'
+        if self.clone_type == 'linked' and props.get('snapshot.currentSnapshot') is None:
+            return 'No Snapshot Found.'
+        if self.clone_type == 'instant' and str(props.get('runtime.powerState')) != 'poweredOn':
+            return 'Parent is not powered on.'
+        return None
+
+    # build the queue of clones, returns (jobs, failures). The clones of a parent that is not in the inventory fail
+    # under the names they would have had.
+    def plan(self, vm_names: list, num_of_clones: int) -> tuple:
+        tag = LINKED_CLONE_TAG if self.clone_type == 'linked' else INSTANT_CLONE_TAG
+        parents = [self.data.vmdict[name] for name in vm_names if name in self.data.vmdict]
+        props = retrieve_properties(self.data, parents, vim.VirtualMachine, PARENT_PROPERTIES)
+        jobs = deque()
+        failed = list()
+        for name in vm_names:
+            if name not in self.data.vmdict:
+                failed.extend((clone_name(name, tag, number), 'Parent not found.')
+                              for number in range(1, num_of_clones + 1))
+        for parent in parents:
+            parent_props = props.get(self.data.key_of(parent), dict())
+            names = next_clone_names(self.data.real_name(parent) or parent.name, tag, num_of_clones, self.data)
+            problem = self.check_parent(parent_props)
+            if problem is not None:
+                # the names are only reported, so later clones of the parent can still have them
+                release_clone_names(names)
+            for name in names:
+                if problem is None:
+                    jobs.append(CloneJob(parent, parent_props, name, self.data))
+                else:
+                    failed.append((name, problem))
+        return jobs, failed
+
+    # is there room for another task on the host and datastores of a job?
+    def has_room(self, job: CloneJob) -> bool:
+        if self.host_load[job.host] >= self.per_host:
+            return False
+        for ds in job.datastores:
+            if self.datastore_load[ds] >= self.per_datastore:
+                return False
+        return True
+
+    # count a job against its host and datastores, release with amount -1
+    def account(self, job: CloneJob, amount: int) -> None:
+        self.in_flight += amount
+        self.host_load[job.host] += amount
+        for ds in job.datastores:
+            self.datastore_load[ds] += amount
+        return
+
+    # send the clone task of a job on a pooled session, the finished job is put on results. A fault sending the task
+    # is put on results the same way as a task that failed.
+    def submit(self, job: CloneJob, results: Queue) -> None:
+        folder = job.props.get('parent')
+        job.submitted_at = monotonic()
+        try:
+            if self.clone_type == 'linked':
+                task = pooled_call(self.data, lambda parent, snapshot: parent.CloneVM_Task(
+                    folder, job.name, linked_clone_spec(snapshot)), job.parent, job.props['snapshot.currentSnapshot'])
+            else:
+                task = pooled_call(self.data, lambda parent: parent.InstantClone_Task(
+                    instant_clone_spec(job.name, folder)), job.parent)
+        except Exception as e:
+            results.put((job, e))
+            return
+        watch_task(task, lambda future: results.put((job, future.exception())))
+        return
+
+    # requeue a job for a transient fault, returns False when it has run out of retries
+    def retry(self, job: CloneJob, error: Exception, jobs: deque) -> bool:
+        if not isinstance(error, TRANSIENT_FAULTS) or job.attempt >= self.retries:
+            return False
+        job.attempt += 1
+        job.ready_at = monotonic() + RETRY_DELAY * 2 ** (job.attempt - 1)
+        jobs.append(job)
+        return True
+
+    # make num_of_clones clones of every named VM and report how it went
+    def run(self, vm_names: list, num_of_clones: int) -> CloneReport:
+        start = monotonic()
+        jobs, failed = self.plan(vm_names, num_of_clones)
+        requested = len(jobs) + len(failed)
+        results = Queue()
+        created = list()
+        latencies = list()
+        retries = 0
+        # tasks are sent from as many threads as there are pooled sessions, one after another without a pool
+        senders = ThreadPoolExecutor(max_workers=pool_sessions(self.data))
+        while jobs or self.in_flight:
+            # send everything that fits within the limits, keep the rest in order
+            now = monotonic()
+            waiting = deque()
+            while jobs and self.in_flight < self.max_in_flight:
+                job = jobs.popleft()
+                if job.ready_at > now or not self.has_room(job):
+                    waiting.append(job)
+                    continue
+                self.account(job, 1)
+                senders.submit(self.submit, job, results)
+            waiting.extend(jobs)
+            jobs = waiting
+            if self.in_flight == 0:
+                # only delayed retries are left
+                if jobs:
+                    sleep(max(0.0, min(job.ready_at for job in jobs) - monotonic()))
+                continue
+            # wake up for the next delayed retry, otherwise wait for a task to free up room
+            delayed = [job.ready_at for job in jobs if job.ready_at > now]
+            timeout = max(0.1, min(delayed) - monotonic()) if delayed else None
+            try:
+                job, error = results.get(timeout=timeout)
+            except Empty:
+                continue
+            self.account(job, -1)
+            if error is None:
+                created.append(job.name)
+                latencies.append(monotonic() - job.submitted_at)
+            elif self.retry(job, error, jobs):
+                retries += 1
+                continue
+            else:
+                failed.append((job.name, error_text(error)))
+            if self.on_result is not None:
+                self.on_result(job.name, error)
+        senders.shutdown()
+        seconds = monotonic() - start
+        return CloneReport(
+            requested=requested,
+            created=created,
+            failed=failed,
+            retries=retries,
+            seconds=seconds,
+            clones_per_minute=len(created) / seconds * 60 if seconds > 0 else 0.0,
+            p50_latency=percentile(latencies, 50),
+            p95_latency=percentile(latencies, 95)
+        )
@@ -0,0 +1,235 @@
+"""
+Clone garbage collection for the program. Linked and instant clones are named <parent>LC-<number> and
+<parent>IC-<number> and nothing removes them, so they pile up until every inventory load drags. The collector picks
+them out by name in one pass over the inventory, or over the search index when there is one, reads their power state,
+creation date, disks and storage in one collection per vCenter, sorts them into keep and collect by age, power state,
+parent and whether their disks still hang off a parent disk, and then powers off and destroys the collected ones a
+bounded number at a time. A dry run stops after the sorting and reports what would go, and it is what runs unless
+destroying is asked for.
+
+-=baka0taku=-
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from threading import Event
+from time import monotonic
+from typing import NamedTuple
+from pyVmomi import vim
+from CloneSpec import CLONE_NUMBER_DIGITS, INSTANT_CLONE_TAG, LINKED_CLONE_TAG
+from DataTree import DataTree
+from SessionPool import pooled_call
+from Stats import retrieve_properties
+from TaskTracker import error_text, watch_task
+
+# clones destroyed at the same time
+DEFAULT_WORKERS = 8
+
+# clones younger than this are kept
+DEFAULT_MIN_AGE_DAYS = 7
+
+# clone names as next_clone_names makes them, the parent is everything before the last tag so parents named like
+# clones still parse. Only the generated fixed width number matches, so a VM named "web-LC-1" by hand is not a clone.
+CLONE_REGEX = re.compile(r"^(?P<parent>.+)(?P<tag>" + LINKED_CLONE_TAG + '|' + INSTANT_CLONE_TAG +
+                         r")-(?P<number>\d{" + str(CLONE_NUMBER_DIGITS) + r"})$")
+
+# clone kinds by tag
+CLONE_KINDS = {
+    LINKED_CLONE_TAG: 'linked',
+    INSTANT_CLONE_TAG: 'instant'
+}
+
+# VM properties read for every clone
+CLONE_PROPERTIES = ['runtime.powerState', 'config.createDate', 'summary.storage.committed',
+                    'summary.storage.unshared', 'config.hardware.device']
+
+# column headings of a clone row
+CLONE_COLUMNS = ('VM', 'Kind', 'Parent', 'Power', 'Age (days)', 'Size (GB)', 'State')
+
+
+class CloneInfo(NamedTuple):
+    """
+    One clone found by the collector. child_disks is whether it has a disk backed by a parent disk, which every
+    linked and instant clone has and a promoted clone or a VM that only carries a clone's name does not. size is the
+    storage freed by destroying it, verdict is 'collect' or why it is kept.
+    """
+    vm: vim.VirtualMachine
+    name: str
+    kind: str
+    parent: str
+    parent_exists: bool
+    power: str
+    created: datetime
+    child_disks: bool
+    size: int
+    verdict: str
+
+    def age_days(self, now: datetime = None) -> float:
+        if self.created is None:
+            return 0.0
+        return ((now or datetime.now(timezone.utc)) - self.created).total_seconds() / 86400
+
+    def cells(self, state: str = None, now: datetime = None) -> list:
+        parent = self.parent if self.parent_exists else self.parent + ' (gone)'
+        age = '?' if self.created is None else str(round(self.age_days(now), 1))
+        return [self.name, self.kind, parent, self.power, age,
+                str(round(self.size / 1073741824, 2)), state or self.verdict]
+
+
+class GCResult(NamedTuple):
+    """
+    Outcome of collecting one clone. state is 'destroyed', 'dry run' or 'failed'.
+    """
+    vm: str
+    ok: bool
+    state: str
+    size: int
+    error: str
+
+
+# does a VM have a disk whose backing is a child of another disk
+def has_child_disks(devices: list) -> bool:
+    for device in devices or []:
+        if isinstance(device, vim.vm.device.VirtualDisk) and getattr(device.backing, 'parent', None) is not None:
+            return True
+    return False
+
+
+# names and clone tag parts of every clone in the inventory, as {name: match}
+def find_clone_names(data: DataTree, index=None) -> dict:
+    if index is not None:
+        # the index narrows thousands of names down to the few holding a tag before the regex runs
+        names = index.search(LINKED_CLONE_TAG.lower() + '-') | index.search(INSTANT_CLONE_TAG.lower() + '-')
+    else:
+        names = list(data.vmdict.keys())
+    found = dict()
+    for name in names:
+        vmobj = data.vmdict.get(name)
+        if vmobj is None:
+            continue
+        match = CLONE_REGEX.match(data.real_name(vmobj) or name)
+        if match:
+            found[name] = match
+    return found
+
+
+# totals of a collection, bytes only count clones that are gone
+def summarize(results: list) -> dict:
+    summary = {'total': len(results), 'ok': sum(1 for result in results if result.ok),
+               'reclaimed_bytes': sum(result.size for result in results if result.state == 'destroyed'),
+               'reclaimable_bytes': sum(result.size for result in results if result.state == 'dry run')}
+    for result in results:
+        summary[result.state] = summary.get(result.state, 0) + 1
+    return summary
+
+
+class CloneGC:
+    """
+    Finds the linked and instant clones of the inventory and destroys the ones that are old enough. Powered on clones
+    are kept unless include_powered_on is set, and parents limits the clones to those of the named parent VMs.
+    on_result is called from the worker threads with each GCResult as it is known.
+    """
+
+    def __init__(self, data: DataTree, min_age_days: float = DEFAULT_MIN_AGE_DAYS, include_powered_on: bool = False,
+                 parents: list = None, workers: int = DEFAULT_WORKERS, on_result=None) -> None:
+        self.data = data
+        self.min_age_days = min_age_days
+        self.include_powered_on = include_powered_on
+        self.parents = set(parents) if parents else None
+        self.workers = workers
+        self.on_result = on_result
+        self.stopped = Event()
+        self.seconds = 0.0
+
+    # why a clone is kept, 'collect' when it is not
+    def verdict(self, info: CloneInfo, now: datetime) -> str:
+        if self.parents is not None and info.parent not in self.parents:
+            return 'keep: other parent'
+        if not info.child_disks:
+            return 'keep: not a clone'
+        if info.created is None:
+            return 'keep: age unknown'
+        if info.age_days(now) < self.min_age_days:
+            return 'keep: too new'
+        if info.power == 'poweredOn' and not self.include_powered_on:
+            return 'keep: powered on'
+        return 'collect'
+
+    # is there a VM of the parent's name in the same vCenter
+    def parent_exists(self, parent: str, vmobj: vim.VirtualMachine) -> bool:
+        if parent in self.data.vmdict:
+            return True
+        source = self.data.source_of(vmobj)
+        return source is not None and parent + ' [' + source.fqdn + ']' in self.data.vmdict
+
+    # find and classify every clone, returns the CloneInfos oldest first
+    def scan(self, index=None) -> list:
+        names = find_clone_names(self.data, index)
+        vms = [self.data.vmdict[name] for name in names]
+        props = retrieve_properties(self.data, vms, vim.VirtualMachine, CLONE_PROPERTIES)
+        now = datetime.now(timezone.utc)
+        infos = list()
+        for name, match in names.items():
+            vmobj = self.data.vmdict[name]
+            vm_props = props.get(self.data.key_of(vmobj))
+            if vm_props is None:
+                # destroyed since the inventory was loaded
+                continue
+            parent = match.group('parent')
+            # a linked clone shares its parent's base disk, only its own files come back
+            size = vm_props.get('summary.storage.unshared')
+            if size is None:
+                size = vm_props.get('summary.storage.committed') or 0
+            info = CloneInfo(vm=vmobj, name=name, kind=CLONE_KINDS[match.group('tag')], parent=parent,
+                             parent_exists=self.parent_exists(parent, vmobj),
+                             power=str(vm_props.get('runtime.powerState')), created=vm_props.get('config.createDate'),
+                             child_disks=has_child_disks(vm_props.get('config.hardware.device')), size=size,
+                             verdict='')
+            infos.append(info._replace(verdict=self.verdict(info, now)))
+        return sorted(infos, key=lambda info: info.created or now)
+
+    # power off and destroy one clone, runs on a pooled session with the VM bound to it. The disks and power state are
+    # read again first so a VM promoted or powered on since the scan is not destroyed.
+    @staticmethod
+    def destroy(vm: vim.VirtualMachine, include_powered_on: bool) -> None:
+        if not has_child_disks(vm.config.hardware.device):
+            raise ValueError('Not a clone any more, no disk has a parent disk.')
+        if vm.runtime.powerState == 'poweredOn':
+            if not include_powered_on:
+                raise ValueError('Powered on since the scan.')
+            watch_task(vm.PowerOffVM_Task()).result()
+        watch_task(vm.Destroy_Task()).result()
+        return
+
+    def collect_one(self, info: CloneInfo, dry_run: bool) -> GCResult:
+        if dry_run:
+            result = GCResult(info.name, True, 'dry run', info.size, None)
+        elif self.stopped.is_set():
+            result = GCResult(info.name, False, 'failed', info.size, 'Stopped.')
+        else:
+            try:
+                pooled_call(self.data, self.destroy, info.vm, self.include_powered_on)
+                result = GCResult(info.name, True, 'destroyed', info.size, None)
+            except Exception as e:
+                result = GCResult(info.name, False, 'failed', info.size, error_text(e))
+        if self.on_result is not None:
+            self.on_result(result)
+        return result
+
+    # destroy the clones marked collect, at most workers at a time, returns the results as they finished. Nothing is
+    # destroyed unless dry_run is False.
+    def run(self, infos: list, dry_run: bool = True) -> list:
+        started = monotonic()
+        todo = [info for info in infos if info.verdict == 'collect']
+        results = list()
+        if todo:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = [executor.submit(self.collect_one, info, dry_run) for info in todo]
+                for future in as_completed(futures):
+                    results.append(future.result())
+        self.seconds = monotonic() - started
+        return results
+
+    def stop(self) -> None:
+        self.stopped.set()
+        return
@@ -0,0 +1,70 @@
+"""
+Clone names and specs for the program. Single clones made by FuncLib and bulk clones made by CloneEngine share the
+same <parent><tag>-<number> names and the same specs, so they live here where both can import them without importing
+each other.
+
+-=baka0taku=-
+"""
+import re
+from threading import Lock
+from pyVmomi import vim
+from DataTree import DataTree
+
+# clone name tags, <parent><tag>-<number>
+LINKED_CLONE_TAG = 'LC'
+INSTANT_CLONE_TAG = 'IC'
+
+# digits of the number at the end of a clone name
+CLONE_NUMBER_DIGITS = 6
+
+# clone names handed out this session that may not have reached the inventory yet
+reserved_clone_names = set()
+clone_name_lock = Lock()
+
+
+# name of clone number of a parent
+def clone_name(parent_name: str, tag: str, number: int) -> str:
+    return parent_name + tag + '-' + str(number).zfill(CLONE_NUMBER_DIGITS)
+
+
+# get the next free clone names for a parent, numbered after the highest one already taken
+def next_clone_names(parent_name: str, tag: str, count: int = 1, data: DataTree = None) -> list:
+    if data is None:
+        data = DataTree.get_instance()
+    prefix = parent_name + tag + '-'
+    pattern = re.compile(re.escape(prefix) + r"(\d+)$")
+    with clone_name_lock:
+        highest = 0
+        for name in list(data.vmdict.keys()) + list(reserved_clone_names):
+            match = pattern.match(name)
+            if match:
+                highest = max(highest, int(match.group(1)))
+        names = [clone_name(parent_name, tag, highest + number) for number in range(1, count + 1)]
+        reserved_clone_names.update(names)
+    return names
+
+
+# hand back reserved clone names that will not be used after all
+def release_clone_names(names: list) -> None:
+    with clone_name_lock:
+        reserved_clone_names.difference_update(names)
+    return
+
+
+# build the spec for a linked clone of a snapshot
+def linked_clone_spec(snapshot: vim.vm.Snapshot) -> vim.VirtualMachineCloneSpec:
+    clonespec = vim.VirtualMachineCloneSpec()
+    clonespec.snapshot = snapshot
+    clonespec.location = vim.VirtualMachineRelocateSpec()
+    movetype = vim.VirtualMachineRelocateDiskMoveOptions()
+    clonespec.location.diskMoveType = movetype.createNewChildDiskBacking
+    return clonespec
+
+
+# build the spec for an instant clone placed next to its parent
+def instant_clone_spec(clonename: str, folder: vim.Folder) -> vim.VirtualMachineInstantCloneSpec:
+    inst_spec = vim.VirtualMachineInstantCloneSpec()
+    inst_spec.name = clonename
+    inst_spec.location = vim.VirtualMachineRelocateSpec()
+    inst_spec.location.folder = folder
+    return inst_spec
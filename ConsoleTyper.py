@@ -0,0 +1,143 @@
+"""
+Console typing for the program. Text is compiled into USB scan codes once, with {ctrl+alt+del} style chords mixed in,
+and sent to the VM console with PutUsbScanCodes in chunks small enough for vCenter to take in one call. The same text
+can be typed into many VMs at once over the session pool, and every run reports its speed in keys per second.
+
+-=baka0taku=-
+"""
+import re
+from functools import lru_cache
+from time import monotonic
+from typing import NamedTuple
+from pyVmomi import vim
+from DataTree import DataTree
+from FuncLib import USB_KEYCODES, key_combo, str_to_key_events
+from SessionPool import pooled_map
+from TaskTracker import error_text
+
+# key events per PutUsbScanCodes call, long strings in one call time out or are cut short by vCenter
+DEFAULT_CHUNK_KEYS = 64
+
+# chords in typed text, e.g. {ctrl+alt+del} or {enter}
+CHORD_REGEX = re.compile(r"\{([A-Za-z0-9]+(?:\+[A-Za-z0-9]+)*)\}")
+
+# chord key names that are not in USB_KEYCODES
+KEY_ALIASES = {
+    'enter': '\n',
+    'tab': '\t',
+    'space': ' ',
+    'escape': 'esc',
+    'delete': 'del',
+    'pageup': 'pgup',
+    'pagedown': 'pgdn'
+}
+
+# chord modifier names and the key_combo argument each one sets
+MODIFIERS = {
+    'ctrl': 'left_ctrl',
+    'alt': 'left_alt',
+    'shift': 'left_shift',
+    'gui': 'left_gui',
+    'win': 'left_gui'
+}
+
+
+class TypeResult(NamedTuple):
+    """
+    Outcome of typing into one VM.
+    """
+    vm: str
+    ok: bool
+    keys: int
+    calls: int
+    seconds: float
+    error: str
+
+    def keys_per_second(self) -> float:
+        return self.keys / self.seconds if self.seconds > 0 else 0.0
+
+
+# key event of one chord like "ctrl+alt+del"
+def chord_event(chord: str) -> vim.UsbScanCodeSpec.KeyEvent:
+    names = chord.split('+')
+    flags = {arg: False for arg in MODIFIERS.values()}
+    for name in names[:-1]:
+        if name.lower() not in MODIFIERS:
+            raise ValueError('Unknown modifier ' + repr(name) + ' in {' + chord + '}.')
+        flags[MODIFIERS[name.lower()]] = True
+    key = names[-1]
+    if key.lower() in MODIFIERS:
+        raise ValueError('Chord {' + chord + '} has no key.')
+    key = KEY_ALIASES.get(key.lower(), key)
+    # key names are matched as written, then as lower case (del, esc) and upper case (F1)
+    for name in (key, key.lower(), key.upper()):
+        if name in USB_KEYCODES:
+            key = name
+            break
+    return key_combo(normal_key=key, special_key='', **flags).keyEvents[0]
+
+
+# key events of text with chords, compiled once per distinct text. The events are shared, do not change them.
+@lru_cache(maxsize=64)
+def compile_text(text: str) -> tuple:
+    text = text.replace('\r\n', '\n')
+    key_events = list()
+    parts = CHORD_REGEX.split(text)
+    # split() puts the chords at the odd positions
+    for index, part in enumerate(parts):
+        if index % 2:
+            key_events.append(chord_event(part))
+        elif part:
+            key_events.extend(str_to_key_events(part))
+    return tuple(key_events)
+
+
+# split key events into specs of at most chunk_keys events
+def chunk_specs(key_events: tuple, chunk_keys: int = DEFAULT_CHUNK_KEYS) -> list:
+    return [vim.UsbScanCodeSpec(keyEvents=list(key_events[start:start + chunk_keys]))
+            for start in range(0, len(key_events), chunk_keys)]
+
+
+class ConsoleTyper:
+    """
+    Types one text into the consoles of many VMs. The text is compiled once, each VM gets its chunks over a session
+    of its vCenter's pool, and the VMs run side by side.
+    """
+
+    def __init__(self, data: DataTree, text: str, chunk_keys: int = DEFAULT_CHUNK_KEYS) -> None:
+        self.data = data
+        self.key_events = compile_text(text)
+        self.specs = chunk_specs(self.key_events, chunk_keys)
+        self.seconds = 0.0
+
+    # send every chunk to one VM, runs on a pooled session with the VM bound to it. Returns the keys vCenter took.
+    def type_into(self, vm: vim.VirtualMachine) -> int:
+        keys = 0
+        for spec in self.specs:
+            sent = vm.PutUsbScanCodes(spec)
+            keys += sent
+            if sent < len(spec.keyEvents):
+                raise IOError('Console took ' + str(keys) + ' of ' + str(len(self.key_events)) + ' keys.')
+        return keys
+
+    # type into every VM, returns a TypeResult per VM in VM order
+    def run(self, vms: list) -> list:
+        started = monotonic()
+
+        def timed(vm):
+            start = monotonic()
+            return self.type_into(vm), monotonic() - start
+        results = list()
+        for vm, result, error in pooled_map(self.data, timed, vms):
+            name = self.data.real_name(vm) or vm._moId
+            if error is not None:
+                results.append(TypeResult(name, False, 0, 0, 0.0, error_text(error)))
+            else:
+                results.append(TypeResult(name, True, result[0], len(self.specs), result[1], None))
+        self.seconds = monotonic() - started
+        return results
+
+    # keys typed per second over every VM
+    def keys_per_second(self, results: list) -> float:
+        keys = sum(result.keys for result in results)
+        return keys / self.seconds if self.seconds > 0 else 0.0
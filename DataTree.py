@@ -1,6 +1,38 @@
-from tkinter import Tk
+from __future__ import annotations
 
-from pyVmomi import vim
+from threading import RLock
+from typing import TYPE_CHECKING
+
+from pyVmomi import vim, vmodl
+
+if TYPE_CHECKING:
+    from tkinter import Tk
+
+
+class Source:
+    """
+    One vCenter the inventory comes from. Objects loaded from the cache are created with the placeholder as their
+    stub so they can be told apart from the objects of other vCenters before a connection exists.
+    """
+
+    def __init__(self, fqdn: str) -> None:
+        self.fqdn = fqdn
+        self.connection: vim.ServiceInstance
+        self.connection = None
+        self.content: vim.ServiceInstanceContent
+        self.content = None
+        self.instance_uuid: str
+        self.instance_uuid = None
+        # extra sessions for parallel bulk work, a SessionPool or None
+        self.pool = None
+        # InventorySync keeping the objects of this vCenter current, or None
+        self.sync = None
+        # EventWatcher dropping the stats the VM events of this vCenter make stale, or None
+        self.events = None
+        self.placeholder = object()
+
+    def __repr__(self) -> str:
+        return 'Source(' + self.fqdn + ')'
 
 
 class DataTree:
@@ -11,15 +43,25 @@ class DataTree:
     -=baka0taku=-
     """
     __instance__ = None
+    # inventory types and the dictionary each one is filed in
+    inventory_types = (
+        (vim.VirtualMachine, 'vmdict'),
+        (vim.HostSystem, 'hostdict'),
+        (vim.Datastore, 'datastoredict'),
+        (vim.DistributedVirtualSwitch, 'dvswitchdict'),
+        (vim.dvs.DistributedVirtualPortgroup, 'dvportgroupdict'),
+        (vim.Network, 'networkdict')
+    )
 
     def __init__(self) -> None:
         # constructor
         if DataTree.__instance__ is None:
             DataTree.__instance__ = self
-            self.connection: vim.ServiceInstance
-            self.connection = None
-            self.content: vim.ServiceInstanceContent
-            self.content = None
+            # vCenters by FQDN, and the Source behind every stub their objects can carry
+            self.sources = dict()
+            self.stub_sources = dict()
+            # the inventories of several vCenters are filed from their own threads
+            self.lock = RLock()
             self.rootwin: Tk
             self.rootwin = None
             self.vmobjlist: vim.view.ContainerView
@@ -38,6 +80,10 @@ class DataTree:
             self.dvswitchobjlist = None
             self.dvswitchdict = dict()
             self.dvportgroupdict = dict()
+            # object key (vCenter FQDN/MoRef ID) -> name of every object filed in the dictionaries above
+            self.moiddict = dict()
+            # object key -> searchable attributes (power state, host MoRef ID, guest OS) of VMs
+            self.attrdict = dict()
 
         else:
             raise Exception("THERE CAN BE ONLY ONE!!!!")
@@ -51,7 +97,6 @@ class DataTree:
 
     # method to clear non-connection data
     def clear_data(self):
-        self.content = None
         self.vmobjlist = None
         self.vmdict = dict()
         self.hostobjlist = None
@@ -63,3 +108,132 @@ class DataTree:
         self.dvswitchobjlist = None
         self.dvswitchdict = dict()
         self.dvportgroupdict = dict()
+        self.moiddict = dict()
+        self.attrdict = dict()
+
+    # method to return the Source of a vCenter, adding it when it is new
+    def add_source(self, fqdn: str) -> Source:
+        source = self.sources.get(fqdn)
+        if source is None:
+            source = Source(fqdn)
+            self.sources[fqdn] = source
+            self.register_stub(source.placeholder, source)
+        return source
+
+    # method to forget a vCenter along with its objects and stubs
+    def remove_source(self, source: Source) -> list:
+        names = [self.remove_key(key) for key in self.keys_of(source)]
+        for stub in [stub for stub, stub_source in self.stub_sources.items() if stub_source is source]:
+            del self.stub_sources[stub]
+        self.sources.pop(source.fqdn, None)
+        return names
+
+    # method to tie the stub of a session to the vCenter it is logged in to
+    def register_stub(self, stub, source: Source) -> None:
+        self.stub_sources[stub] = source
+
+    # method to forget the stub of a session that was logged out or replaced by a new login
+    def unregister_stub(self, stub) -> None:
+        self.stub_sources.pop(stub, None)
+
+    # method to return the Source an object came from, None when it is unknown
+    def source_of(self, obj: vmodl.ManagedObject) -> Source:
+        return self.stub_sources.get(obj._stub)
+
+    # method to tell whether an object is backed by a live connection rather than loaded from the cache
+    def is_live(self, obj: vmodl.ManagedObject) -> bool:
+        source = self.source_of(obj)
+        return source is not None and source.connection is not None and obj._stub is not source.placeholder
+
+    # method to return the connected sources
+    def connected_sources(self) -> list:
+        return [source for source in self.sources.values() if source.connection is not None]
+
+    # method to return the content of the vCenter an object came from
+    def content_of(self, obj: vmodl.ManagedObject) -> vim.ServiceInstanceContent:
+        source = self.source_of(obj)
+        return None if source is None else source.content
+
+    # method to group objects by the connected vCenter they came from, objects without one are left out
+    def group_by_source(self, objs: list) -> dict:
+        groups = dict()
+        for obj in objs:
+            source = self.source_of(obj)
+            if source is not None and source.content is not None:
+                groups.setdefault(source, list()).append(obj)
+        return groups
+
+    # method to return the key of an object, MoRef IDs are only unique within one vCenter
+    def key_of(self, obj: vmodl.ManagedObject) -> str:
+        source = self.source_of(obj)
+        if source is None:
+            return obj._moId
+        return source.fqdn + '/' + obj._moId
+
+    # method to return the keys of every object of a vCenter
+    def keys_of(self, source: Source) -> list:
+        prefix = source.fqdn + '/'
+        with self.lock:
+            return [key for key in self.moiddict if key.startswith(prefix)]
+
+    # method to return the name of an object on its vCenter, without the tag added to keep collisions apart
+    def real_name(self, obj: vmodl.ManagedObject) -> str:
+        name = self.moiddict.get(self.key_of(obj))
+        source = self.source_of(obj)
+        if name is None or source is None:
+            return name
+        tag = ' [' + source.fqdn + ']'
+        return name[:-len(tag)] if name.endswith(tag) else name
+
+    # method to return the names of the dictionaries an inventory object belongs in
+    def dict_names(self, obj: vim.ManagedEntity) -> list:
+        return [dict_name for obj_type, dict_name in self.inventory_types if isinstance(obj, obj_type)]
+
+    # method to file an inventory object under its name, returns the name it was filed under. An object whose name
+    # is already taken by an object of another vCenter is filed as "name [fqdn]".
+    def add_object(self, obj: vim.ManagedEntity, name: str) -> str:
+        key = self.key_of(obj)
+        source = self.source_of(obj)
+        with self.lock:
+            # drop the old entry first so a rename does not leave the old name behind
+            attrs = self.attrdict.get(key)
+            self.remove_key(key)
+            dict_names = self.dict_names(obj)
+            for dict_name in dict_names:
+                filed = getattr(self, dict_name).get(name)
+                if filed is not None and source is not None and self.source_of(filed) is not source:
+                    name = name + ' [' + source.fqdn + ']'
+                    break
+            for dict_name in dict_names:
+                getattr(self, dict_name)[name] = obj
+            self.moiddict[key] = name
+            if attrs is not None:
+                self.attrdict[key] = attrs
+        return name
+
+    # method to remove an inventory object, returns the name it was filed under
+    def remove_object(self, obj: vim.ManagedEntity) -> str:
+        return self.remove_key(self.key_of(obj))
+
+    # method to remove an inventory object by key, returns the name it was filed under
+    def remove_key(self, key: str) -> str:
+        with self.lock:
+            self.attrdict.pop(key, None)
+            name = self.moiddict.pop(key, None)
+            if name is None:
+                return None
+            for obj_type, dict_name in self.inventory_types:
+                obj_dict = getattr(self, dict_name)
+                filed = obj_dict.get(name)
+                if filed is not None and self.key_of(filed) == key:
+                    del obj_dict[name]
+        return name
+
+    # method to return the attributes of an object with the host MoRef ID resolved to the host name
+    def attrs_of(self, obj: vim.ManagedEntity) -> dict:
+        attrs = dict(self.attrdict.get(self.key_of(obj), dict()))
+        if 'host' in attrs:
+            source = self.source_of(obj)
+            prefix = '' if source is None else source.fqdn + '/'
+            attrs['host'] = self.moiddict.get(prefix + attrs['host'])
+        return attrs
@@ -0,0 +1,112 @@
+"""
+Datastore browsing for the program. HostDatastoreBrowser searches hand back their whole result in one task result,
+there is no server side paging, so the work is kept small instead: browse() lists one folder at a time with
+SearchDatastore_Task, search() walks the sub folders with SearchDatastoreSubFolders_Task only when a file pattern
+narrows it down, and only the file details the table shows are asked for. Results are turned into plain rows and
+handed out a page at a time, so a folder of tens of thousands of orphaned disks fills the table as it is read
+without the pyVmomi objects piling up.
+
+-=baka0taku=-
+"""
+from typing import NamedTuple
+from pyVmomi import vim
+from DataTree import DataTree
+from TaskTracker import watch_task
+
+# rows handed out per page
+DEFAULT_PAGE_SIZE = 500
+
+# column headings of a file row
+FILE_COLUMNS = ('Path', 'Type', 'Size (MB)', 'Modified')
+
+
+class FileRow(NamedTuple):
+    """
+    One file or folder found on a datastore.
+    """
+    path: str
+    kind: str
+    size: int
+    modified: str
+
+    def cells(self) -> list:
+        size = '' if self.size is None else str(round(self.size / 1048576, 1))
+        return [self.path, self.kind, size, self.modified]
+
+
+# datastore path of a folder, "[datastore] folder"
+def datastore_path(datastore_name: str, folder: str = '') -> str:
+    return '[' + datastore_name + '] ' + folder.strip('/')
+
+
+# search spec asking only for the details shown, patterns like "*.vmdk" limit the files returned
+def build_search_spec(patterns: list = None) -> vim.host.DatastoreBrowser.SearchSpec:
+    details = vim.host.DatastoreBrowser.FileInfo.Details(fileType=True, fileSize=True, modification=True,
+                                                         fileOwner=False)
+    return vim.host.DatastoreBrowser.SearchSpec(matchPattern=patterns or None, details=details,
+                                                sortFoldersFirst=True)
+
+
+# kind of a file from its FileInfo subclass, e.g. vim.host.DatastoreBrowser.VmDiskInfo -> VmDisk
+def file_kind(file_info: vim.host.DatastoreBrowser.FileInfo) -> str:
+    kind = type(file_info).__name__.split('.')[-1]
+    for suffix in ('FileInfo', 'Info'):
+        if kind.endswith(suffix):
+            kind = kind[:-len(suffix)]
+            break
+    return kind or 'File'
+
+
+# rows of one search result, paths relative to the datastore
+def result_rows(result: vim.host.DatastoreBrowser.SearchResults) -> list:
+    folder = result.folderPath or ''
+    folder = folder[folder.find(']') + 1:].strip().strip('/')
+    rows = list()
+    for file_info in result.file or []:
+        path = folder + '/' + file_info.path if folder else file_info.path
+        modified = file_info.modification.strftime('%Y-%m-%d %H:%M') if file_info.modification else ''
+        rows.append(FileRow(path, file_kind(file_info), file_info.fileSize, modified))
+    return rows
+
+
+# split rows into pages
+def pages_of(rows: list, page_size: int):
+    for start in range(0, len(rows), page_size):
+        yield rows[start:start + page_size]
+
+
+class DatastoreBrowser:
+    """
+    Browser of one datastore. browse() and search() are generators of pages of FileRows, run them off the UI thread.
+    """
+
+    def __init__(self, data: DataTree, datastore: vim.Datastore, page_size: int = DEFAULT_PAGE_SIZE) -> None:
+        self.data = data
+        self.datastore = datastore
+        self.name = data.real_name(datastore) or datastore.name
+        self.page_size = page_size
+        self.rows = 0
+        self.folders = 0
+
+    # files and folders directly in one folder
+    def browse(self, folder: str = '', patterns: list = None):
+        task = self.datastore.browser.SearchDatastore_Task(datastorePath=datastore_path(self.name, folder),
+                                                           searchSpec=build_search_spec(patterns))
+        rows = result_rows(watch_task(task).result())
+        self.folders = 1
+        for page in pages_of(rows, self.page_size):
+            self.rows += len(page)
+            yield page
+
+    # files matching the patterns in a folder and every folder below it, one folder's rows at a time
+    def search(self, folder: str = '', patterns: list = None):
+        task = self.datastore.browser.SearchDatastoreSubFolders_Task(
+            datastorePath=datastore_path(self.name, folder), searchSpec=build_search_spec(patterns))
+        results = watch_task(task).result() or []
+        for index in range(len(results)):
+            # each folder's raw result is dropped once it has been turned into rows
+            result, results[index] = results[index], None
+            self.folders += 1
+            for page in pages_of(result_rows(result), self.page_size):
+                self.rows += len(page)
+                yield page
@@ -0,0 +1,154 @@
+"""
+Event subscription for the program. An EventHistoryCollector over the whole inventory of a vCenter is watched with
+WaitForUpdatesEx on its latestPage, so migrations, power changes, reconfigurations and deletions arrive as they happen.
+Names, power states and hosts reach DataTree through InventorySync, which watches those properties already. What the
+sync cannot see is which cached stats an event made stale, so each event drops only those instead of clearing
+everything.
+
+-=baka0taku=-
+"""
+from threading import Thread
+from pyVmomi import vim, vmodl
+from DataTree import DataTree, Source
+from Stats import host_stats_cache, vm_detail_cache
+
+# how long a single WaitForUpdatesEx long-poll may block
+DEFAULT_WAIT_SECONDS = 30
+
+# events kept in the latest page, events beyond this between two polls are left to InventorySync
+DEFAULT_PAGE_SIZE = 200
+
+# event types the watcher subscribes to, the ones that leave cached stats stale
+WATCHED_EVENTS = [
+    'VmRemovedEvent',
+    'VmMigratedEvent',
+    'DrsVmMigratedEvent',
+    'VmRelocatedEvent',
+    'VmPoweredOnEvent',
+    'VmPoweredOffEvent',
+    'VmSuspendedEvent',
+    'VmReconfiguredEvent'
+]
+
+# events that move a VM to another host, DrsVmMigratedEvent is a VmMigratedEvent
+MOVE_EVENTS = (vim.event.VmMigratedEvent, vim.event.VmRelocatedEvent)
+
+
+class EventWatcher:
+    """
+    Drops the cached stats the VM events of one vCenter make stale, from a background thread. DataTree is left to
+    InventorySync, so every change is applied and shown once.
+    """
+
+    def __init__(self, data: DataTree, source: Source, wait_seconds: int = DEFAULT_WAIT_SECONDS,
+                 page_size: int = DEFAULT_PAGE_SIZE) -> None:
+        self.data = data
+        self.source = source
+        self.wait_seconds = wait_seconds
+        self.page_size = page_size
+        self.version = ''
+        # key of the newest event applied, event keys only grow
+        self.last_key = 0
+        self.events: vim.event.EventHistoryCollector
+        self.events = None
+        self.collector: vmodl.query.PropertyCollector
+        self.collector = None
+        self.thread: Thread
+        self.thread = None
+        self.running = False
+        self.applied = 0
+        self.error: Exception
+        self.error = None
+
+    # subscribe and start the background thread, events from before the subscription are skipped
+    def start(self) -> None:
+        content = self.source.content
+        by_entity = vim.event.EventFilterSpec.ByEntity(entity=content.rootFolder, recursion='all')
+        filter_spec = vim.event.EventFilterSpec(entity=by_entity, eventTypeId=WATCHED_EVENTS)
+        self.events = content.eventManager.CreateCollectorForEvents(filter=filter_spec)
+        self.events.SetCollectorPageSize(self.page_size)
+        self.collector = content.propertyCollector.CreatePropertyCollector()
+        obj_spec = vmodl.query.PropertyCollector.ObjectSpec(obj=self.events, skip=False)
+        prop_spec = vmodl.query.PropertyCollector.PropertySpec(type=vim.event.EventHistoryCollector, all=False,
+                                                               pathSet=['latestPage'])
+        filter_spec = vmodl.query.PropertyCollector.FilterSpec(objectSet=[obj_spec], propSet=[prop_spec])
+        self.collector.CreateFilter(filter_spec, partialUpdates=False)
+        # the first update holds the page as it is now, only what comes after it is news
+        self.last_key = max([event.key for event in self.poll(0)] or [0])
+        self.running = True
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return
+
+    # wait for the latest page to change, returns the events on it
+    def poll(self, wait_seconds: int) -> list:
+        options = vmodl.query.PropertyCollector.WaitOptions(maxWaitSeconds=wait_seconds)
+        update_set = self.collector.WaitForUpdatesEx(self.version, options)
+        if update_set is None:
+            return list()
+        self.version = update_set.version
+        events = list()
+        for filter_update in update_set.filterSet:
+            for obj_update in filter_update.objectSet:
+                for change in obj_update.changeSet:
+                    if change.name == 'latestPage' and change.val:
+                        events.extend(change.val)
+        return events
+
+    # apply the events not seen yet, oldest first, returns the number applied
+    def apply_events(self, events: list) -> int:
+        applied = 0
+        for event in sorted(events, key=lambda e: e.key):
+            if event.key <= self.last_key:
+                continue
+            self.last_key = event.key
+            self.apply_event(event)
+            applied += 1
+        self.applied += applied
+        return applied
+
+    # drop the cached stats one event made stale
+    def apply_event(self, event: vim.event.Event) -> None:
+        if event.vm is None or event.vm.vm is None:
+            return
+        vm_detail_cache.invalidate(self.data.key_of(event.vm.vm))
+        if isinstance(event, MOVE_EVENTS):
+            for host in (event.sourceHost, event.host):
+                if host is not None:
+                    host_stats_cache.invalidate(self.data.key_of(host.host))
+            host_stats_cache.invalidate('all')
+        return
+
+    # background loop, runs until stop() is called or the session fails
+    def run(self) -> None:
+        while self.running:
+            try:
+                self.apply_events(self.poll(self.wait_seconds))
+            except vmodl.fault.RequestCanceled:
+                continue
+            except Exception as e:
+                self.error = e
+                self.running = False
+                return
+
+    # is the background thread still watching?
+    def is_alive(self) -> bool:
+        return self.running and self.thread is not None and self.thread.is_alive()
+
+    # stop watching and release the server side collectors
+    def stop(self) -> None:
+        self.running = False
+        if self.collector is not None:
+            try:
+                self.collector.CancelWaitForUpdates()
+                self.collector.DestroyPropertyCollector()
+            except Exception:
+                pass
+            self.collector = None
+        if self.events is not None:
+            try:
+                self.events.DestroyCollector()
+            except Exception:
+                pass
+            self.events = None
+        return
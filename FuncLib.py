@@ -1,39 +1,82 @@
 """
 The purpose of this file is to house all the general functions for the program so that things only have to be
-written once.
+written once. Nothing in here touches the GUI, failures come back as return values or exceptions, and modules only
+some functions need (pyVim.connect, requests) are imported on first use to keep imports of this file cheap.
 
 -=baka0taku=-
 """
-import random
 import ssl
 import re
-import requests
+from concurrent.futures import Future
+from functools import lru_cache
 from socket import gaierror
-from time import sleep
-from pyVim.connect import SmartConnect, Disconnect
 from pyVmomi import vim, vmodl
-from DataTree import DataTree
-from kivy.uix.popup import Popup
-from kivy.uix.label import Label
+from CloneEngine import BulkCloneEngine
+from CloneSpec import INSTANT_CLONE_TAG, LINKED_CLONE_TAG, instant_clone_spec, linked_clone_spec, next_clone_names
+from DataTree import DataTree, Source
+from TaskTracker import TaskTracker, watch_task
 
 
-def get_content(data: DataTree):
-    data.content = data.connection.RetrieveContent()
+# get the content and instance UUID of a connected vCenter
+def get_content(data: DataTree, source: Source) -> None:
+    source.content = source.connection.RetrieveContent()
+    source.instance_uuid = source.content.about.instanceUuid
     return
 
 
-# establish connection to vCenter
-def make_connection(dataset: DataTree, fqdn: str, user: str, passwd: str) -> None:
+# log in to vCenter, raises on failure
+def smart_connect(fqdn: str, user: str, passwd: str) -> vim.ServiceInstance:
+    from pyVim.connect import SmartConnect
+    s = ssl.SSLContext(ssl.PROTOCOL_TLSv1_2)
+    return SmartConnect(host=fqdn, user=user, pwd=passwd, sslContext=s)
+
+
+# establish connection to one vCenter, returns its Source with connection left None on failure
+def make_connection(dataset: DataTree, fqdn: str, user: str, passwd: str) -> Source:
+    source = dataset.add_source(fqdn)
     try:
-        s = ssl.SSLContext(ssl.PROTOCOL_TLSv1_2)
-        dataset.connection = SmartConnect(host=fqdn, user=user, pwd=passwd, sslContext=s)
-        return
+        source.connection = smart_connect(fqdn=fqdn, user=user, passwd=passwd)
     except (gaierror, vim.fault.InvalidLogin):
-        dataset.connection = None
-        return
+        source.connection = None
+        return source
     except Exception as e:
-        dataset.connection = None
+        source.connection = None
+        return source
+    dataset.register_stub(source.connection._stub, source)
+    return source
+
+
+# close the connection to one vCenter along with its inventory sync, task tracker and session pool
+def close_source(source: Source) -> None:
+    from pyVim.connect import Disconnect
+    if source.sync is not None:
+        source.sync.stop()
+        source.sync = None
+    if source.events is not None:
+        source.events.stop()
+        source.events = None
+    if source.pool is not None:
+        source.pool.close()
+        source.pool = None
+    if source.connection is None:
         return
+    TaskTracker.drop(source.connection._stub)
+    try:
+        Disconnect(source.connection)
+    except Exception:
+        pass
+    source.connection = None
+    source.content = None
+    return
+
+
+# close the connections to every vCenter and forget them
+def close_connection(dataset: DataTree) -> None:
+    for source in list(dataset.sources.values()):
+        close_source(source)
+        dataset.remove_source(source)
+    return
+
 
 # send cloning tasks
 def send_clone_task(names: list, data: DataTree, typeclone: str) -> bool:
@@ -92,63 +135,51 @@ def send_portgroup_clone_task(name: str, data: DataTree) -> bool:
     parentname = name
     dataset = data
     parentobj = dataset.dvportgroupdict[parentname]
-    if not clone_dvportgroup(pgobj=parentobj):
+    if not clone_dvportgroup(pgobj=parentobj, name=free_portgroup_name(dataset, dataset.real_name(parentobj))):
         return False
     return True
 
 
-# create linked clone
-def make_linked_clone(vmobj: vim.VirtualMachine) -> bool:
+# first "<base>-<n>" no portgroup is named yet
+def free_portgroup_name(data: DataTree, base: str) -> str:
+    number = 1
+    while base + '-' + str(number) in data.dvportgroupdict:
+        number += 1
+    return base + '-' + str(number)
+
+
+# create linked clone, returns the task's Future or None when the VM has no snapshot
+def make_linked_clone(vmobj: vim.VirtualMachine, callback=None, clonename: str = None) -> Future:
     clonefolder = vmobj.parent
-    clonename = vmobj.name + 'LC-' + str(random.randint(100000, 999999))
-    clonespec = vim.VirtualMachineCloneSpec()
     try:
-        clonespec.snapshot = vmobj.snapshot.currentSnapshot
+        clonespec = linked_clone_spec(vmobj.snapshot.currentSnapshot)
     except AttributeError:
-        p = Popup(title='Info', content=Label(text="No Snapshot Found."), size_hint=(.2, .2))
-        p.open()
-        return False
-    clonespec.location = vim.VirtualMachineRelocateSpec()
-    movetype = vim.VirtualMachineRelocateDiskMoveOptions()
-    clonespec.location.diskMoveType = movetype.createNewChildDiskBacking
+        # no snapshot to clone from, checked before a name is reserved that would never be used
+        return None
+    if clonename is None:
+        clonename = next_clone_names(vmobj.name, LINKED_CLONE_TAG)[0]
     tsk = vmobj.CloneVM_Task(clonefolder, clonename, clonespec)
-    sleep(.5)
-    if tsk.info.error is not None:
-        return False
-    return True
+    return watch_task(tsk, callback)
 
 
 # create instant clone
-def make_instant_clone(vmobj: vim.VirtualMachine) -> bool:
-    # set InstantClone Specifications
-    inst_spec = vim.VirtualMachineInstantCloneSpec()
-    inst_spec.name = vmobj.name + "IC-" + str(random.randint(100000, 999999))
-    inst_spec.location = vim.VirtualMachineRelocateSpec()
+def make_instant_clone(vmobj: vim.VirtualMachine, callback=None, clonename: str = None) -> Future:
+    if clonename is None:
+        clonename = next_clone_names(vmobj.name, INSTANT_CLONE_TAG)[0]
     # make Instant Clone
-    inst_spec.location.folder = vmobj.parent
-    tsk = vmobj.InstantClone_Task(inst_spec)
-    sleep(.5)
-    if tsk.info.error is not None:
-        return False
-    return True
+    tsk = vmobj.InstantClone_Task(instant_clone_spec(clonename, vmobj.parent))
+    return watch_task(tsk, callback)
 
 
 # promote VM
-def promote_clone(vmobj: vim.VirtualMachine) -> bool:
+def promote_clone(vmobj: vim.VirtualMachine, callback=None) -> Future:
     tsk = vmobj.PromoteDisks_Task(unlink=True, disks=None)
-    sleep(.5)
-    if tsk.info.error is not None:
-        return False
-    return True
+    return watch_task(tsk, callback)
 
 
-# clone dvportgroup
-def clone_dvportgroup(pgobj: vim.dvs.DistributedVirtualPortgroup) -> bool:
-    parentcfg = pgobj.config
+# config spec for a new portgroup with the settings of an existing one
+def portgroup_spec(parentcfg: vim.dvs.DistributedVirtualPortgroup.ConfigInfo, name: str) -> vim.DVPortgroupConfigSpec:
     clonecfg = vim.DVPortgroupConfigSpec()
-    randnumext: str = str(random.randint(100000, 999999))
-    clonename = parentcfg.name + '-' + randnumext
-
     # get DVPortgroupConfigSpec from parent
     clonecfg.autoExpand = parentcfg.autoExpand
     clonecfg.backingType = parentcfg.backingType
@@ -158,7 +189,7 @@ def clone_dvportgroup(pgobj: vim.dvs.DistributedVirtualPortgroup) -> bool:
     clonecfg.dynamicProperty = parentcfg.dynamicProperty
     clonecfg.dynamicType = parentcfg.dynamicType
     clonecfg.logicalSwitchUuid = parentcfg.logicalSwitchUuid
-    clonecfg.name = clonename
+    clonecfg.name = name
     clonecfg.numPorts = parentcfg.numPorts
     clonecfg.policy = parentcfg.policy
     clonecfg.portNameFormat = parentcfg.portNameFormat
@@ -169,21 +200,22 @@ def clone_dvportgroup(pgobj: vim.dvs.DistributedVirtualPortgroup) -> bool:
     clonecfg.type = parentcfg.type
     clonecfg.vendorSpecificConfig = parentcfg.vendorSpecificConfig
     clonecfg.vmVnicNetworkResourcePoolKey = parentcfg.vmVnicNetworkResourcePoolKey
+    return clonecfg
+
+
+# clone dvportgroup
+def clone_dvportgroup(pgobj: vim.dvs.DistributedVirtualPortgroup, name: str, callback=None) -> Future:
+    parentcfg = pgobj.config
+    clonecfg = portgroup_spec(parentcfg, name)
     # send clone task to server
-    tsk = pgobj.config.distributedVirtualSwitch.CreateDVPortgroup_Task(clonecfg)
-    sleep(.5)
-    if tsk.info.error is not None:
-        return False
-    return True
+    tsk = parentcfg.distributedVirtualSwitch.CreateDVPortgroup_Task(clonecfg)
+    return watch_task(tsk, callback)
 
 
 # reset VM
-def reset_vm(vmobj: vim.VirtualMachine) -> bool:
+def reset_vm(vmobj: vim.VirtualMachine, callback=None) -> Future:
     tsk = vmobj.ResetVM_Task()
-    sleep(.5)
-    if tsk.info.error is not None:
-        return False
-    return True
+    return watch_task(tsk, callback)
 
 
 # reboot VM
@@ -208,43 +240,31 @@ def shutdown_vm(vmobj: vim.VirtualMachine) -> bool:
     return True
 
 
-# power off VM
-def poweroff_vm(vmobj: vim.VirtualMachine) -> bool:
+# power off VM, returns the task's Future or None when the VM is gone
+def poweroff_vm(vmobj: vim.VirtualMachine, callback=None) -> Future:
     try:
         tsk = vmobj.PowerOffVM_Task()
     except vmodl.fault.ManagedObjectNotFound:
-        return False
-    sleep(.5)
-    if tsk.info.error is not None:
-        return False
-    return True
+        return None
+    return watch_task(tsk, callback)
 
 
 # power on VM
-def power_on_vm(vmobj: vim.VirtualMachine) -> bool:
+def power_on_vm(vmobj: vim.VirtualMachine, callback=None) -> Future:
     tsk = vmobj.PowerOnVM_Task()
-    sleep(.5)
-    if tsk.info.error is not None:
-        return False
-    return True
+    return watch_task(tsk, callback)
 
 
 # put host in Maintenance Mode
-def host_maint_mode_on(hostobj: vim.HostSystem) -> bool:
+def host_maint_mode_on(hostobj: vim.HostSystem, callback=None) -> Future:
     tsk = hostobj.EnterMaintenanceMode_Task(timeout=0)
-    sleep(.5)
-    if tsk.info.error is not None:
-        return False
-    return True
+    return watch_task(tsk, callback)
 
 
 # shut down Host
-def host_shut_down(hostobj: vim.HostSystem) -> bool:
+def host_shut_down(hostobj: vim.HostSystem, callback=None) -> Future:
     tsk = hostobj.ShutdownHost_Task(force=True)
-    sleep(.5)
-    if tsk.info.error is not None:
-        return False
-    return True
+    return watch_task(tsk, callback)
 
 
 # Is VM powered ON?
@@ -307,136 +327,144 @@ def is_host_in_maint_mode(hostobj: vim.HostSystem) -> bool:
         return False
 
 
+# USB HID usage IDs of the keys, shifted characters share the code of the key they are on
+USB_KEYCODES = {
+    "a": 0x4,
+    "b": 0x5,
+    "c": 0x6,
+    "d": 0x7,
+    "e": 0x8,
+    "f": 0x9,
+    "g": 0xa,
+    "h": 0xb,
+    "i": 0xc,
+    "j": 0xd,
+    "k": 0xe,
+    "l": 0xf,
+    "m": 0x10,
+    "n": 0x11,
+    "o": 0x12,
+    "p": 0x13,
+    "q": 0x14,
+    "r": 0x15,
+    "s": 0x16,
+    "t": 0x17,
+    "u": 0x18,
+    "v": 0x19,
+    "w": 0x1a,
+    "x": 0x1b,
+    "y": 0x1c,
+    "z": 0x1d,
+    "1": 0x1e,
+    "2": 0x1f,
+    "3": 0x20,
+    "4": 0x21,
+    "5": 0x22,
+    "6": 0x23,
+    "7": 0x24,
+    "8": 0x25,
+    "9": 0x26,
+    "0": 0x27,
+    "\n": 0x28,
+    "esc": 0x29,
+    "backspace": 0x2a,
+    "\t": 0x2b,
+    " ": 0x2c,
+    "-": 0x2d,
+    "=": 0x2e,
+    "[": 0x2f,
+    "]": 0x30,
+    "\\": 0x31,
+    ";": 0x33,
+    "'": 0x34,
+    "`": 0x35,
+    ",": 0x36,
+    ".": 0x37,
+    "/": 0x38,
+    "caps": 0x39,
+    "F1": 0x3a,
+    "F2": 0x3b,
+    "F3": 0x3c,
+    "F4": 0x3d,
+    "F5": 0x3e,
+    "F6": 0x3f,
+    "F7": 0x40,
+    "F8": 0x41,
+    "F9": 0x42,
+    "F10": 0x43,
+    "F11": 0x44,
+    "F12": 0x45,
+    "prtscr": 0x46,
+    "scl": 0x47,
+    "pause": 0x48,
+    "insert": 0x49,
+    "home": 0x4a,
+    "pgup": 0x4b,
+    "del": 0x4c,
+    "end": 0x4d,
+    "pgdn": 0x4e,
+    "right": 0x4f,
+    "left": 0x50,
+    "down": 0x51,
+    "up": 0x52,
+    "A": 0x4,
+    "B": 0x5,
+    "C": 0x6,
+    "D": 0x7,
+    "E": 0x8,
+    "F": 0x9,
+    "G": 0xa,
+    "H": 0xb,
+    "I": 0xc,
+    "J": 0xd,
+    "K": 0xe,
+    "L": 0xf,
+    "M": 0x10,
+    "N": 0x11,
+    "O": 0x12,
+    "P": 0x13,
+    "Q": 0x14,
+    "R": 0x15,
+    "S": 0x16,
+    "T": 0x17,
+    "U": 0x18,
+    "V": 0x19,
+    "W": 0x1a,
+    "X": 0x1b,
+    "Y": 0x1c,
+    "Z": 0x1d,
+    "!": 0x1e,
+    "@": 0x1f,
+    "#": 0x20,
+    "$": 0x21,
+    "%": 0x22,
+    "^": 0x23,
+    "&": 0x24,
+    "*": 0x25,
+    "(": 0x26,
+    ")": 0x27,
+    "_": 0x2d,
+    "+": 0x2e,
+    "{": 0x2f,
+    "}": 0x30,
+    "|": 0x31,
+    ":": 0x33,
+    '"': 0x34,
+    "~": 0x35,
+    "<": 0x36,
+    ">": 0x37,
+    "?": 0x38
+}
+
+# characters typed with shift held down
+SHIFTED_KEYS = re.compile(r"[A-Z\~\!\@\#\$\%\^\&\*\(\)\_\+\{\}\|\:\"\<\>\?]")
+
+
 # Get USB Hid code
 def code_lookup(to_encode: str) -> int:
-    keycodes = {
-        "a": 0x4,
-        "b": 0x5,
-        "c": 0x6,
-        "d": 0x7,
-        "e": 0x8,
-        "f": 0x9,
-        "g": 0xa,
-        "h": 0xb,
-        "i": 0xc,
-        "j": 0xd,
-        "k": 0xe,
-        "l": 0xf,
-        "m": 0x10,
-        "n": 0x11,
-        "o": 0x12,
-        "p": 0x13,
-        "q": 0x14,
-        "r": 0x15,
-        "s": 0x16,
-        "t": 0x17,
-        "u": 0x18,
-        "v": 0x19,
-        "w": 0x1a,
-        "x": 0x1b,
-        "y": 0x1c,
-        "z": 0x1d,
-        "1": 0x1e,
-        "2": 0x1f,
-        "3": 0x20,
-        "4": 0x21,
-        "5": 0x22,
-        "6": 0x23,
-        "7": 0x24,
-        "8": 0x25,
-        "9": 0x26,
-        "0": 0x27,
-        "\n": 0x28,
-        "esc": 0x29,
-        "backspace": 0x2a,
-        "\t": 0x2b,
-        " ": 0x2c,
-        "-": 0x2d,
-        "=": 0x2e,
-        "[": 0x2f,
-        "]": 0x30,
-        "\\": 0x31,
-        ";": 0x33,
-        "'": 0x34,
-        "`": 0x35,
-        ",": 0x36,
-        ".": 0x37,
-        "/": 0x38,
-        "caps": 0x39,
-        "F1": 0x3a,
-        "F2": 0x3b,
-        "F3": 0x3c,
-        "F4": 0x3d,
-        "F5": 0x3e,
-        "F6": 0x3f,
-        "F7": 0x40,
-        "F8": 0x41,
-        "F9": 0x42,
-        "F10": 0x43,
-        "F11": 0x44,
-        "F12": 0x45,
-        "prtscr": 0x46,
-        "scl": 0x47,
-        "pause": 0x48,
-        "insert": 0x49,
-        "home": 0x4a,
-        "pgup": 0x4b,
-        "del": 0x4c,
-        "end": 0x4d,
-        "pgdn": 0x4e,
-        "right": 0x4f,
-        "left": 0x50,
-        "down": 0x51,
-        "up": 0x52,
-        "A": 0x4,
-        "B": 0x5,
-        "C": 0x6,
-        "D": 0x7,
-        "E": 0x8,
-        "F": 0x9,
-        "G": 0xa,
-        "H": 0xb,
-        "I": 0xc,
-        "J": 0xd,
-        "K": 0xe,
-        "L": 0xf,
-        "M": 0x10,
-        "N": 0x11,
-        "O": 0x12,
-        "P": 0x13,
-        "Q": 0x14,
-        "R": 0x15,
-        "S": 0x16,
-        "T": 0x17,
-        "U": 0x18,
-        "V": 0x19,
-        "W": 0x1a,
-        "X": 0x1b,
-        "Y": 0x1c,
-        "Z": 0x1d,
-        "!": 0x1e,
-        "@": 0x1e,
-        "#": 0x20,
-        "$": 0x21,
-        "%": 0x22,
-        "^": 0x23,
-        "&": 0x24,
-        "*": 0x25,
-        "(": 0x26,
-        ")": 0x27,
-        "_": 0x28,
-        "+": 0x2e,
-        "{": 0x2f,
-        "}": 0x30,
-        "|": 0x31,
-        ":": 0x33,
-        '"': 0x34,
-        "~": 0x35,
-        "<": 0x36,
-        ">": 0x37,
-        "?": 0x38
-    }
-    hidcode = int(keycodes.get(to_encode))
+    hidcode = USB_KEYCODES.get(to_encode)
+    if hidcode is None:
+        raise ValueError('No USB key code for ' + repr(to_encode) + '.')
     hidcode = hidcode << 16
     hidcode = hidcode | 7
     return hidcode
@@ -479,41 +507,36 @@ def key_combo(normal_key: str, left_alt: bool, left_shift: bool, left_ctrl: bool
     return spec
 
 
-# convert string to usb scancode
-def str_to_usb(input_string: str) -> vim.UsbScanCodeSpec:
-    # clear out newlines
-    # input_string = input_string.replace("\n", '')
-    spec: vim.UsbScanCodeSpec = vim.UsbScanCodeSpec()
+# key events of a string, compiled once per distinct string. The events are shared, do not change them.
+@lru_cache(maxsize=256)
+def str_to_key_events(input_string: str) -> tuple:
     key_events = list()
     for key in input_string:
-        regex = r"[A-Z\~\!\@\#\$\%\^\&\*\(\)\_\+\{\}\|\:\"\<\>\?]"
-        if re.match(regex, key):
-            evt = vim.UsbScanCodeSpec.KeyEvent()
+        evt = vim.UsbScanCodeSpec.KeyEvent()
+        if SHIFTED_KEYS.match(key):
             modifier_type: vim.UsbScanCodeSpec.ModifierType = vim.UsbScanCodeSpec.ModifierType()
             evt.modifiers = modifier_type
             evt.modifiers.leftShift = True
-            evt.usbHidCode = code_lookup(to_encode=key)
-            key_events.append(evt)
-        else:
-            evt = vim.UsbScanCodeSpec.KeyEvent()
-            evt.usbHidCode = code_lookup(to_encode=key)
-            key_events.append(evt)
-    spec.keyEvents = key_events
+        evt.usbHidCode = code_lookup(to_encode=key)
+        key_events.append(evt)
+    return tuple(key_events)
+
+
+# convert string to usb scancode
+def str_to_usb(input_string: str) -> vim.UsbScanCodeSpec:
+    spec: vim.UsbScanCodeSpec = vim.UsbScanCodeSpec()
+    spec.keyEvents = list(str_to_key_events(input_string))
     return spec
 
 
 # make multiple linked clones
-def multi_linked_clones(vm_names: list, num_of_clones: int, data: DataTree) -> None:
-    for x in range(num_of_clones):
-        send_clone_task(names=vm_names, data=data, typeclone="linked")
-    return
+def multi_linked_clones(vm_names: list, num_of_clones: int, data: DataTree):
+    return BulkCloneEngine(data=data, clone_type='linked').run(vm_names=vm_names, num_of_clones=num_of_clones)
 
 
 # make multiple instant clones
-def multi_instant_clones(vm_names: list, num_of_clones: int, data: DataTree) -> None:
-    for x in range(num_of_clones):
-        send_clone_task(names=vm_names, data=data, typeclone="instant")
-    return
+def multi_instant_clones(vm_names: list, num_of_clones: int, data: DataTree):
+    return BulkCloneEngine(data=data, clone_type='instant').run(vm_names=vm_names, num_of_clones=num_of_clones)
 
 
 # get VM CPU usage
@@ -570,15 +593,12 @@ def get_num_disk_files(vm: vim.VirtualMachine) -> str:
 
 # create a VM snapshot
 def create_snapshot(snapshot_name: str, vm: vim.VirtualMachine, snapshot_desc: str, snapshot_memory: bool,
-                    snapshot_quiesce: bool):
+                    snapshot_quiesce: bool, callback=None) -> Future:
     task = vm.CreateSnapshot_Task(name=snapshot_name,
                                   description=snapshot_desc,
                                   memory=snapshot_memory,
                                   quiesce=snapshot_quiesce)
-    if task.info.error is not None:
-        return False
-    else:
-        return True
+    return watch_task(task, callback)
 
 
 # boot VM into BIOS
@@ -587,11 +607,20 @@ def bios_boot(vm: vim.VirtualMachine) -> None:
     boot_spec = vim.vm.BootOptions()
     boot_spec.enterBIOSSetup = True
     spec.bootOptions = boot_spec
-    vm.ReconfigVM_Task(spec=spec)
-    sleep(1)
-    tsk = vm.ResetVM_Task()
-    if tsk.info.error is not None:
-        vm.PowerOnVM_Task()
+
+    # power on instead when the VM could not be reset
+    def power_on(future):
+        if future.exception() is not None:
+            vm.PowerOnVM_Task()
+        return
+
+    # reset once the new boot options are in place
+    def reset(future):
+        if future.exception() is None:
+            watch_task(vm.ResetVM_Task(), power_on)
+        return
+
+    watch_task(vm.ReconfigVM_Task(spec=spec), reset)
     return
 
 
@@ -647,14 +676,10 @@ def set_screen_resolution(vmobj: vim.VirtualMachine, width: int, height: int) ->
     return
 
 
-# rename managed entity
-def rename_obj(obj: vim.ManagedEntity, new_name: str, data: DataTree) -> None:
+# rename managed entity, the new name reaches DataTree through the VmRenamedEvent
+def rename_obj(obj: vim.ManagedEntity, new_name: str) -> Future:
     tsk = obj.Rename_Task(newName=new_name)
-    sleep(.5)
-    if tsk.info.error is not None:
-        return
-    data.clear_data()
-    return
+    return watch_task(tsk)
 
 
 # Get VM total memory
@@ -682,63 +707,42 @@ def get_num_processors(vmobj: vim.VirtualMachine) -> str:
 
 
 # vanilla clone of VM
-def clone_vm(vmobj: vim.VirtualMachine, vm_name: str) -> None:
+def clone_vm(vmobj: vim.VirtualMachine, vm_name: str, callback=None) -> Future:
     clonefolder = vmobj.parent
     clonename = vm_name
     clonespec = vim.VirtualMachineCloneSpec()
     clonespec.location = vim.VirtualMachineRelocateSpec()
     tsk = vmobj.CloneVM_Task(clonefolder, clonename, clonespec)
-    sleep(.5)
-    if tsk.info.error is not None:
-        return
-    return
+    return watch_task(tsk, callback)
 
 
 # migrate VM
-def migrate_vm(vmobj: vim.VirtualMachine, hostobj: vim.HostSystem, dsobj: vim.Datastore) -> bool:
+def migrate_vm(vmobj: vim.VirtualMachine, hostobj: vim.HostSystem, dsobj: vim.Datastore, callback=None) -> Future:
     spec = vim.VirtualMachineRelocateSpec()
     spec.host = hostobj
     spec.datastore = dsobj
     tsk = vmobj.RelocateVM_Task(spec)
-    sleep(.5)
-    if tsk.info.error is not None:
-        return False
-    return True
+    return watch_task(tsk, callback)
 
 
 # delete VM
-def delete_vm(vmobj: vim.VirtualMachine) -> bool:
+def delete_vm(vmobj: vim.VirtualMachine, callback=None) -> Future:
     tsk = vmobj.Destroy_Task()
-    sleep(.5)
-    if tsk.info.error is not None:
-        return False
-    return True
-
-
-# freeze VM
-def freeze_vm(user: str,
-              password: str,
-              script_type: str,
-              file_name: str,
-              file_content: str,
-              data: DataTree,
-              vm: vim.VirtualMachine) -> int:
-    # create credential object for authentication
-    creds: vim.vm.guest.NamePasswordAuthentication = vim.vm.guest.NamePasswordAuthentication(
-        username=user, password=password)
-    # create File Attributes object
-    file_attr_obj: vim.vm.guest.FileManager.FileAttributes = vim.vm.guest.FileManager.FileAttributes()
-    # get file manager object
-    file_manager: vim.vm.guest.FileManager = data.content.guestOperationsManager.fileManager
+    return watch_task(tsk, callback)
+
+
+# copy a script into a temporary directory of the guest and start it, returns the guest process ID. http is the
+# requests.Session the file is uploaded with, a new one is used when None. Raises the fault of the step that failed.
+def run_guest_script(file_manager: vim.vm.guest.FileManager,
+                     process_manager: vim.vm.guest.ProcessManager,
+                     vm: vim.VirtualMachine,
+                     creds: vim.vm.guest.NamePasswordAuthentication,
+                     script_type: str,
+                     file_name: str,
+                     file_content: str,
+                     http=None) -> int:
     # create temp directory on VM
-    try:
-        remote_dir = file_manager.CreateTemporaryDirectoryInGuest(vm=vm, auth=creds, prefix='', suffix='')
-    except vim.fault.InvalidGuestLogin:
-        return 0
-    except vim.fault.GuestOperationsUnavailable:
-        return 0
-    except vmodl.fault.SystemError:
-        return 0
+    remote_dir = file_manager.CreateTemporaryDirectoryInGuest(vm=vm, auth=creds, prefix='', suffix='')
     # make file path in guest
     vm_guest_id = vm.config.guestId
     vm_regex = r"win"
@@ -746,19 +750,19 @@ def freeze_vm(user: str,
         remote_path = remote_dir + '\\' + file_name
     else:
         remote_path = remote_dir + '/' + file_name
-    # get file size
-    file_size = len(file_content)
+    # create File Attributes object
+    file_attr_obj: vim.vm.guest.FileManager.FileAttributes = vim.vm.guest.FileManager.FileAttributes()
     # initiate file transfer
     put_url = file_manager.InitiateFileTransferToGuest(vm=vm, auth=creds, guestFilePath=remote_path,
-                                                       fileAttributes=file_attr_obj, fileSize=file_size,
+                                                       fileAttributes=file_attr_obj, fileSize=len(file_content),
                                                        overwrite=True)
     # push file to vm
-    response = requests.put(url=put_url, data=file_content, verify=False)
+    if http is None:
+        import requests
+        http = requests
+    response = http.put(url=put_url, data=file_content, verify=False)
     if not response.status_code == 200:
-        return 0
-
-    # get process manager singleton
-    process_manager = data.content.guestOperationsManager.processManager
+        raise IOError('Upload to guest failed with HTTP ' + str(response.status_code) + '.')
 
     # set permissions for linux/bsd
     if not re.match(vm_regex, vm_guest_id):
@@ -775,10 +779,25 @@ def freeze_vm(user: str,
         program_spec = vim.vm.guest.ProcessManager.ProgramSpec(programPath=remote_path)
 
     # execute freeze script
+    return process_manager.StartProgramInGuest(vm=vm, auth=creds, spec=program_spec)
+
+
+# freeze VM
+def freeze_vm(user: str,
+              password: str,
+              script_type: str,
+              file_name: str,
+              file_content: str,
+              data: DataTree,
+              vm: vim.VirtualMachine) -> int:
+    # create credential object for authentication
+    creds: vim.vm.guest.NamePasswordAuthentication = vim.vm.guest.NamePasswordAuthentication(
+        username=user, password=password)
+    guest_ops = data.content_of(vm).guestOperationsManager
     try:
-        ret = process_manager.StartProgramInGuest(vm=vm, auth=creds, spec=program_spec)
-        return ret
-    except vmodl.fault.SystemError:
-        return 0
-    except vim.fault.GuestPermissionDenied:
+        return run_guest_script(file_manager=guest_ops.fileManager, process_manager=guest_ops.processManager, vm=vm,
+                                creds=creds, script_type=script_type, file_name=file_name,
+                                file_content=file_content)
+    except (vim.fault.InvalidGuestLogin, vim.fault.GuestOperationsUnavailable, vim.fault.GuestPermissionDenied,
+            vmodl.fault.SystemError, IOError):
         return 0
@@ -0,0 +1,306 @@
+"""
+Inventory collection for the program. Rather than building a ContainerView per managed type and reading names one
+object at a time, the whole inventory tree is walked server side by the PropertyCollector with one traversal spec,
+so every managed type and its properties come back in the same paged result.
+
+-=baka0taku=-
+"""
+from threading import Lock, Thread
+from pyVmomi import vim, vmodl
+from pyVmomi.VmomiSupport import ManagedObject
+from DataTree import DataTree, Source
+
+# number of objects the server returns per page
+DEFAULT_PAGE_SIZE = 1000
+
+# how long a single WaitForUpdatesEx long-poll may block
+DEFAULT_WAIT_SECONDS = 30
+
+# properties collected for each managed type during an inventory pass
+INVENTORY_PROPERTIES = {
+    vim.VirtualMachine: ['name', 'runtime.powerState', 'runtime.host', 'summary.config.guestFullName'],
+    vim.HostSystem: ['name'],
+    vim.Datastore: ['name'],
+    vim.Network: ['name'],
+    vim.DistributedVirtualSwitch: ['name']
+}
+
+# inventory properties kept in DataTree.attrdict for searching, and the attribute they are stored under
+ATTRIBUTE_PROPERTIES = {
+    'runtime.powerState': 'power',
+    'runtime.host': 'host',
+    'summary.config.guestFullName': 'guest'
+}
+
+
+# build traversal specs that reach every VM, host, datastore and network from the root folder
+def build_traversal_specs() -> list:
+    traversal_spec = vmodl.query.PropertyCollector.TraversalSpec
+    selection_spec = vmodl.query.PropertyCollector.SelectionSpec
+    to_folder = selection_spec(name='folderTraversal')
+    to_children = [
+        to_folder,
+        selection_spec(name='dcVmTraversal'),
+        selection_spec(name='dcHostTraversal'),
+        selection_spec(name='dcDatastoreTraversal'),
+        selection_spec(name='dcNetworkTraversal'),
+        selection_spec(name='crHostTraversal'),
+        selection_spec(name='vappVmTraversal')
+    ]
+    return [
+        traversal_spec(name='folderTraversal', type=vim.Folder, path='childEntity', skip=False,
+                       selectSet=to_children),
+        traversal_spec(name='dcVmTraversal', type=vim.Datacenter, path='vmFolder', skip=False,
+                       selectSet=[to_folder]),
+        traversal_spec(name='dcHostTraversal', type=vim.Datacenter, path='hostFolder', skip=False,
+                       selectSet=[to_folder]),
+        traversal_spec(name='dcDatastoreTraversal', type=vim.Datacenter, path='datastoreFolder', skip=False,
+                       selectSet=[to_folder]),
+        traversal_spec(name='dcNetworkTraversal', type=vim.Datacenter, path='networkFolder', skip=False,
+                       selectSet=[to_folder]),
+        traversal_spec(name='crHostTraversal', type=vim.ComputeResource, path='host', skip=False),
+        traversal_spec(name='vappVmTraversal', type=vim.VirtualApp, path='vm', skip=False)
+    ]
+
+
+# build the filter spec for a full inventory pass
+def build_filter_spec(root: vim.Folder, properties: dict = None) -> vmodl.query.PropertyCollector.FilterSpec:
+    if properties is None:
+        properties = INVENTORY_PROPERTIES
+    obj_spec = vmodl.query.PropertyCollector.ObjectSpec(obj=root, skip=True, selectSet=build_traversal_specs())
+    prop_set = list()
+    for obj_type, paths in properties.items():
+        prop_set.append(vmodl.query.PropertyCollector.PropertySpec(type=obj_type, all=False, pathSet=paths))
+    filter_spec = vmodl.query.PropertyCollector.FilterSpec()
+    filter_spec.objectSet = [obj_spec]
+    filter_spec.propSet = prop_set
+    return filter_spec
+
+
+# turn the propSet of an ObjectContent into a dictionary
+def props_to_dict(obj_content: vmodl.query.PropertyCollector.ObjectContent) -> dict:
+    props = dict()
+    for prop in obj_content.propSet:
+        props[prop.name] = prop.val
+    return props
+
+
+# pick the searchable attributes out of collected properties, managed objects are stored as MoRef IDs
+def attrs_from_props(props: dict) -> dict:
+    attrs = dict()
+    for path, key in ATTRIBUTE_PROPERTIES.items():
+        if path in props:
+            value = props[path]
+            attrs[key] = value._moId if isinstance(value, ManagedObject) else value
+    return attrs
+
+
+# yield every ObjectContent of a paged RetrievePropertiesEx, counting round trips in stats['round_trips']
+def retrieve_objects(collector: vmodl.query.PropertyCollector, filter_specs: list, page_size: int = None,
+                     stats: dict = None):
+    options = vmodl.query.PropertyCollector.RetrieveOptions(maxObjects=page_size)
+    if stats is None:
+        stats = dict()
+    stats['round_trips'] = 1
+    result = collector.RetrievePropertiesEx(filter_specs, options)
+    while result is not None:
+        for obj_content in result.objects:
+            yield obj_content
+        if result.token is None:
+            return
+        result = collector.ContinueRetrievePropertiesEx(result.token)
+        stats['round_trips'] += 1
+
+
+# collect the whole inventory of one vCenter in one paged pass, returns the number of round trips made
+def load_inventory(data: DataTree, source: Source, page_size: int = DEFAULT_PAGE_SIZE) -> int:
+    filter_spec = build_filter_spec(source.content.rootFolder)
+    stats = {'round_trips': 0}
+    try:
+        for obj_content in retrieve_objects(source.content.propertyCollector, [filter_spec], page_size, stats):
+            props = props_to_dict(obj_content)
+            if 'name' in props:
+                data.add_object(obj_content.obj, props['name'])
+            attrs = attrs_from_props(props)
+            if attrs:
+                data.attrdict[data.key_of(obj_content.obj)] = attrs
+    except vmodl.fault.ManagedObjectNotFound:
+        pass
+    return stats['round_trips']
+
+
+class InventorySync:
+    """
+    Keeps the DataTree dictionaries in step with one vCenter. A private PropertyCollector holds one filter over the
+    whole inventory, and WaitForUpdatesEx hands back only the objects that entered, left or changed since the last
+    version token. The first call pages in the full inventory, every call after that costs as much as what changed.
+
+    on_change is called from the sync thread with a list of (old_name, new_name) tuples, either of which may be None.
+    Both names are the same when only the attributes of an object changed. on_page is called from the thread running
+    start() after every page of the initial pass with the changes of that page and the number of objects seen so far,
+    so a caller can show the inventory while it is still loading.
+    """
+
+    def __init__(self, data: DataTree, source: Source, page_size: int = DEFAULT_PAGE_SIZE,
+                 wait_seconds: int = DEFAULT_WAIT_SECONDS, on_change=None, on_page=None) -> None:
+        self.data = data
+        self.source = source
+        self.page_size = page_size
+        self.wait_seconds = wait_seconds
+        self.on_change = on_change
+        self.on_page = on_page
+        self.version = ''
+        self.collector: vmodl.query.PropertyCollector
+        self.collector = None
+        self.thread: Thread
+        self.thread = None
+        # guards running and collector between the sync thread and stop()
+        self.lock = Lock()
+        self.running = False
+        self.round_trips = 0
+        self.error: Exception
+        self.error = None
+
+    # create the filter, page in the current inventory and start the background thread. on_change is not called for
+    # the initial pass, callers rebuild their views from DataTree once this returns.
+    def start(self) -> int:
+        self.version = ''
+        self.round_trips = 0
+        self.error = None
+        collector = self.source.content.propertyCollector.CreatePropertyCollector()
+        self.collector = collector
+        try:
+            collector.CreateFilter(build_filter_spec(self.source.content.rootFolder), partialUpdates=False)
+            self.initial_sync()
+        except Exception:
+            self.release(collector)
+            raise
+        with self.lock:
+            self.running = True
+        self.thread = Thread(target=self.run, args=(collector,), daemon=True)
+        self.thread.start()
+        return self.round_trips
+
+    # page in the full inventory and drop anything already in DataTree that the server no longer has
+    def initial_sync(self) -> list:
+        seen = set()
+        changes = list()
+        options = vmodl.query.PropertyCollector.WaitOptions(maxWaitSeconds=0, maxObjectUpdates=self.page_size)
+        while True:
+            update_set = self.collector.WaitForUpdatesEx(self.version, options)
+            self.round_trips += 1
+            if update_set is None:
+                break
+            page = self.apply_update_set(update_set, seen)
+            changes.extend(page)
+            self.version = update_set.version
+            if self.on_page is not None:
+                self.on_page(page, len(seen))
+            if not update_set.truncated:
+                break
+        gone = [(self.data.remove_key(key), None) for key in set(self.data.keys_of(self.source)) - seen]
+        changes.extend(gone)
+        if gone and self.on_page is not None:
+            self.on_page(gone, len(seen))
+        return changes
+
+    # wait for one batch of changes and apply it, returns the changes made. The sync thread passes the collector it
+    # holds, anyone else polls the current one.
+    def poll(self, wait_seconds: int, collector: vmodl.query.PropertyCollector = None) -> list:
+        if collector is None:
+            collector = self.collector
+        changes = list()
+        options = vmodl.query.PropertyCollector.WaitOptions(maxWaitSeconds=wait_seconds,
+                                                            maxObjectUpdates=self.page_size)
+        update_set = collector.WaitForUpdatesEx(self.version, options)
+        self.round_trips += 1
+        while update_set is not None:
+            changes.extend(self.apply_update_set(update_set))
+            self.version = update_set.version
+            if not update_set.truncated:
+                break
+            options.maxWaitSeconds = 0
+            update_set = collector.WaitForUpdatesEx(self.version, options)
+            self.round_trips += 1
+        return changes
+
+    # apply enter/leave/modify deltas to DataTree
+    def apply_update_set(self, update_set: vmodl.query.PropertyCollector.UpdateSet, seen: set = None) -> list:
+        changes = list()
+        for filter_update in update_set.filterSet:
+            for obj_update in filter_update.objectSet:
+                obj = obj_update.obj
+                if obj_update.kind == 'leave':
+                    old_name = self.data.remove_object(obj)
+                    if old_name is not None:
+                        changes.append((old_name, None))
+                    continue
+                key = self.data.key_of(obj)
+                if seen is not None:
+                    seen.add(key)
+                props = dict()
+                for change in obj_update.changeSet:
+                    if change.op != 'remove':
+                        props[change.name] = change.val
+                old_name = self.data.moiddict.get(key)
+                new_name = old_name
+                if 'name' in props:
+                    # always refile so objects loaded from the cache are replaced by live ones
+                    new_name = self.data.add_object(obj, props['name'])
+                attrs = attrs_from_props(props)
+                if attrs:
+                    with self.data.lock:
+                        self.data.attrdict.setdefault(key, dict()).update(attrs)
+                if old_name != new_name or (attrs and obj_update.kind == 'modify'):
+                    changes.append((old_name, new_name))
+        return changes
+
+    # background loop, runs until stop() is called or the session fails. The thread keeps its own reference to the
+    # collector and destroys it on the way out, so stop() never pulls it from under a WaitForUpdatesEx.
+    def run(self, collector: vmodl.query.PropertyCollector) -> None:
+        while True:
+            with self.lock:
+                if not self.running or self.collector is not collector:
+                    break
+            try:
+                changes = self.poll(self.wait_seconds, collector)
+            except vmodl.fault.RequestCanceled:
+                continue
+            except Exception as e:
+                self.error = e
+                with self.lock:
+                    if self.collector is collector:
+                        self.running = False
+                break
+            if changes and self.on_change is not None:
+                self.on_change(changes)
+        self.release(collector)
+        return
+
+    # forget a collector if it is still the current one and destroy it on the server
+    def release(self, collector: vmodl.query.PropertyCollector) -> None:
+        with self.lock:
+            if self.collector is collector:
+                self.collector = None
+        try:
+            collector.DestroyPropertyCollector()
+        except Exception:
+            pass
+        return
+
+    # is the background thread still syncing?
+    def is_alive(self) -> bool:
+        return self.running and self.thread is not None and self.thread.is_alive()
+
+    # stop syncing, the sync thread wakes up from its long-poll and releases the server side collector
+    def stop(self) -> None:
+        with self.lock:
+            self.running = False
+            collector = self.collector
+        if collector is None:
+            return
+        try:
+            collector.CancelWaitForUpdates()
+        except Exception:
+            pass
+        return
@@ -0,0 +1,164 @@
+"""
+On-disk snapshot of the DataTree inventory and its search attributes so the lists can be shown the moment the program
+starts. Each vCenter gets its own gzipped JSON file keyed by its instance UUID, and a small index remembers which
+vCenters were used last. Objects loaded from the cache have no connection behind them until InventorySync reconciles
+them against the live server.
+
+-=baka0taku=-
+"""
+import gzip
+import hashlib
+import json
+import os
+import zlib
+from time import time
+from pyVmomi.VmomiSupport import GetWsdlType
+from DataTree import DataTree, Source
+
+# bump when the file layout changes, older files are dropped
+CACHE_SCHEMA = 2
+
+# caches older than this are considered stale
+CACHE_MAX_AGE = 7 * 24 * 60 * 60
+
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')),
+                         'vmtool')
+INDEX_FILE = os.path.join(CACHE_DIR, 'index.json')
+
+
+# path of the cache file for one vCenter
+def cache_path(instance_uuid: str) -> str:
+    return os.path.join(CACHE_DIR, instance_uuid + '.json.gz')
+
+
+# checksum over the inventory part of a cache file
+def payload_checksum(payload: dict) -> str:
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+# write a file next to its destination and move it into place so readers never see half a file
+def write_atomic(path: str, content: bytes) -> None:
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+# save the DataTree inventory of one connected vCenter
+def save_cache(data: DataTree, source: Source, version: str = '') -> bool:
+    if source.instance_uuid is None:
+        return False
+    types = list()
+    type_index = dict()
+    objects = list()
+    seen = set()
+    # the sync threads change the dictionaries while this runs, so the rows are copied out under the lock and only
+    # serialised once it is released
+    with data.lock:
+        for obj_type, dict_name in data.inventory_types:
+            for name, obj in getattr(data, dict_name).items():
+                # an object can sit in more than one dictionary, keep each MoRef once
+                key = data.key_of(obj)
+                if data.source_of(obj) is not source or key in seen or data.moiddict.get(key) != name:
+                    continue
+                seen.add(key)
+                wsdl_name = obj._wsdlName
+                if wsdl_name not in type_index:
+                    type_index[wsdl_name] = len(types)
+                    types.append(wsdl_name)
+                attrs = data.attrdict.get(key)
+                objects.append([type_index[wsdl_name], obj._moId, data.real_name(obj),
+                                None if attrs is None else dict(attrs)])
+    payload = {'types': types, 'objects': objects}
+    document = {
+        'schema': CACHE_SCHEMA,
+        'instance_uuid': source.instance_uuid,
+        'fqdn': source.fqdn,
+        'saved': time(),
+        'version': version,
+        'checksum': payload_checksum(payload),
+        'inventory': payload
+    }
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        write_atomic(cache_path(source.instance_uuid), gzip.compress(json.dumps(document).encode('utf-8'), 6))
+    except OSError:
+        return False
+    return True
+
+
+# remember which vCenters were used last
+def save_index(sources: list) -> bool:
+    index = [{'fqdn': source.fqdn, 'instance_uuid': source.instance_uuid} for source in sources
+             if source.instance_uuid is not None]
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        write_atomic(INDEX_FILE, json.dumps({'sources': index}).encode('utf-8'))
+    except OSError:
+        return False
+    return True
+
+
+# delete a cache file, ignoring one that is already gone
+def drop_cache(instance_uuid: str) -> None:
+    try:
+        os.remove(cache_path(instance_uuid))
+    except OSError:
+        pass
+    return
+
+
+# read the index of the last used vCenters, returns a list of (fqdn, instance_uuid)
+def read_index() -> list:
+    try:
+        with open(INDEX_FILE, 'r') as f:
+            index = json.load(f)
+        if 'sources' not in index:
+            # index written before more than one vCenter could be used
+            return [(index['fqdn'], index['instance_uuid'])]
+        return [(entry['fqdn'], entry['instance_uuid']) for entry in index['sources']]
+    except (OSError, ValueError, KeyError, TypeError):
+        return list()
+
+
+# fill DataTree from the cache of one vCenter, returns the number of objects loaded
+def load_cache(data: DataTree, source: Source, instance_uuid: str) -> int:
+    try:
+        with open(cache_path(instance_uuid), 'rb') as f:
+            document = json.loads(gzip.decompress(f.read()).decode('utf-8'))
+        if document['schema'] != CACHE_SCHEMA or document['instance_uuid'] != instance_uuid:
+            raise ValueError('cache does not match')
+        if time() - document['saved'] > CACHE_MAX_AGE:
+            raise ValueError('cache is stale')
+        payload = document['inventory']
+        if payload_checksum(payload) != document['checksum']:
+            raise ValueError('cache is corrupt')
+        types = [GetWsdlType('urn:vim25', wsdl_name) for wsdl_name in payload['types']]
+        for type_number, moid, name, attrs in payload['objects']:
+            # the placeholder stub ties the object to its vCenter until the live object replaces it
+            obj = types[type_number](moid, source.placeholder)
+            data.add_object(obj, name)
+            if attrs:
+                data.attrdict[data.key_of(obj)] = attrs
+    except FileNotFoundError:
+        return 0
+    except (ValueError, KeyError, TypeError, IndexError, EOFError, gzip.BadGzipFile, zlib.error, AttributeError):
+        # anything unreadable is dropped so the next connect writes a fresh one
+        for key in data.keys_of(source):
+            data.remove_key(key)
+        drop_cache(instance_uuid)
+        return 0
+    except OSError:
+        return 0
+    source.instance_uuid = instance_uuid
+    return len(data.keys_of(source))
+
+
+# load whatever vCenters were used last, returns (list of FQDNs, number of objects loaded)
+def load_last_cache(data: DataTree) -> tuple:
+    fqdns = list()
+    num_of_objects = 0
+    for fqdn, instance_uuid in read_index():
+        fqdns.append(fqdn)
+        num_of_objects += load_cache(data, data.add_source(fqdn), instance_uuid)
+    return fqdns, num_of_objects
@@ -0,0 +1,279 @@
+"""
+Live performance monitoring for the program. Every interval the realtime counters of all watched entities are read
+with one PerformanceManager.QueryPerf call per vCenter, and each sample goes into a fixed-size ring buffer backed by
+an array of 4 byte floats, so an hour of 20 second samples for 300 hosts and 4 counters stays at about a megabyte no
+matter how long the monitor runs.
+
+-=baka0taku=-
+"""
+from array import array
+from math import isnan, nan
+from threading import Event, Lock, Thread
+from time import monotonic
+from pyVmomi import vim
+from DataTree import DataTree, Source
+
+# realtime statistics are sampled every 20 seconds by vCenter
+SAMPLE_INTERVAL = 20
+
+# one hour of samples
+HISTORY_SAMPLES = 180
+
+# host counters by <group>.<name>.<rollup>, and the series each one is kept under
+HOST_COUNTERS = {
+    'cpu.ready.summation': 'cpu_ready',
+    'mem.vmmemctl.average': 'balloon',
+    'disk.maxTotalLatency.latest': 'disk_latency',
+    'net.usage.average': 'net_usage'
+}
+
+# virtual machine counters, same layout as HOST_COUNTERS
+VM_COUNTERS = {
+    'cpu.usagemhz.average': 'cpu_usage',
+    'cpu.ready.summation': 'cpu_ready',
+    'mem.active.average': 'mem_active',
+    'disk.usage.average': 'disk_usage'
+}
+
+# display units of each series
+SERIES_UNITS = {
+    'cpu_usage': 'MHz',
+    'cpu_ready': '%',
+    'balloon': 'MB',
+    'mem_active': 'MB',
+    'disk_latency': 'ms',
+    'disk_usage': 'KBps',
+    'net_usage': 'KBps'
+}
+
+# column headings of each series
+SERIES_TITLES = {
+    'cpu_usage': 'CPU Usage',
+    'cpu_ready': 'CPU Ready',
+    'balloon': 'Ballooned Memory',
+    'mem_active': 'Active Memory',
+    'disk_latency': 'Disk Latency',
+    'disk_usage': 'Disk Usage',
+    'net_usage': 'Network Usage'
+}
+
+# series vCenter reports in kilobytes and that are shown in megabytes
+KB_SERIES = {'balloon', 'mem_active'}
+
+
+class RingBuffer:
+    """
+    Fixed number of float samples in a flat array, the oldest sample is overwritten once the buffer is full. Missing
+    samples are stored as NaN.
+    """
+
+    def __init__(self, size: int = HISTORY_SAMPLES) -> None:
+        self.size = size
+        self.data = array('f', [nan]) * size
+        self.start = 0
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, value: float) -> None:
+        self.data[(self.start + self.count) % self.size] = value
+        if self.count < self.size:
+            self.count += 1
+        else:
+            self.start = (self.start + 1) % self.size
+        return
+
+    # samples from oldest to newest
+    def values(self) -> list:
+        end = self.start + self.count
+        if end <= self.size:
+            return self.data[self.start:end].tolist()
+        return self.data[self.start:].tolist() + self.data[:end - self.size].tolist()
+
+    # newest sample, NaN when there is none
+    def latest(self) -> float:
+        if self.count == 0:
+            return nan
+        return self.data[(self.start + self.count - 1) % self.size]
+
+
+# turn a raw counter value into the unit shown for its series, -1 means vCenter had no sample
+def scale_value(series: str, value: int, interval: int) -> float:
+    if value is None or value < 0:
+        return nan
+    if series == 'cpu_ready':
+        # milliseconds of ready time summed over the interval
+        return value / (interval * 1000) * 100
+    if series in KB_SERIES:
+        return value / 1024
+    return float(value)
+
+
+# text for the newest sample of a series
+def format_latest(series: str, buffer: RingBuffer) -> str:
+    value = buffer.latest() if buffer is not None else nan
+    if isnan(value):
+        return '-'
+    return str(round(value, 1)) + ' ' + SERIES_UNITS.get(series, '')
+
+
+class PerfMonitor:
+    """
+    Samples realtime counters of whatever entities() returns every interval seconds from a background thread.
+    on_sample is called from that thread with the keys of the entities that got a new sample. The time and size of
+    the last round are kept so the cost of watching one more entity can be shown.
+    """
+
+    def __init__(self, data: DataTree, entities, counters: dict = None, interval: int = SAMPLE_INTERVAL,
+                 samples: int = HISTORY_SAMPLES, on_sample=None) -> None:
+        self.data = data
+        self.entities = entities
+        self.counters = HOST_COUNTERS if counters is None else counters
+        self.interval = interval
+        self.samples = samples
+        self.on_sample = on_sample
+        self.lock = Lock()
+        # object key -> series name -> RingBuffer
+        self.series = dict()
+        # object key -> time of the newest sample taken, so a sample read twice is only stored once
+        self.last_taken = dict()
+        # Source -> counter name -> counter ID, vCenters number their counters differently
+        self.counter_ids = dict()
+        self.stopped = Event()
+        # set to take a sample before the interval is up, e.g. when an entity was added
+        self.wake = Event()
+        # seconds the last round took and the number of entities it sampled
+        self.round_seconds = 0.0
+        self.round_entities = 0
+        self.thread: Thread
+        self.thread = None
+        self.error: Exception
+        self.error = None
+
+    # counter IDs of a vCenter, read once
+    def ids_of(self, source: Source) -> dict:
+        ids = self.counter_ids.get(source)
+        if ids is None:
+            ids = dict()
+            for counter in source.content.perfManager.perfCounter:
+                name = counter.groupInfo.key + '.' + counter.nameInfo.key + '.' + str(counter.rollupType)
+                if name in self.counters:
+                    ids[name] = counter.key
+            self.counter_ids[source] = ids
+        return ids
+
+    # one query spec per entity for the newest realtime sample of every counter
+    def query_specs(self, source: Source, entities: list) -> list:
+        metric_ids = [vim.PerformanceManager.MetricId(counterId=counter_id, instance='')
+                      for counter_id in self.ids_of(source).values()]
+        return [vim.PerformanceManager.QuerySpec(entity=entity, metricId=metric_ids, intervalId=self.interval,
+                                                 maxSample=1, format='normal') for entity in entities]
+
+    # buffers of one entity, created on first use
+    def buffers_of(self, key: str) -> dict:
+        buffers = self.series.get(key)
+        if buffers is None:
+            buffers = {series: RingBuffer(self.samples) for series in self.counters.values()}
+            self.series[key] = buffers
+        return buffers
+
+    # store the samples of one QueryPerf result, returns the keys that got a new sample
+    def store(self, source: Source, results: list) -> list:
+        names = {counter_id: self.counters[name] for name, counter_id in self.ids_of(source).items()}
+        updated = list()
+        with self.lock:
+            for entity_metric in results or []:
+                if not entity_metric.sampleInfo:
+                    continue
+                key = self.data.key_of(entity_metric.entity)
+                taken = entity_metric.sampleInfo[-1].timestamp
+                if self.last_taken.get(key) == taken:
+                    continue
+                self.last_taken[key] = taken
+                buffers = self.buffers_of(key)
+                values = dict()
+                for metric_series in entity_metric.value:
+                    series = names.get(metric_series.id.counterId)
+                    if series is not None and metric_series.value:
+                        values[series] = scale_value(series, metric_series.value[-1], self.interval)
+                for series, buffer in buffers.items():
+                    buffer.append(values.get(series, nan))
+                updated.append(key)
+        return updated
+
+    # read one sample of every watched entity, one QueryPerf call per vCenter. Returns the updated keys.
+    def collect(self) -> list:
+        started = monotonic()
+        entities = [entity for entity in self.entities() if self.data.is_live(entity)]
+        updated = list()
+        for source, source_entities in self.data.group_by_source(entities).items():
+            results = source.content.perfManager.QueryPerf(querySpec=self.query_specs(source, source_entities))
+            updated.extend(self.store(source, results))
+        self.round_seconds = monotonic() - started
+        self.round_entities = len(entities)
+        # forget entities that are no longer watched
+        keys = {self.data.key_of(entity) for entity in entities}
+        with self.lock:
+            for key in [key for key in self.series if key not in keys]:
+                del self.series[key]
+                self.last_taken.pop(key, None)
+        return updated
+
+    # copy of the samples of one series from oldest to newest
+    def values_of(self, key: str, series: str) -> list:
+        with self.lock:
+            buffer = self.series.get(key, dict()).get(series)
+            return list() if buffer is None else buffer.values()
+
+    # text for the newest sample of one series
+    def latest_of(self, key: str, series: str) -> str:
+        with self.lock:
+            return format_latest(series, self.series.get(key, dict()).get(series))
+
+    # bytes of sample history kept for each entity
+    def bytes_per_entity(self) -> int:
+        return len(self.counters) * self.samples * array('f').itemsize
+
+    # cost of watching one more entity: seconds of query time per round and bytes of history
+    def watch_cost(self) -> dict:
+        per_entity = self.round_seconds / self.round_entities if self.round_entities else 0.0
+        return {'entities': self.round_entities, 'round_seconds': self.round_seconds,
+                'seconds_per_entity': per_entity, 'bytes_per_entity': self.bytes_per_entity()}
+
+    # take the next sample now instead of at the end of the interval
+    def sample_now(self) -> None:
+        self.wake.set()
+        return
+
+    def start(self) -> None:
+        if self.is_alive():
+            return
+        self.stopped.clear()
+        self.wake.clear()
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return
+
+    # background loop, samples right away and then every interval
+    def run(self) -> None:
+        while not self.stopped.is_set():
+            try:
+                updated = self.collect()
+            except Exception as e:
+                # a failed round is skipped, the next one may well work
+                self.error = e
+                updated = list()
+            if updated and self.on_sample is not None:
+                self.on_sample(updated)
+            self.wake.wait(self.interval)
+            self.wake.clear()
+        return
+
+    def is_alive(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.wake.set()
+        return
@@ -0,0 +1,189 @@
+"""
+Search index over inventory names for the program. Every name is broken into trigrams, a query intersects the names
+filed under its trigrams and checks the few candidates left, so a lookup stays in the low milliseconds at tens of
+thousands of VMs. The index is updated one name at a time as the inventory changes.
+
+-=baka0taku=-
+"""
+from bisect import bisect_left, insort
+from collections import defaultdict
+from threading import Lock
+
+GRAM_SIZE = 3
+
+
+# trigrams of a lower case string
+def grams_of(text: str) -> set:
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+# split a query into name terms and key:value attribute terms
+def parse_query(query: str) -> tuple:
+    terms = list()
+    attr_terms = list()
+    for term in query.lower().split():
+        key, sep, value = term.partition(':')
+        if sep and key and value:
+            attr_terms.append((key, value))
+        else:
+            terms.append(term)
+    return terms, attr_terms
+
+
+class SearchIndex:
+    """
+    Incremental substring index. Name terms match anywhere in the name, except terms shorter than a trigram which
+    match the start of the name. Attribute terms like host:esx01, power:poweredoff or guest:windows match as a
+    substring of that attribute. All terms of a query have to match.
+    """
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.grams = defaultdict(set)
+        self.sorted_names = list()
+        self.attrs = dict()
+        # (key, value) -> names, there are few distinct values per key so matching walks these instead of names
+        self.attr_names = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self.attrs)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.attrs
+
+    # replace the whole index
+    def rebuild(self, names, attrs: dict = None) -> None:
+        if attrs is None:
+            attrs = dict()
+        grams = defaultdict(set)
+        all_attrs = dict()
+        attr_names = defaultdict(set)
+        for name in names:
+            for gram in grams_of(name.lower()):
+                grams[gram].add(name)
+            all_attrs[name] = self.clean_attrs(attrs.get(name))
+            for item in all_attrs[name].items():
+                attr_names[item].add(name)
+        with self.lock:
+            self.grams = grams
+            self.attrs = all_attrs
+            self.attr_names = attr_names
+            self.sorted_names = sorted((name.lower(), name) for name in all_attrs)
+        return
+
+    # lower case attribute values so matching does not have to
+    @staticmethod
+    def clean_attrs(attrs: dict) -> dict:
+        if not attrs:
+            return dict()
+        return {key: str(value).lower() for key, value in attrs.items() if value is not None}
+
+    # drop the attribute postings of a name, lock must be held
+    def forget_attrs(self, name: str) -> None:
+        for item in self.attrs.get(name, dict()).items():
+            names = self.attr_names.get(item)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self.attr_names[item]
+        return
+
+    # add a name, or update the attributes of one already indexed
+    def add(self, name: str, attrs: dict = None) -> None:
+        with self.lock:
+            if name not in self.attrs:
+                for gram in grams_of(name.lower()):
+                    self.grams[gram].add(name)
+                insort(self.sorted_names, (name.lower(), name))
+            else:
+                self.forget_attrs(name)
+            self.attrs[name] = self.clean_attrs(attrs)
+            for item in self.attrs[name].items():
+                self.attr_names[item].add(name)
+        return
+
+    def remove(self, name: str) -> None:
+        with self.lock:
+            if name not in self.attrs:
+                return
+            self.forget_attrs(name)
+            del self.attrs[name]
+            for gram in grams_of(name.lower()):
+                names = self.grams.get(gram)
+                if names is not None:
+                    names.discard(name)
+                    if not names:
+                        del self.grams[gram]
+            pos = bisect_left(self.sorted_names, (name.lower(), name))
+            if pos < len(self.sorted_names) and self.sorted_names[pos][1] == name:
+                del self.sorted_names[pos]
+        return
+
+    # names starting with a lower case prefix
+    def prefixed(self, prefix: str) -> set:
+        start = bisect_left(self.sorted_names, (prefix, ''))
+        end = bisect_left(self.sorted_names, (prefix + '\uffff', ''))
+        return {name for lower, name in self.sorted_names[start:end]}
+
+    # names whose attributes match every attribute term
+    def with_attrs(self, attr_terms: list) -> set:
+        found = None
+        for key, value in attr_terms:
+            matches = set()
+            for (attr_key, attr_value), names in self.attr_names.items():
+                if attr_key == key and value in attr_value:
+                    matches |= names
+            found = matches if found is None else found & matches
+            if not found:
+                return set()
+        return found
+
+    # names containing a lower case term
+    def containing(self, term: str) -> set:
+        if len(term) < GRAM_SIZE:
+            return self.prefixed(term)
+        # intersect the smallest posting sets first
+        postings = sorted((self.grams.get(gram, set()) for gram in grams_of(term)), key=len)
+        candidates = set(postings[0])
+        for names in postings[1:]:
+            if not candidates:
+                break
+            candidates &= names
+        return {name for name in candidates if term in name.lower()}
+
+    # does a name match every attribute term?
+    def attrs_match(self, name: str, attr_terms: list) -> bool:
+        attrs = self.attrs.get(name, dict())
+        for key, value in attr_terms:
+            if value not in attrs.get(key, ''):
+                return False
+        return True
+
+    # every name matching a query, an empty query matches everything
+    def search(self, query: str) -> set:
+        terms, attr_terms = parse_query(query)
+        with self.lock:
+            found = None
+            if attr_terms:
+                found = self.with_attrs(attr_terms)
+            for term in sorted(terms, key=len, reverse=True):
+                if found is not None and not found:
+                    break
+                matches = self.containing(term)
+                found = matches if found is None else found & matches
+            if found is None:
+                found = set(self.attrs.keys())
+        return found
+
+    # does one name match a query?
+    def matches(self, name: str, query: str) -> bool:
+        terms, attr_terms = parse_query(query)
+        lower = name.lower()
+        for term in terms:
+            if len(term) < GRAM_SIZE:
+                if not lower.startswith(term):
+                    return False
+            elif term not in lower:
+                return False
+        with self.lock:
+            return self.attrs_match(name, attr_terms)
@@ -0,0 +1,211 @@
+"""
+Pool of vCenter sessions for the program. One SmartConnect stub is one HTTP session, and every call made through it
+waits its turn on the same socket. The pool logs in several sessions as the same user so bulk work can run that many
+calls at once. Sessions are checked out and returned, pinged while idle so vCenter does not expire them, logged in
+again when they expire anyway, and count the calls made through them.
+
+-=baka0taku=-
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from queue import Empty, Queue
+from threading import Event, Lock, Thread
+from time import monotonic
+from pyVmomi import vim
+from pyVmomi.VmomiSupport import ManagedObject
+from DataTree import DataTree, Source
+from TaskTracker import TaskTracker
+
+DEFAULT_POOL_SIZE = 4
+
+# seconds between keepalive pings of an idle session, vCenter expires idle sessions after 30 minutes by default
+DEFAULT_KEEPALIVE = 300
+
+
+class PooledSession:
+    """
+    One logged in session of a SessionPool.
+    """
+
+    def __init__(self, index: int) -> None:
+        self.index = index
+        self.connection: vim.ServiceInstance
+        self.connection = None
+        self.calls = 0
+        self.logins = 0
+        self.last_used = 0.0
+
+    @property
+    def stub(self):
+        return self.connection._stub
+
+
+class SessionPool:
+    """
+    Sessions to one vCenter, all logged in as the same user. Use call() to run work on a free session with the managed
+    objects it needs bound to that session, or session() to hold one for a while. Tasks started on a pooled
+    session are tracked by the TaskTracker of that session, so their long-polls do not hold up other calls either.
+    """
+
+    def __init__(self, source: Source, user: str, passwd: str, size: int = DEFAULT_POOL_SIZE,
+                 keepalive: int = DEFAULT_KEEPALIVE) -> None:
+        self.source = source
+        self.fqdn = source.fqdn
+        self.user = user
+        self.passwd = passwd
+        self.size = size
+        self.keepalive = keepalive
+        self.sessions = list()
+        self.free = Queue()
+        self.lock = Lock()
+        self.closed = Event()
+        self.thread: Thread
+        self.thread = None
+
+    # log every session in and start the keepalive thread, returns the number of sessions
+    def open(self) -> int:
+        for index in range(self.size):
+            session = PooledSession(index)
+            self.login(session)
+            self.sessions.append(session)
+            self.free.put(session)
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return len(self.sessions)
+
+    # log a session in, or in again after it expired
+    def login(self, session: PooledSession) -> None:
+        from FuncLib import smart_connect
+        if session.connection is not None:
+            TaskTracker.drop(session.stub)
+            DataTree.get_instance().unregister_stub(session.stub)
+        session.connection = smart_connect(fqdn=self.fqdn, user=self.user, passwd=self.passwd)
+        # objects bound to this session have to resolve to the same vCenter as the main connection
+        DataTree.get_instance().register_stub(session.stub, self.source)
+        session.logins += 1
+        session.last_used = monotonic()
+        return
+
+    # take a free session, waits for one to be returned when all are busy
+    def checkout(self, timeout: float = None) -> PooledSession:
+        if self.closed.is_set():
+            raise RuntimeError('Session pool is closed.')
+        return self.free.get(timeout=timeout)
+
+    def checkin(self, session: PooledSession) -> None:
+        session.last_used = monotonic()
+        self.free.put(session)
+        return
+
+    # hold a session for a block of calls
+    @contextmanager
+    def session(self, timeout: float = None):
+        session = self.checkout(timeout)
+        try:
+            yield session
+        finally:
+            self.checkin(session)
+
+    # the same managed object bound to a session, anything else is returned as is
+    @staticmethod
+    def bind(obj, session: PooledSession):
+        if isinstance(obj, ManagedObject):
+            return type(obj)(obj._moId, session.stub)
+        return obj
+
+    # run func(*args) on a free session with managed object arguments bound to it, logs in again once if the
+    # session has expired
+    def call(self, func, *args):
+        with self.session() as session:
+            with self.lock:
+                session.calls += 1
+            try:
+                return func(*[self.bind(arg, session) for arg in args])
+            except vim.fault.NotAuthenticated:
+                self.login(session)
+                return func(*[self.bind(arg, session) for arg in args])
+
+    # calls and logins of every session
+    def stats(self) -> list:
+        with self.lock:
+            return [{'session': s.index, 'calls': s.calls, 'logins': s.logins} for s in self.sessions]
+
+    # keepalive loop, takes the free sessions one at a time and puts each back as soon as it is pinged, so at most
+    # one session is held away from the callers
+    def run(self) -> None:
+        while not self.closed.wait(self.keepalive / 2):
+            for _ in range(len(self.sessions)):
+                try:
+                    session = self.free.get_nowait()
+                except Empty:
+                    break
+                try:
+                    if monotonic() - session.last_used >= self.keepalive / 2:
+                        self.ping(session)
+                finally:
+                    self.free.put(session)
+        return
+
+    # keep an idle session alive, logs it in again when it has expired anyway
+    def ping(self, session: PooledSession) -> None:
+        try:
+            session.connection.CurrentTime()
+            session.last_used = monotonic()
+        except vim.fault.NotAuthenticated:
+            try:
+                self.login(session)
+            except Exception:
+                pass
+        except Exception:
+            pass
+        return
+
+    # log every session out
+    def close(self) -> None:
+        from pyVim.connect import Disconnect
+        self.closed.set()
+        for session in self.sessions:
+            if session.connection is None:
+                continue
+            TaskTracker.drop(session.stub)
+            DataTree.get_instance().unregister_stub(session.stub)
+            try:
+                Disconnect(session.connection)
+            except Exception:
+                pass
+        self.sessions = list()
+        return
+
+
+# the pool of the vCenter the first managed object argument came from, None when it has none
+def pool_of(data: DataTree, args) -> SessionPool:
+    for arg in args:
+        if isinstance(arg, ManagedObject):
+            source = data.source_of(arg)
+            return None if source is None else source.pool
+    return None
+
+
+# number of pooled sessions over every vCenter, at least one
+def pool_sessions(data: DataTree) -> int:
+    return max(1, sum(source.pool.size for source in data.sources.values() if source.pool is not None))
+
+
+# run func(*args) on a pooled session of the vCenter the arguments belong to, or on its main connection
+def pooled_call(data: DataTree, func, *args):
+    pool = pool_of(data, args)
+    if pool is None:
+        return func(*args)
+    return pool.call(func, *args)
+
+
+# run func(item) for every item at once across the pools of every vCenter, returns (item, result, error) in item
+# order. Without pools the items run one after another.
+def pooled_map(data: DataTree, func, items: list) -> list:
+    def run_one(item):
+        try:
+            return item, pooled_call(data, func, item), None
+        except Exception as e:
+            return item, None, e
+    with ThreadPoolExecutor(max_workers=pool_sessions(data)) as executor:
+        return list(executor.map(run_one, items))
@@ -0,0 +1,200 @@
+"""
+Snapshot sprawl scanning for the program. The snapshot trees, the file layout and the storage summary of every VM are
+read in one paged PropertyCollector pass per vCenter, with the vCenters scanned side by side. The trees are walked and
+the files added up from what that pass returned, so there is no call per VM, and each page is handed out as soon as
+it is read so the results fill in while the scan runs.
+
+-=baka0taku=-
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from threading import Event, Lock
+from time import monotonic
+from typing import NamedTuple
+from pyVmomi import vim
+from DataTree import DataTree, Source
+from Inventory import DEFAULT_PAGE_SIZE, build_filter_spec, props_to_dict, retrieve_objects
+
+# VM properties read by the scan
+SCAN_PROPERTIES = ['snapshot.rootSnapshotList', 'layoutEx.file', 'summary.storage.committed']
+
+# file types written for a snapshot itself
+SNAPSHOT_FILE_TYPES = ('snapshotData', 'snapshotMemory', 'snapshotList', 'snapshotManifestList')
+
+# disk file types, delta disks among them grow while a snapshot exists
+DISK_FILE_TYPES = ('diskDescriptor', 'diskExtent')
+
+# delta disk names, e.g. "web01-000002.vmdk", "web01-000002-delta.vmdk" or "web01-000002-sesparse.vmdk"
+DELTA_REGEX = re.compile(r"-\d{6}(-delta|-sesparse)?\.vmdk$")
+
+# column headings of a snapshot row
+SNAPSHOT_COLUMNS = ('VM', 'Snapshots', 'Depth', 'Oldest (days)', 'Oldest Snapshot', 'Size (GB)', 'Share')
+
+# sort orders by name, largest, oldest or deepest first
+SORT_KEYS = {
+    'Size': lambda info: -info.size,
+    'Age': lambda info: info.oldest,
+    'Depth': lambda info: -info.depth,
+    'Snapshots': lambda info: -info.snapshots,
+    'VM': lambda info: info.vm.lower()
+}
+
+
+class SnapshotInfo(NamedTuple):
+    """
+    Snapshot state of one VM. size is the bytes held by snapshot files and delta disks, committed the bytes of the
+    whole VM.
+    """
+    vm: str
+    snapshots: int
+    depth: int
+    oldest: datetime
+    oldest_name: str
+    newest: datetime
+    size: int
+    committed: int
+
+    def age_days(self, now: datetime = None) -> float:
+        if self.oldest is None:
+            return 0.0
+        return ((now or datetime.now(timezone.utc)) - self.oldest).total_seconds() / 86400
+
+    # part of the VM's storage held by its snapshots
+    def share(self) -> float:
+        return self.size / self.committed if self.committed else 0.0
+
+    def cells(self, now: datetime = None) -> list:
+        return [self.vm, str(self.snapshots), str(self.depth), str(round(self.age_days(now), 1)),
+                self.oldest_name or '', str(round(self.size / 1073741824, 2)), str(round(self.share() * 100)) + '%']
+
+
+# count, depth and the oldest and newest snapshots of snapshot trees, walked without a call to the server
+def walk_trees(roots: list) -> tuple:
+    count = 0
+    depth = 0
+    oldest = None
+    newest = None
+    stack = [(tree, 1) for tree in roots or []]
+    while stack:
+        tree, level = stack.pop()
+        count += 1
+        depth = max(depth, level)
+        if tree.createTime is not None:
+            if oldest is None or tree.createTime < oldest.createTime:
+                oldest = tree
+            if newest is None or tree.createTime > newest.createTime:
+                newest = tree
+        stack.extend((child, level + 1) for child in tree.childSnapshotList or [])
+    return count, depth, oldest, newest
+
+
+# folder of a VM from its layout, files outside it (the parent disks of a linked clone) are not the VM's own
+def vm_folder(files: list) -> str:
+    for file_info in files:
+        if file_info.type == 'config':
+            return file_info.name.rsplit('/', 1)[0] + '/' if '/' in file_info.name else file_info.name
+    return None
+
+
+# bytes held by the snapshot files and delta disks in the VM's own folder
+def snapshot_bytes(files: list) -> int:
+    folder = vm_folder(files)
+    size = 0
+    for file_info in files:
+        if folder is not None and not file_info.name.startswith(folder):
+            continue
+        if file_info.type in SNAPSHOT_FILE_TYPES or (file_info.type in DISK_FILE_TYPES and
+                                                    DELTA_REGEX.search(file_info.name)):
+            size += file_info.size or 0
+    return size
+
+
+# SnapshotInfo of one VM from its collected properties, None when it has no snapshots
+def snapshot_info(name: str, props: dict) -> SnapshotInfo:
+    count, depth, oldest, newest = walk_trees(props.get('snapshot.rootSnapshotList'))
+    if not count:
+        return None
+    return SnapshotInfo(vm=name,
+                        snapshots=count,
+                        depth=depth,
+                        oldest=None if oldest is None else oldest.createTime,
+                        oldest_name=None if oldest is None else oldest.name,
+                        newest=None if newest is None else newest.createTime,
+                        size=snapshot_bytes(props.get('layoutEx.file') or []),
+                        committed=props.get('summary.storage.committed') or 0)
+
+
+# sort snapshot infos by one of the SORT_KEYS, VMs without a snapshot date go last when sorting by age
+def sort_infos(infos: list, sort_by: str) -> list:
+    if sort_by == 'Age':
+        dated = sorted((info for info in infos if info.oldest is not None), key=SORT_KEYS[sort_by])
+        return dated + [info for info in infos if info.oldest is None]
+    return sorted(infos, key=SORT_KEYS[sort_by])
+
+
+class SnapshotScanner:
+    """
+    Scans every connected vCenter for VMs with snapshots. on_page is called from the scanning threads with the
+    SnapshotInfos of each page read and the number of VMs scanned so far. stop() ends the scan after the pages being
+    read.
+    """
+
+    def __init__(self, data: DataTree, page_size: int = DEFAULT_PAGE_SIZE, on_page=None) -> None:
+        self.data = data
+        self.page_size = page_size
+        self.on_page = on_page
+        self.stopped = Event()
+        self.lock = Lock()
+        self.scanned = 0
+        self.round_trips = 0
+        self.seconds = 0.0
+
+    # scan one vCenter, returns its SnapshotInfos
+    def scan_source(self, source: Source) -> list:
+        filter_spec = build_filter_spec(source.content.rootFolder, {vim.VirtualMachine: SCAN_PROPERTIES})
+        stats = {'round_trips': 0}
+        infos = list()
+        page = list()
+        seen = 0
+        for obj_content in retrieve_objects(source.content.propertyCollector, [filter_spec], self.page_size, stats):
+            if self.stopped.is_set():
+                break
+            seen += 1
+            name = self.data.real_name(obj_content.obj) or obj_content.obj._moId
+            info = snapshot_info(name, props_to_dict(obj_content))
+            if info is not None:
+                page.append(info)
+            if seen % self.page_size == 0:
+                self.hand_out(page, self.page_size)
+                infos.extend(page)
+                page = list()
+        self.hand_out(page, seen % self.page_size)
+        infos.extend(page)
+        with self.lock:
+            self.round_trips += stats['round_trips']
+        return infos
+
+    def hand_out(self, page: list, scanned: int) -> None:
+        with self.lock:
+            self.scanned += scanned
+            total = self.scanned
+        if self.on_page is not None:
+            self.on_page(page, total)
+        return
+
+    # scan every connected vCenter side by side, returns every VM with snapshots
+    def run(self) -> list:
+        started = monotonic()
+        sources = self.data.connected_sources()
+        infos = list()
+        if sources:
+            with ThreadPoolExecutor(max_workers=len(sources)) as executor:
+                for source_infos in executor.map(self.scan_source, sources):
+                    infos.extend(source_infos)
+        self.seconds = monotonic() - started
+        return infos
+
+    def stop(self) -> None:
+        self.stopped.set()
+        return
@@ -0,0 +1,318 @@
+"""
+Batched statistics for the program. Each snapshot is fetched with a single PropertyCollector call for exactly the
+property paths the UI shows, instead of walking lazy pyVmomi properties one SOAP call at a time, and is kept for a
+short time so flipping back and forth between objects does not go back to the server.
+
+-=baka0taku=-
+"""
+from threading import Lock
+from time import monotonic, time
+from types import MappingProxyType
+from typing import NamedTuple
+from pyVmomi import vim, vmodl
+from DataTree import DataTree
+from Inventory import props_to_dict, retrieve_objects
+
+# seconds a snapshot is served from the cache
+DEFAULT_TTL = 15
+
+# every property the VM Tools tab needs
+VM_DETAIL_PROPERTIES = [
+    'config.hardware.numCPU',
+    'config.hardware.memoryMB',
+    'summary.quickStats.overallCpuUsage',
+    'summary.quickStats.guestMemoryUsage',
+    'summary.quickStats.swappedMemory',
+    'summary.storage.committed',
+    'runtime.powerState',
+    'runtime.instantCloneFrozen',
+    'runtime.host',
+    'layout.disk',
+    'layout.snapshot'
+]
+
+# every host property the Host Tools tab needs
+HOST_STAT_PROPERTIES = [
+    'summary.hardware.cpuMhz',
+    'summary.hardware.numCpuCores',
+    'summary.hardware.memorySize',
+    'summary.quickStats.overallCpuUsage',
+    'summary.quickStats.overallMemoryUsage',
+    'runtime.powerState',
+    'runtime.inMaintenanceMode',
+    'datastore'
+]
+
+# datastore properties collected alongside the hosts
+DATASTORE_STAT_PROPERTIES = [
+    'summary.capacity',
+    'summary.freeSpace'
+]
+
+
+# every datastore property the DS Tools tab needs
+DATASTORE_PANEL_PROPERTIES = [
+    'summary.type',
+    'summary.accessible',
+    'summary.capacity',
+    'summary.freeSpace',
+    'summary.uncommitted',
+    'vm'
+]
+
+
+class VmDetails(NamedTuple):
+    """
+    Display values for one VM, formatted the same way as the single value getters in FuncLib.
+    """
+    num_cpu: str
+    cpu_usage: str
+    memory_usage: str
+    total_memory: str
+    disk_usage: str
+    powered_on: str
+    frozen: str
+    num_disks: str
+    num_snapshots: str
+    num_files_per_disk: str
+    swapped_memory: str
+    host_name: str
+
+
+class HostStats(NamedTuple):
+    """
+    Usage of one host, percentages are whole numbers like the getters in FuncLib.
+    """
+    cpu_usage: int
+    memory_usage: int
+    storage_free: int
+    powered_on: bool
+    maintenance_mode: bool
+    datastores: tuple
+
+
+class HostStatsSnapshot(NamedTuple):
+    """
+    Usage of a set of hosts taken in one collection. Datastores shared between hosts are counted once in the totals.
+    """
+    taken: float
+    hosts: MappingProxyType
+    storage_capacity: int
+    storage_free_space: int
+
+    # percentage of free storage over every datastore the hosts can see
+    def storage_free(self) -> int:
+        return percentage(self.storage_free_space, self.storage_capacity)
+
+
+class DatastoreStats(NamedTuple):
+    """
+    Capacity of one datastore in bytes. Thin provisioned disks only take up what they have written, uncommitted is
+    what they may still grow by.
+    """
+    name: str
+    type: str
+    accessible: bool
+    capacity: int
+    free_space: int
+    uncommitted: int
+    num_vms: int
+
+    # bytes promised to the VMs on the datastore
+    def provisioned(self) -> int:
+        return self.capacity - self.free_space + self.uncommitted
+
+    # provisioned space over capacity, above 1.0 the datastore would run out if every disk filled up
+    def overcommit(self) -> float:
+        return self.provisioned() / self.capacity if self.capacity else 0.0
+
+
+class SnapshotCache:
+    """
+    Thread safe object key -> snapshot store where entries expire after ttl seconds.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL) -> None:
+        self.ttl = ttl
+        self.entries = dict()
+        self.lock = Lock()
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None or monotonic() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    def put(self, key: str, snapshot) -> None:
+        with self.lock:
+            self.entries[key] = (monotonic(), snapshot)
+        return
+
+    def invalidate(self, key: str = None) -> None:
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+        return
+
+
+vm_detail_cache = SnapshotCache()
+host_stats_cache = SnapshotCache()
+datastore_stats_cache = SnapshotCache()
+
+
+# whole percentage of part in total, 0 when total is unknown
+def percentage(part, total) -> int:
+    if not part or not total:
+        return 0
+    return int((part / total) * 100)
+
+
+# fetch raw property values for a list of objects of one type with one call per vCenter, keyed by object key
+def retrieve_properties(data: DataTree, objs: list, obj_type: type, paths: list) -> dict:
+    props = dict()
+    for source, source_objs in data.group_by_source(objs).items():
+        filter_spec = vmodl.query.PropertyCollector.FilterSpec()
+        filter_spec.objectSet = [vmodl.query.PropertyCollector.ObjectSpec(obj=obj) for obj in source_objs]
+        filter_spec.propSet = [vmodl.query.PropertyCollector.PropertySpec(type=obj_type, all=False, pathSet=paths)]
+        for obj_content in retrieve_objects(source.content.propertyCollector, [filter_spec]):
+            props[data.key_of(obj_content.obj)] = props_to_dict(obj_content)
+    return props
+
+
+# build display values from the collected properties of a VM
+def make_vm_details(props: dict, data: DataTree) -> VmDetails:
+    disks = props.get('layout.disk') or []
+    if len(disks) > 0 and disks[0].diskFile is not None:
+        num_files = str(len(disks[0].diskFile))
+    else:
+        num_files = '0'
+    host = props.get('runtime.host')
+    committed = props.get('summary.storage.committed') or 0
+    return VmDetails(
+        num_cpu=str(props.get('config.hardware.numCPU', 0)),
+        cpu_usage=str(props.get('summary.quickStats.overallCpuUsage', 0)) + ' Mhz',
+        memory_usage=str(props.get('summary.quickStats.guestMemoryUsage', 0)) + ' MB',
+        total_memory=str(props.get('config.hardware.memoryMB', 0)) + ' MB',
+        disk_usage=str(int(committed / 1073741824)) + ' GB',
+        powered_on=str(str(props.get('runtime.powerState')) == 'poweredOn'),
+        frozen=str(bool(props.get('runtime.instantCloneFrozen'))),
+        num_disks=str(len(disks)),
+        num_snapshots=str(len(props.get('layout.snapshot') or [])),
+        num_files_per_disk=num_files,
+        swapped_memory=str(props.get('summary.quickStats.swappedMemory', 0)) + 'MB',
+        host_name='' if host is None else data.moiddict.get(data.key_of(host), '')
+    )
+
+
+# get the details of one VM, from the cache when fresh enough
+def get_vm_details(data: DataTree, vm: vim.VirtualMachine, use_cache: bool = True) -> VmDetails:
+    if use_cache:
+        details = vm_detail_cache.get(data.key_of(vm))
+        if details is not None:
+            return details
+    props = retrieve_properties(data, [vm], vim.VirtualMachine, VM_DETAIL_PROPERTIES).get(data.key_of(vm), dict())
+    details = make_vm_details(props, data)
+    vm_detail_cache.put(data.key_of(vm), details)
+    return details
+
+
+# fetch stats for the given hosts and every datastore they mount with one call per vCenter
+def collect_host_stats(data: DataTree, hosts: list) -> HostStatsSnapshot:
+    traversal = vmodl.query.PropertyCollector.TraversalSpec(type=vim.HostSystem, path='datastore', skip=False)
+    host_props = dict()
+    ds_props = dict()
+    for source, source_hosts in data.group_by_source(hosts).items():
+        filter_spec = vmodl.query.PropertyCollector.FilterSpec()
+        filter_spec.objectSet = [vmodl.query.PropertyCollector.ObjectSpec(obj=host, selectSet=[traversal])
+                                 for host in source_hosts]
+        filter_spec.propSet = [
+            vmodl.query.PropertyCollector.PropertySpec(type=vim.HostSystem, all=False, pathSet=HOST_STAT_PROPERTIES),
+            vmodl.query.PropertyCollector.PropertySpec(type=vim.Datastore, all=False,
+                                                       pathSet=DATASTORE_STAT_PROPERTIES)
+        ]
+        for obj_content in retrieve_objects(source.content.propertyCollector, [filter_spec]):
+            if isinstance(obj_content.obj, vim.HostSystem):
+                host_props[data.key_of(obj_content.obj)] = props_to_dict(obj_content)
+            else:
+                ds_props[data.key_of(obj_content.obj)] = props_to_dict(obj_content)
+
+    hosts_stats = dict()
+    seen_datastores = set()
+    for key, props in host_props.items():
+        datastores = tuple(dict.fromkeys(data.key_of(ds) for ds in props.get('datastore') or []))
+        seen_datastores.update(datastores)
+        capacity = sum(ds_props.get(ds, dict()).get('summary.capacity') or 0 for ds in datastores)
+        free_space = sum(ds_props.get(ds, dict()).get('summary.freeSpace') or 0 for ds in datastores)
+        cpu_mhz = props.get('summary.hardware.cpuMhz') or 0
+        cores = props.get('summary.hardware.numCpuCores') or 0
+        memory_mb = (props.get('summary.hardware.memorySize') or 0) / 1024 / 1024
+        hosts_stats[key] = HostStats(
+            cpu_usage=percentage(props.get('summary.quickStats.overallCpuUsage'), cpu_mhz * cores),
+            memory_usage=percentage(props.get('summary.quickStats.overallMemoryUsage'), memory_mb),
+            storage_free=percentage(free_space, capacity),
+            powered_on=str(props.get('runtime.powerState')) == 'poweredOn',
+            maintenance_mode=bool(props.get('runtime.inMaintenanceMode')),
+            datastores=datastores
+        )
+    return HostStatsSnapshot(
+        taken=time(),
+        hosts=MappingProxyType(hosts_stats),
+        storage_capacity=sum(ds_props.get(ds, dict()).get('summary.capacity') or 0 for ds in seen_datastores),
+        storage_free_space=sum(ds_props.get(ds, dict()).get('summary.freeSpace') or 0 for ds in seen_datastores)
+    )
+
+
+# get the stats of every host in DataTree, from the cache when fresh enough
+def get_all_host_stats(data: DataTree, use_cache: bool = True) -> HostStatsSnapshot:
+    if use_cache:
+        snapshot = host_stats_cache.get('all')
+        if snapshot is not None:
+            return snapshot
+    snapshot = collect_host_stats(data, list(data.hostdict.values()))
+    host_stats_cache.put('all', snapshot)
+    for key, stats in snapshot.hosts.items():
+        host_stats_cache.put(key, stats)
+    return snapshot
+
+
+# get the stats of one host, from the cache when fresh enough
+def get_host_stats(data: DataTree, host: vim.HostSystem, use_cache: bool = True) -> HostStats:
+    if use_cache:
+        stats = host_stats_cache.get(data.key_of(host))
+        if stats is not None:
+            return stats
+    snapshot = collect_host_stats(data, [host])
+    stats = snapshot.hosts.get(data.key_of(host))
+    if stats is not None:
+        host_stats_cache.put(data.key_of(host), stats)
+    return stats
+
+
+# get the stats of every datastore in DataTree with one call per vCenter, most overcommitted first
+def get_all_datastore_stats(data: DataTree, use_cache: bool = True) -> list:
+    if use_cache:
+        ranked = datastore_stats_cache.get('all')
+        if ranked is not None:
+            return ranked
+    datastores = list(data.datastoredict.values())
+    props = retrieve_properties(data, datastores, vim.Datastore, DATASTORE_PANEL_PROPERTIES)
+    ranked = list()
+    for ds in datastores:
+        ds_props = props.get(data.key_of(ds))
+        if ds_props is None:
+            continue
+        ranked.append(DatastoreStats(
+            name=data.moiddict.get(data.key_of(ds), ds._moId),
+            type=str(ds_props.get('summary.type', '')),
+            accessible=bool(ds_props.get('summary.accessible')),
+            capacity=ds_props.get('summary.capacity') or 0,
+            free_space=ds_props.get('summary.freeSpace') or 0,
+            uncommitted=ds_props.get('summary.uncommitted') or 0,
+            num_vms=len(ds_props.get('vm') or [])
+        ))
+    ranked.sort(key=lambda stats: stats.overcommit(), reverse=True)
+    datastore_stats_cache.put('all', ranked)
+    return ranked
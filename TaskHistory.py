@@ -0,0 +1,170 @@
+"""
+Task history for the program. A TaskHistoryCollector is created for one inventory entity. Its latest page holds the
+newest tasks and comes first, older pages are read backwards from there with ReadPreviousTasks only when they are
+asked for, so a cluster with thousands of tasks never has to be read in one go. The collector counts against a
+per-session limit on the server, so it is always destroyed when the history is closed.
+
+-=baka0taku=-
+"""
+from datetime import timedelta
+from threading import Event, Lock
+from pyVmomi import vim, vmodl
+from DataTree import DataTree
+
+# tasks read per ReadPreviousTasks call
+DEFAULT_PAGE_SIZE = 100
+
+# inventory levels a history can cover
+SCOPES = ('VM', 'Host', 'Cluster', 'Datacenter')
+
+# task states the history can be filtered by
+TASK_STATES = ('queued', 'running', 'success', 'error')
+
+# time filters and how far back each one reaches
+TIME_RANGES = {
+    'Any time': None,
+    'Last hour': timedelta(hours=1),
+    'Last 24 hours': timedelta(days=1),
+    'Last 7 days': timedelta(days=7),
+    'Last 30 days': timedelta(days=30)
+}
+
+# column headings of a history row
+TASK_COLUMNS = ('Started', 'State', 'Task', 'Entity', 'Completed', 'Duration', 'Progress')
+
+
+# first entity of a type on the parent chain of an entity, the entity itself included
+def parent_of_type(entity: vim.ManagedEntity, entity_type):
+    while entity is not None and not isinstance(entity, entity_type):
+        entity = entity.parent
+    return entity
+
+
+# the entity a history of the given scope covers for a VM or host, None when the VM or host is not in one
+def scope_entity(entity: vim.ManagedEntity, scope: str) -> vim.ManagedEntity:
+    if scope == 'VM':
+        return entity if isinstance(entity, vim.VirtualMachine) else None
+    host = entity.runtime.host if isinstance(entity, vim.VirtualMachine) else entity
+    if scope == 'Host':
+        return host
+    if scope == 'Cluster':
+        return None if host is None else parent_of_type(host.parent, vim.ClusterComputeResource)
+    # VMs inside a vApp have no parent folder, their host leads to the datacenter too
+    start = entity.parent if entity.parent is not None else host
+    return None if start is None else parent_of_type(start, vim.Datacenter)
+
+
+# task filter for an entity and everything below it, optionally limited to some states and a start time
+def build_task_filter(entity: vim.ManagedEntity, states: list = None, begin=None) -> vim.TaskFilterSpec:
+    filter_spec = vim.TaskFilterSpec()
+    recursion = 'self' if isinstance(entity, vim.VirtualMachine) else 'all'
+    filter_spec.entity = vim.TaskFilterSpec.ByEntity(entity=entity, recursion=recursion)
+    if states:
+        filter_spec.state = states
+    if begin is not None:
+        filter_spec.time = vim.TaskFilterSpec.ByTime(timeType='startedTime', beginTime=begin)
+    return filter_spec
+
+
+# drop the fraction of a second from a duration
+def short_duration(value: timedelta) -> str:
+    text = str(value)
+    return text[:text.rfind('.')] if '.' in text else text
+
+
+# one row of the history table
+def task_row(task: vim.TaskInfo) -> list:
+    started = task.startTime.strftime('%Y-%m-%d %H:%M:%S') if task.startTime is not None else ''
+    if task.completeTime is not None:
+        completed = task.completeTime.strftime('%H:%M:%S')
+        duration = short_duration(task.completeTime - task.startTime) if task.startTime is not None else ''
+        progress = '100'
+    else:
+        completed = ''
+        duration = ''
+        progress = '' if task.progress is None else str(task.progress)
+    return [started, str(task.state), str(task.descriptionId), str(task.entityName or ''), completed, duration,
+            progress]
+
+
+# tasks newest first, queued tasks have no start time yet so their queue time stands in for it
+def newest_first(tasks: list) -> list:
+    return sorted(tasks, key=lambda task: task.startTime or task.queueTime, reverse=True)
+
+
+class TaskHistory:
+    """
+    History of the tasks of one entity. Each next_page() call returns one more page, the latest page first, until
+    exhausted is set. close() destroys the collector and may be called from any thread, it waits for a page being
+    read.
+    """
+
+    def __init__(self, data: DataTree, entity: vim.ManagedEntity, states: list = None, since: timedelta = None,
+                 page_size: int = DEFAULT_PAGE_SIZE) -> None:
+        self.data = data
+        self.entity = entity
+        self.states = states
+        self.since = since
+        self.page_size = page_size
+        self.collector: vim.TaskHistoryCollector
+        self.collector = None
+        self.read = 0
+        self.pages = 0
+        self.exhausted = False
+        self.lock = Lock()
+        self.stopped = Event()
+
+    def open(self) -> None:
+        source = self.data.source_of(self.entity)
+        begin = None
+        if self.since is not None:
+            # the vCenter clock decides what the last hour is, not the local one
+            begin = source.connection.CurrentTime() - self.since
+        filter_spec = build_task_filter(self.entity, self.states, begin)
+        self.collector = source.content.taskManager.CreateCollectorForTasks(filter=filter_spec)
+        # the latest page holds the newest page_size tasks, reading backwards starts just before it
+        self.collector.SetCollectorPageSize(self.page_size)
+        self.collector.ResetCollector()
+        return
+
+    # the latest page on the first call, the page before the last one read on the next calls, newest first. Empty
+    # once the oldest task was read or the history was closed.
+    def next_page(self) -> list:
+        with self.lock:
+            if self.stopped.is_set() or self.exhausted:
+                return []
+            if self.collector is None:
+                self.open()
+            if self.pages == 0:
+                tasks = list(self.collector.latestPage or [])
+            else:
+                tasks = self.read_older()
+            self.pages += 1
+            self.read += len(tasks)
+            # a short page is the last one
+            self.exhausted = len(tasks) < self.page_size
+        return newest_first(tasks)
+
+    # page of tasks older than the last page read
+    def read_older(self) -> list:
+        return self.collector.ReadPreviousTasks(maxCount=self.page_size) or []
+
+    def close(self) -> None:
+        self.stopped.set()
+        with self.lock:
+            if self.collector is None:
+                return
+            try:
+                self.collector.DestroyCollector()
+            except (vmodl.fault.ManagedObjectNotFound, vim.fault.NotAuthenticated):
+                pass
+            self.collector = None
+        return
+
+    def __enter__(self) -> 'TaskHistory':
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+        return
@@ -0,0 +1,276 @@
+"""
+Task completion tracking for the program. Instead of sleeping and reading tsk.info.error once, every task is added to
+a ListView that a single PropertyCollector filter watches for info.state, info.progress and info.error. One
+WaitForUpdatesEx long-poll per connection covers any number of tasks, and each task is handed back as a Future.
+
+-=baka0taku=-
+"""
+from concurrent.futures import Future, wait
+from threading import Lock, Thread
+from pyVmomi import vim, vmodl
+
+# how long a single WaitForUpdatesEx long-poll may block
+DEFAULT_WAIT_SECONDS = 60
+
+# task properties the tracker watches
+TASK_PROPERTIES = ['info.state', 'info.progress', 'info.error', 'info.result']
+
+
+class TaskTracker:
+    """
+    Watches the tasks of one connection. Use TaskTracker.for_stub() or watch_task() rather than creating one directly
+    so every task of a connection shares the same filter and long-poll.
+
+    on_error is called from the tracker thread with (task, fault) for every task that ends in error, and on_progress
+    with (task, percent) whenever a running task reports progress.
+    """
+    __trackers__ = dict()
+    __lock__ = Lock()
+    on_error = None
+    on_progress = None
+
+    def __init__(self, stub, wait_seconds: int = DEFAULT_WAIT_SECONDS) -> None:
+        self.stub = stub
+        self.wait_seconds = wait_seconds
+        self.lock = Lock()
+        self.futures = dict()
+        self.tasks = dict()
+        self.version = ''
+        self.list_view: vim.view.ListView
+        self.list_view = None
+        self.collector: vmodl.query.PropertyCollector
+        self.collector = None
+        self.thread: Thread
+        self.thread = None
+
+    # method to return the tracker of a connection
+    @staticmethod
+    def for_stub(stub) -> 'TaskTracker':
+        with TaskTracker.__lock__:
+            tracker = TaskTracker.__trackers__.get(stub)
+            if tracker is None:
+                tracker = TaskTracker(stub)
+                TaskTracker.__trackers__[stub] = tracker
+        return tracker
+
+    # method to forget the tracker of a closed connection
+    @staticmethod
+    def drop(stub) -> None:
+        with TaskTracker.__lock__:
+            tracker = TaskTracker.__trackers__.pop(stub, None)
+        if tracker is not None:
+            tracker.stop()
+        return
+
+    # create the list view and the filter watching it
+    def setup(self) -> None:
+        content = vim.ServiceInstance('ServiceInstance', self.stub).RetrieveContent()
+        self.list_view = content.viewManager.CreateListView(obj=[])
+        traversal = vmodl.query.PropertyCollector.TraversalSpec(type=vim.view.ListView, path='view', skip=False)
+        filter_spec = vmodl.query.PropertyCollector.FilterSpec()
+        filter_spec.objectSet = [vmodl.query.PropertyCollector.ObjectSpec(obj=self.list_view, skip=True,
+                                                                          selectSet=[traversal])]
+        filter_spec.propSet = [vmodl.query.PropertyCollector.PropertySpec(type=vim.Task, all=False,
+                                                                          pathSet=TASK_PROPERTIES)]
+        self.collector = content.propertyCollector.CreatePropertyCollector()
+        self.collector.CreateFilter(filter_spec, partialUpdates=False)
+        self.version = ''
+        return
+
+    # start watching tasks, returns one Future per task resolving to info.result or raising info.error. The tasks are
+    # added to the list view with one call, made outside the lock so finishing tasks are not held up behind it.
+    def submit_all(self, tasks: list) -> list:
+        futures = list()
+        for task in tasks:
+            future = Future()
+            future.task = task
+            future.set_running_or_notify_cancel()
+            futures.append(future)
+        if not tasks:
+            return futures
+        with self.lock:
+            if self.collector is None:
+                self.setup()
+            list_view = self.list_view
+            for task, future in zip(tasks, futures):
+                self.futures[task._moId] = future
+                self.tasks[task._moId] = task
+        try:
+            unresolved = list_view.ModifyListView(add=tasks)
+        except Exception as e:
+            for task in tasks:
+                self.fail(task._moId, e)
+            return futures
+        for task in unresolved or []:
+            # the task is already gone from the server
+            self.fail(task._moId, vmodl.fault.ManagedObjectNotFound(obj=task))
+        with self.lock:
+            if self.futures and self.thread is None:
+                self.thread = Thread(target=self.run, daemon=True)
+                self.thread.start()
+        return futures
+
+    # start watching a task, returns a Future resolving to info.result or raising info.error
+    def submit(self, task: vim.Task) -> Future:
+        return self.submit_all([task])[0]
+
+    # number of tasks still being watched
+    def pending(self) -> int:
+        with self.lock:
+            return len(self.futures)
+
+    # resolve the future of a finished task and take it out of the list view
+    def finish(self, moid: str, info: dict) -> None:
+        with self.lock:
+            future = self.futures.pop(moid, None)
+            task = self.tasks.pop(moid, None)
+            # fail_all may drop the list view as soon as the lock is released
+            list_view = self.list_view
+        if task is not None and list_view is not None:
+            try:
+                list_view.ModifyListView(remove=[task])
+            except vmodl.fault.ManagedObjectNotFound:
+                pass
+        if future is None:
+            return
+        if info.get('info.state') == vim.TaskInfo.State.error:
+            fault = info.get('info.error')
+            if TaskTracker.on_error is not None:
+                TaskTracker.on_error(task, fault)
+            future.set_exception(fault if fault is not None else vmodl.MethodFault())
+        else:
+            future.set_result(info.get('info.result'))
+        return
+
+    # a task that left the list view, finished tasks have been removed by finish() already. One the server purged
+    # before its final state was seen is read once more, and its future fails when that is no longer possible.
+    def leave(self, moid: str) -> None:
+        with self.lock:
+            task = self.tasks.get(moid)
+        if task is None:
+            return
+        try:
+            info = task.info
+        except vmodl.MethodFault as e:
+            self.fail(moid, e)
+            return
+        if info.state in (vim.TaskInfo.State.success, vim.TaskInfo.State.error):
+            self.finish(moid, {'info.state': info.state, 'info.error': info.error, 'info.result': info.result})
+        else:
+            self.fail(moid, vmodl.fault.ManagedObjectNotFound(obj=task))
+        return
+
+    # fail the future of one task
+    def fail(self, moid: str, error: Exception) -> None:
+        with self.lock:
+            future = self.futures.pop(moid, None)
+            self.tasks.pop(moid, None)
+        if future is not None:
+            future.set_exception(error)
+        return
+
+    # apply one update set, returns nothing
+    def apply_update_set(self, update_set: vmodl.query.PropertyCollector.UpdateSet) -> None:
+        for filter_update in update_set.filterSet:
+            for obj_update in filter_update.objectSet:
+                if obj_update.kind == 'leave':
+                    self.leave(obj_update.obj._moId)
+                    continue
+                info = dict()
+                for change in obj_update.changeSet:
+                    info[change.name] = change.val
+                moid = obj_update.obj._moId
+                state = info.get('info.state')
+                if state in (vim.TaskInfo.State.success, vim.TaskInfo.State.error):
+                    self.finish(moid, info)
+                elif info.get('info.progress') is not None and TaskTracker.on_progress is not None:
+                    TaskTracker.on_progress(obj_update.obj, info['info.progress'])
+        return
+
+    # background loop, exits once no task is left to watch
+    def run(self) -> None:
+        options = vmodl.query.PropertyCollector.WaitOptions(maxWaitSeconds=self.wait_seconds)
+        while True:
+            with self.lock:
+                if not self.futures:
+                    self.thread = None
+                    return
+            try:
+                update_set = self.collector.WaitForUpdatesEx(self.version, options)
+            except vmodl.fault.RequestCanceled:
+                continue
+            except Exception as e:
+                self.fail_all(e)
+                return
+            if update_set is None:
+                continue
+            self.version = update_set.version
+            self.apply_update_set(update_set)
+
+    # fail every pending future and release the server side objects, used when the session behind the tracker is
+    # lost and when the tracker is stopped
+    def fail_all(self, error: Exception) -> None:
+        with self.lock:
+            futures = list(self.futures.values())
+            self.futures.clear()
+            self.tasks.clear()
+            collector = self.collector
+            list_view = self.list_view
+            self.collector = None
+            self.list_view = None
+            self.thread = None
+        try:
+            if collector is not None:
+                collector.DestroyPropertyCollector()
+            if list_view is not None:
+                list_view.DestroyView()
+        except Exception:
+            # a lost session has taken them with it
+            pass
+        for future in futures:
+            future.set_exception(error)
+        return
+
+    # wake the tracker thread and release the server side objects
+    def stop(self) -> None:
+        with self.lock:
+            collector = self.collector
+        try:
+            if collector is not None:
+                collector.CancelWaitForUpdates()
+        except Exception:
+            pass
+        self.fail_all(vmodl.fault.RequestCanceled())
+        return
+
+
+# readable message for a fault or exception
+def error_text(error: Exception) -> str:
+    return getattr(error, 'msg', None) or str(error) or type(error).__name__
+
+
+# watch tasks on the trackers of their own connections, the tasks of each connection are added to its list view with
+# one call. Returns the Futures in task order, callback is called with each finished Future.
+def watch_tasks(tasks: list, callback=None) -> list:
+    futures = [None] * len(tasks)
+    groups = dict()
+    for index, task in enumerate(tasks):
+        groups.setdefault(task._stub, list()).append(index)
+    for stub, indexes in groups.items():
+        submitted = TaskTracker.for_stub(stub).submit_all([tasks[index] for index in indexes])
+        for index, future in zip(indexes, submitted):
+            futures[index] = future
+    if callback is not None:
+        for future in futures:
+            future.add_done_callback(callback)
+    return futures
+
+
+# watch a task on the tracker of its own connection, callback is called with the finished Future
+def watch_task(task: vim.Task, callback=None) -> Future:
+    return watch_tasks([task], callback)[0]
+
+
+# block until every task is finished, returns (done, not_done) sets of Futures
+def wait_tasks(tasks: list, timeout: float = None) -> tuple:
+    return wait(watch_tasks(tasks), timeout=timeout)
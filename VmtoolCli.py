@@ -0,0 +1,422 @@
+"""
+Headless command line front end for the program. It drives the same FuncLib operations as the Kivy app without ever
+importing Kivy, prints JSON, and reads VM names from stdin when none are given so it can be used from cron jobs and
+CI pipelines, e.g.
+
+    vmtool-cli --server vc01 --user admin list vms --search "lab power:poweredoff" | jq -r '.results[]' |
+        vmtool-cli --server vc01 --user admin power on
+
+-=baka0taku=-
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from getpass import getpass
+from http.client import HTTPException
+from queue import Queue
+from pyVmomi import vmodl
+from BulkFreeze import DEFAULT_TRACK_SECONDS, FREEZE_SCRIPTS, BulkFreeze, summarize
+from BulkPower import ACTIONS, BulkPower
+from CloneEngine import BulkCloneEngine
+from CloneGC import DEFAULT_MIN_AGE_DAYS, DEFAULT_WORKERS, CloneGC
+from CloneGC import summarize as summarize_gc
+from ConsoleTyper import DEFAULT_CHUNK_KEYS, ConsoleTyper
+from DataTree import DataTree
+from FuncLib import (clone_vm, close_connection, create_snapshot, delete_vm, get_content, make_connection, migrate_vm,
+                     promote_clone)
+from Inventory import DEFAULT_PAGE_SIZE, load_inventory
+from PortgroupBuilder import DEFAULT_NAME_PATTERN, PortgroupBuilder
+from SessionPool import SessionPool, pooled_map
+from SnapshotScanner import SORT_KEYS, SnapshotScanner, sort_infos
+from TaskTracker import error_text
+
+# inventory dictionaries the list command can show
+LIST_KINDS = {
+    'vms': 'vmdict',
+    'hosts': 'hostdict',
+    'datastores': 'datastoredict',
+    'networks': 'networkdict',
+    'portgroups': 'dvportgroupdict',
+    'dvswitches': 'dvswitchdict'
+}
+
+
+# VM names from the command line, or one per line from stdin when none (or "-") were given
+def read_names(names: list) -> list:
+    if names and names != ['-']:
+        return names
+    return [line.strip() for line in sys.stdin if line.strip()]
+
+
+# run a task returning action for every VM, action is called as action(vmobj, callback). Tasks are sent over the
+# session pool when there is one.
+def run_tasks(data: DataTree, names: list, action, wait: bool) -> list:
+    results = list()
+    finished = Queue()
+    names_of = dict()
+    for name in names:
+        vmobj = data.vmdict.get(name)
+        if vmobj is None:
+            results.append({'vm': name, 'ok': False, 'error': 'VM not found.'})
+            continue
+        names_of[data.key_of(vmobj)] = name
+
+    def send(vmobj):
+        return action(vmobj, lambda future, vm_name=names_of[data.key_of(vmobj)]: finished.put((vm_name, future)))
+    sent = 0
+    vmobjs = [data.vmdict[name] for name in names_of.values()]
+    for vmobj, ok, error in pooled_map(data, send, vmobjs):
+        name = names_of[data.key_of(vmobj)]
+        if error is not None:
+            results.append({'vm': name, 'ok': False, 'error': error_text(error)})
+        elif not ok:
+            results.append({'vm': name, 'ok': False, 'error': 'Task not sent.'})
+        elif wait:
+            sent += 1
+        else:
+            results.append({'vm': name, 'ok': True, 'error': None})
+    for x in range(sent):
+        name, future = finished.get()
+        error = future.exception()
+        results.append({'vm': name, 'ok': error is None, 'error': None if error is None else error_text(error)})
+    return results
+
+
+def cmd_list(data: DataTree, args) -> dict:
+    names = list(getattr(data, LIST_KINDS[args.kind]).keys())
+    if args.search:
+        from SearchIndex import SearchIndex
+        index = SearchIndex()
+        if args.kind == 'vms':
+            index.rebuild(names, {name: data.attrs_of(data.vmdict[name]) for name in names})
+        else:
+            index.rebuild(names)
+        names = index.search(args.search)
+    return {'ok': True, 'results': sorted(names, key=str.lower)}
+
+
+def cmd_info(data: DataTree, args) -> dict:
+    from Stats import get_vm_details
+    results = list()
+    for name in read_names(args.vms):
+        vmobj = data.vmdict.get(name)
+        if vmobj is None:
+            results.append({'vm': name, 'ok': False, 'error': 'VM not found.'})
+            continue
+        details = get_vm_details(data=data, vm=vmobj, use_cache=False)
+        results.append({'vm': name, 'ok': True, 'details': details._asdict()})
+    return {'results': results}
+
+
+def cmd_power(data: DataTree, args) -> dict:
+    results = list()
+    vms = list()
+    for name in read_names(args.vms):
+        vmobj = data.vmdict.get(name)
+        if vmobj is None:
+            results.append({'vm': name, 'ok': False, 'error': 'VM not found.'})
+        else:
+            vms.append(vmobj)
+    # one pre-flight collection, then power-on per datacenter and everything else fanned out
+    job = BulkPower(data=data, vms=vms)
+    job.preflight()
+    results.extend(result._asdict() for result in job.run(args.action, args.wait))
+    return {'preflight': job.counts(), 'results': results}
+
+
+def cmd_clone(data: DataTree, args) -> dict:
+    names = read_names(args.vms)
+    if args.type == 'full':
+        def action(vm, callback):
+            return clone_vm(vm, args.name.format(vm=data.real_name(vm) or vm.name), callback)
+        return {'results': run_tasks(data, names, action, args.wait)}
+    engine = BulkCloneEngine(data=data, clone_type=args.type, max_in_flight=args.max_in_flight,
+                             per_host=args.per_host, per_datastore=args.per_datastore)
+    report = engine.run(vm_names=names, num_of_clones=args.count)
+    # parents that are not in the inventory are among the failures of the report
+    return {'ok': not report.failed, 'report': report._asdict(),
+            'results': [{'vm': name, 'ok': False, 'error': error} for name, error in report.failed]}
+
+
+def cmd_promote(data: DataTree, args) -> dict:
+    return {'results': run_tasks(data, read_names(args.vms), promote_clone, args.wait)}
+
+
+def cmd_snapshot(data: DataTree, args) -> dict:
+    def action(vm, callback):
+        return create_snapshot(snapshot_name=args.name, vm=vm, snapshot_desc=args.description,
+                               snapshot_memory=args.memory, snapshot_quiesce=args.quiesce, callback=callback)
+    return {'results': run_tasks(data, read_names(args.vms), action, args.wait)}
+
+
+def cmd_migrate(data: DataTree, args) -> dict:
+    hostobj = data.hostdict.get(args.host)
+    dsobj = data.datastoredict.get(args.datastore)
+    if hostobj is None or dsobj is None:
+        return {'ok': False, 'error': 'Host or datastore not found.', 'results': []}
+
+    def action(vm, callback):
+        return migrate_vm(vmobj=vm, hostobj=hostobj, dsobj=dsobj, callback=callback)
+    return {'results': run_tasks(data, read_names(args.vms), action, args.wait)}
+
+
+def cmd_delete(data: DataTree, args) -> dict:
+    return {'results': run_tasks(data, read_names(args.vms), delete_vm, args.wait)}
+
+
+def cmd_freeze(data: DataTree, args) -> dict:
+    password = os.environ.get(args.guest_password_env)
+    if password is None:
+        password = getpass('Guest password for ' + args.guest_user + ': ', stream=sys.stderr)
+    results = list()
+    vms = list()
+    for name in read_names(args.vms):
+        vmobj = data.vmdict.get(name)
+        if vmobj is None:
+            results.append({'vm': name, 'ok': False, 'error': 'VM not found.'})
+        else:
+            vms.append(vmobj)
+    job = BulkFreeze(data=data, user=args.guest_user, password=password, script_type=args.script,
+                     workers=args.workers, track_seconds=args.track_seconds)
+    freezes = job.run(vms)
+    results.extend(result._asdict() for result in freezes)
+    return {'summary': summarize(freezes), 'results': results}
+
+
+def cmd_type(data: DataTree, args) -> dict:
+    try:
+        typer = ConsoleTyper(data=data, text=args.text, chunk_keys=args.chunk_keys)
+    except ValueError as e:
+        return {'ok': False, 'error': str(e), 'results': []}
+    results = list()
+    vms = list()
+    for name in read_names(args.vms):
+        vmobj = data.vmdict.get(name)
+        if vmobj is None:
+            results.append({'vm': name, 'ok': False, 'error': 'VM not found.'})
+        else:
+            vms.append(vmobj)
+    typed = typer.run(vms)
+    for result in typed:
+        row = result._asdict()
+        row['keys_per_second'] = round(result.keys_per_second(), 1)
+        results.append(row)
+    return {'keys': len(typer.key_events), 'chunks': len(typer.specs), 'seconds': round(typer.seconds, 3),
+            'keys_per_second': round(typer.keys_per_second(typed), 1), 'results': results}
+
+
+def cmd_portgroups(data: DataTree, args) -> dict:
+    pgobj = data.dvportgroupdict.get(args.parent)
+    if pgobj is None:
+        return {'ok': False, 'error': 'Portgroup not found.', 'results': []}
+    builder = PortgroupBuilder(data=data)
+    try:
+        plans = builder.plan(parent=pgobj, count=args.count, name_pattern=args.name, vlan_start=args.vlan_start,
+                             vlan_step=args.vlan_step, first=args.first)
+    except ValueError as e:
+        return {'ok': False, 'error': str(e), 'results': []}
+    if args.dry_run:
+        return {'results': [{'portgroup': plan.name, 'vlan': plan.vlan, 'switch': plan.switch_name, 'ok': True,
+                             'error': None} for plan in plans]}
+    report = builder.create(plans, batch=not args.one_by_one)
+    return {'mode': report.mode, 'tasks': report.tasks, 'one_by_one_tasks': report.portgroups,
+            'batched_tasks': report.switches, 'seconds': round(report.seconds, 3),
+            'results': [{'portgroup': plan.name, 'vlan': plan.vlan, 'switch': plan.switch_name,
+                         'ok': plan.name not in report.failed, 'error': report.failed.get(plan.name)}
+                        for plan in plans]}
+
+
+def cmd_snapshots(data: DataTree, args) -> dict:
+    job = SnapshotScanner(data=data, page_size=args.page_size)
+    found = sort_infos(job.run(), args.sort)
+    results = list()
+    for info in found:
+        if info.age_days() < args.min_age_days:
+            continue
+        row = info._asdict()
+        row['age_days'] = round(info.age_days(), 1)
+        row['ok'] = True
+        results.append(row)
+    return {'ok': True, 'scanned': job.scanned, 'with_snapshots': len(found), 'round_trips': job.round_trips,
+            'seconds': round(job.seconds, 3), 'bytes': sum(info.size for info in found), 'results': results}
+
+
+def cmd_gc(data: DataTree, args) -> dict:
+    job = CloneGC(data=data, min_age_days=args.min_age_days, include_powered_on=args.include_powered_on,
+                  parents=args.parents, workers=args.workers)
+    infos = job.scan()
+    results = job.run(infos, dry_run=not args.destroy)
+    kept = dict()
+    for info in infos:
+        if info.verdict != 'collect':
+            kept[info.verdict] = kept.get(info.verdict, 0) + 1
+    return {'clones': len(infos), 'orphans': sum(1 for info in infos if not info.parent_exists), 'kept': kept,
+            'summary': summarize_gc(results), 'seconds': round(job.seconds, 3),
+            'results': [result._asdict() for result in results]}
+
+
+# build the argument parser
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='vmtool-cli', description='Headless vCenter tools, JSON output.')
+    parser.add_argument('--server', default=os.environ.get('VMTOOL_SERVER'), help='vCenter FQDN or IP address, '
+                        'several separated by commas (default $VMTOOL_SERVER)')
+    parser.add_argument('--user', default=os.environ.get('VMTOOL_USER'), help='user name (default $VMTOOL_USER)')
+    parser.add_argument('--password-env', default='VMTOOL_PASSWORD', help='environment variable holding the '
+                        'password, prompted for when unset (default VMTOOL_PASSWORD)')
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE, help='inventory page size')
+    parser.add_argument('--sessions', type=int, default=1, help='vCenter sessions to send tasks over in parallel')
+    parser.add_argument('--no-wait', dest='wait', action='store_false', help='return once tasks are sent instead '
+                        'of waiting for them to finish')
+    commands = parser.add_subparsers(dest='command', required=True)
+    vms_help = 'VM names, read from stdin one per line when omitted or "-"'
+
+    p = commands.add_parser('list', help='list inventory names')
+    p.add_argument('kind', choices=sorted(LIST_KINDS.keys()))
+    p.add_argument('--search', help='search query, e.g. "web host:esx01 power:poweredon"')
+    p.set_defaults(func=cmd_list)
+
+    p = commands.add_parser('info', help='show VM details')
+    p.add_argument('vms', nargs='*', help=vms_help)
+    p.set_defaults(func=cmd_info)
+
+    p = commands.add_parser('power', help='power operations')
+    p.add_argument('action', choices=sorted(ACTIONS.keys()))
+    p.add_argument('vms', nargs='*', help=vms_help)
+    p.set_defaults(func=cmd_power)
+
+    p = commands.add_parser('clone', help='linked, instant or full clones')
+    p.add_argument('type', choices=['linked', 'instant', 'full'])
+    p.add_argument('vms', nargs='*', help=vms_help)
+    p.add_argument('--count', type=int, default=1, help='clones per VM (linked and instant)')
+    p.add_argument('--name', default='{vm}-clone', help='name of a full clone, {vm} is the source name')
+    p.add_argument('--max-in-flight', type=int, default=16)
+    p.add_argument('--per-host', type=int, default=4)
+    p.add_argument('--per-datastore', type=int, default=4)
+    p.set_defaults(func=cmd_clone)
+
+    p = commands.add_parser('promote', help='promote linked clones')
+    p.add_argument('vms', nargs='*', help=vms_help)
+    p.set_defaults(func=cmd_promote)
+
+    p = commands.add_parser('snapshot', help='create snapshots')
+    p.add_argument('vms', nargs='*', help=vms_help)
+    p.add_argument('--name', required=True)
+    p.add_argument('--description', default='')
+    p.add_argument('--memory', action='store_true')
+    p.add_argument('--quiesce', action='store_true')
+    p.set_defaults(func=cmd_snapshot)
+
+    p = commands.add_parser('migrate', help='relocate VMs')
+    p.add_argument('vms', nargs='*', help=vms_help)
+    p.add_argument('--host', required=True)
+    p.add_argument('--datastore', required=True)
+    p.set_defaults(func=cmd_migrate)
+
+    p = commands.add_parser('freeze', help='run an instant clone freeze script in the guests')
+    p.add_argument('vms', nargs='*', help=vms_help)
+    p.add_argument('--script', required=True, choices=sorted(FREEZE_SCRIPTS.keys()))
+    p.add_argument('--guest-user', required=True)
+    p.add_argument('--guest-password-env', default='VMTOOL_GUEST_PASSWORD', help='environment variable holding '
+                   'the guest password, prompted for when unset (default VMTOOL_GUEST_PASSWORD)')
+    p.add_argument('--workers', type=int, help='VMs frozen at the same time')
+    p.add_argument('--track-seconds', type=float, default=DEFAULT_TRACK_SECONDS,
+                   help='how long to follow each started script')
+    p.set_defaults(func=cmd_freeze)
+
+    p = commands.add_parser('type', help='type text into VM consoles')
+    p.add_argument('vms', nargs='*', help=vms_help)
+    p.add_argument('--text', required=True, help='text to type, chords like {ctrl+alt+del} or {enter}')
+    p.add_argument('--chunk-keys', type=int, default=DEFAULT_CHUNK_KEYS, help='key events per PutUsbScanCodes call')
+    p.set_defaults(func=cmd_type)
+
+    p = commands.add_parser('snapshots', help='report snapshot age, depth and size of every VM that has any')
+    p.add_argument('--sort', default='Size', choices=sorted(SORT_KEYS.keys()))
+    p.add_argument('--min-age-days', type=float, default=0, help='only VMs whose oldest snapshot is this old')
+    p.set_defaults(func=cmd_snapshots)
+
+    p = commands.add_parser('portgroups', help='create portgroups cut from a parent portgroup')
+    p.add_argument('parent', help='parent portgroup name')
+    p.add_argument('--count', type=int, default=1)
+    p.add_argument('--name', default=DEFAULT_NAME_PATTERN, help='name pattern, {parent}, {n} and {vlan} are filled '
+                   'in (default ' + DEFAULT_NAME_PATTERN + ')')
+    p.add_argument('--first', type=int, default=1, help='first {n}')
+    p.add_argument('--vlan-start', type=int, help='VLAN of the first portgroup, the parent\'s is kept when unset')
+    p.add_argument('--vlan-step', type=int, default=1)
+    p.add_argument('--one-by-one', action='store_true', help='one task per portgroup instead of one per switch')
+    p.add_argument('--dry-run', action='store_true', help='only show the planned portgroups')
+    p.set_defaults(func=cmd_portgroups)
+
+    p = commands.add_parser('gc', help='find stale linked and instant clones, destroy them with --destroy')
+    p.add_argument('parents', nargs='*', help='only clones of these parent VMs')
+    p.add_argument('--min-age-days', type=float, default=DEFAULT_MIN_AGE_DAYS, help='keep clones younger than this')
+    p.add_argument('--include-powered-on', action='store_true', help='power off and destroy running clones too')
+    p.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='clones destroyed at the same time')
+    p.add_argument('--destroy', action='store_true', help='destroy the clones, without it only report what would be '
+                   'destroyed')
+    p.set_defaults(func=cmd_gc)
+
+    p = commands.add_parser('delete', help='destroy VMs')
+    p.add_argument('vms', nargs='*', help=vms_help)
+    p.set_defaults(func=cmd_delete)
+    return parser
+
+
+# log in to one vCenter and load its inventory, returns an error message or None
+def open_source(data: DataTree, fqdn: str, args, password: str) -> str:
+    source = make_connection(dataset=data, fqdn=fqdn, user=args.user, passwd=password)
+    if source.connection is None:
+        return 'Could not connect to ' + fqdn + '.'
+    try:
+        get_content(data, source)
+        load_inventory(data=data, source=source, page_size=args.page_size)
+        if args.sessions > 1:
+            source.pool = SessionPool(source=source, user=args.user, passwd=password, size=args.sessions)
+            source.pool.open()
+    except (vmodl.MethodFault, OSError, HTTPException) as e:
+        # socket and SSL errors are OSErrors, and so are requests' exceptions, which keeps requests unimported here
+        return fqdn + ': ' + error_text(e)
+    return None
+
+
+def main():
+    args = make_parser().parse_args()
+    if not args.server or not args.user:
+        print(json.dumps({'ok': False, 'error': 'A server and user are required.'}))
+        sys.exit(2)
+    password = os.environ.get(args.password_env)
+    if password is None:
+        password = getpass('Password for ' + args.user + ': ', stream=sys.stderr)
+
+    data = DataTree.get_instance()
+    fqdns = [fqdn.strip() for fqdn in args.server.split(',') if fqdn.strip()]
+    # every vCenter logs in and loads at the same time, so this takes as long as the slowest one
+    with ThreadPoolExecutor(max_workers=len(fqdns)) as executor:
+        errors = [error for error in executor.map(lambda fqdn: open_source(data, fqdn, args, password), fqdns)
+                  if error is not None]
+    if not data.connected_sources():
+        close_connection(data)
+        print(json.dumps({'ok': False, 'error': '; '.join(errors)}))
+        sys.exit(1)
+    try:
+        output = args.func(data, args)
+        pools = {source.fqdn: source.pool.stats() for source in data.connected_sources() if source.pool is not None}
+        if pools:
+            output['sessions'] = pools
+    except vmodl.MethodFault as e:
+        output = {'ok': False, 'error': error_text(e)}
+    finally:
+        close_connection(data)
+    if errors:
+        output['source_errors'] = errors
+    if 'ok' not in output:
+        output['ok'] = all(result['ok'] for result in output.get('results', []))
+    output['command'] = args.command
+    print(json.dumps(output, indent=2, default=str))
+    sys.exit(0 if output['ok'] else 1)
+    return
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+"""
+Reusable Kivy widgets for the program.
+
+-=baka0taku=-
+"""
+from bisect import bisect_left
+from math import isnan
+from kivy.graphics import Color, Line
+from kivy.metrics import dp
+from kivy.properties import BooleanProperty, ListProperty, NumericProperty, ObjectProperty
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.button import Button
+from kivy.uix.label import Label
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.widget import Widget
+from SearchIndex import SearchIndex
+
+# tint of selected list rows
+SELECTED_COLOR = [.3, .6, 1, 1]
+
+
+class ListButton(Button):
+    """
+    Row of an InventoryList. Rows are recycled, so the handler travels with the row data instead of being bound once.
+    """
+    callback = ObjectProperty(None, allownone=True)
+    selected = BooleanProperty(False)
+
+    def on_selected(self, instance, value):
+        self.background_color = SELECTED_COLOR if value else [1, 1, 1, 1]
+        return
+
+    def on_release(self):
+        if self.callback is not None:
+            self.callback(self)
+        return
+
+
+class InventoryList:
+    """
+    Sorted, searchable list of names shown in a RecycleView. Only the rows on screen get widgets, everything else is
+    a plain dictionary in the view data, so the list stays cheap with hundreds of thousands of entries. The
+    SearchIndex behind it keeps the sorted names and can be used by any dialog that needs to look names up.
+    """
+
+    def __init__(self, view: RecycleView, callback) -> None:
+        self.view = view
+        self.callback = callback
+        self.index = SearchIndex()
+        self.query = ''
+        # sorted (lower case name, name) keys of the rows on show
+        self.shown = list()
+        # names of the selected rows
+        self.selected = set()
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.index
+
+    # data of one row
+    def row(self, name: str) -> dict:
+        return {'text': name, 'callback': self.callback, 'selected': name in self.selected}
+
+    # replace the contents of the list, attrs maps names to searchable attributes
+    def rebuild(self, names, attrs: dict = None) -> None:
+        self.index.rebuild(names, attrs)
+        self.show()
+        return
+
+    # fill the view with every indexed name matching the query
+    def show(self) -> None:
+        if self.query.strip():
+            matched = self.index.search(self.query)
+            self.shown = [key for key in self.index.sorted_names if key[1] in matched]
+        else:
+            self.shown = list(self.index.sorted_names)
+        self.view.data = [self.row(name) for lower, name in self.shown]
+        return
+
+    def set_query(self, query: str) -> None:
+        self.query = query
+        self.show()
+        return
+
+    # put the row of a name in or take it out of rows at its sorted position, depending on whether the name is indexed
+    # and matches the query. rows is the view data or a copy of it.
+    def place(self, name: str, rows: list) -> None:
+        key = (name.lower(), name)
+        pos = bisect_left(self.shown, key)
+        listed = pos < len(self.shown) and self.shown[pos] == key
+        wanted = name in self.index and (not self.query.strip() or self.index.matches(name, self.query))
+        if wanted and not listed:
+            self.shown.insert(pos, key)
+            rows.insert(pos, self.row(name))
+        elif listed and not wanted:
+            del self.shown[pos]
+            del rows[pos]
+        return
+
+    # insert a name at its sorted position, or update its attributes
+    def add(self, name: str, attrs: dict = None) -> None:
+        self.index.add(name, attrs)
+        self.place(name, self.view.data)
+        return
+
+    # take a name out of the list
+    def remove(self, name: str) -> None:
+        self.index.remove(name)
+        self.selected.discard(name)
+        self.place(name, self.view.data)
+        return
+
+    # apply a batch of changes, added maps names to attributes. Rows are inserted and removed at their sorted positions,
+    # in the view data itself for a few changes, or in a copy that replaces the view data once when the batch is
+    # bigger than half the list, such as a page of the initial load.
+    def update(self, added: dict, removed: list = None) -> None:
+        removed = removed or []
+        for name in removed:
+            self.index.remove(name)
+            self.selected.discard(name)
+        for name, attrs in added.items():
+            self.index.add(name, attrs)
+        batch = (len(added) + len(removed)) * 2 > len(self.shown)
+        rows = list(self.view.data) if batch else self.view.data
+        for name in removed:
+            self.place(name, rows)
+        for name in added:
+            self.place(name, rows)
+        if batch:
+            self.view.data = rows
+        return
+
+    def clear(self) -> None:
+        self.index.rebuild([])
+        self.shown = list()
+        self.selected = set()
+        self.view.data = list()
+        return
+
+    # flip the selection of one name, returns whether it is selected now
+    def toggle(self, name: str) -> bool:
+        if name in self.selected:
+            self.selected.discard(name)
+        else:
+            self.selected.add(name)
+        self.refresh_row(name)
+        return name in self.selected
+
+    # select only the given names. A plain click changes a row or two, so only the rows whose selection changed are
+    # redrawn unless that is most of the list.
+    def select(self, names) -> None:
+        selected = set(name for name in names if name in self.index)
+        changed = self.selected ^ selected
+        self.selected = selected
+        if len(changed) * 2 > len(self.shown):
+            self.view.data = [self.row(name) for lower, name in self.shown]
+            return
+        for name in changed:
+            self.refresh_row(name)
+        return
+
+    # select every row on show
+    def select_shown(self) -> None:
+        self.select(name for lower, name in self.shown)
+        return
+
+    # redraw one row after its selection changed
+    def refresh_row(self, name: str) -> None:
+        key = (name.lower(), name)
+        pos = bisect_left(self.shown, key)
+        if pos < len(self.shown) and self.shown[pos] == key:
+            self.view.data[pos] = self.row(name)
+        return
+
+
+class Sparkline(Widget):
+    """
+    Small line chart of a series of samples without axes. The x axis holds capacity samples so the line grows from the
+    left until the history is full, the y axis runs from zero (or the lowest sample if negative) to the highest sample.
+    Missing samples (NaN) are skipped.
+    """
+    capacity = NumericProperty(180)
+    line_color = ListProperty([0, 1, 0, 1])
+
+    def __init__(self, **kwargs):
+        super(Sparkline, self).__init__(**kwargs)
+        self.values = list()
+        with self.canvas:
+            self.color = Color(*self.line_color)
+            self.line = Line(points=[], width=dp(1))
+        self.bind(pos=self.redraw, size=self.redraw)
+
+    def on_line_color(self, instance, value):
+        # kv rules can set the color before the canvas instructions exist
+        if hasattr(self, 'color'):
+            self.color.rgba = value
+        return
+
+    def set_values(self, values: list) -> None:
+        self.values = values
+        self.redraw()
+        return
+
+    def redraw(self, *args) -> None:
+        finite = [value for value in self.values if not isnan(value)]
+        if not finite:
+            self.line.points = []
+            return
+        low = min(0.0, min(finite))
+        span = (max(finite) - low) or 1.0
+        step = self.width / max(1, self.capacity - 1)
+        points = list()
+        for i, value in enumerate(self.values[-int(self.capacity):]):
+            if isnan(value):
+                continue
+            points.append(self.x + i * step)
+            points.append(self.y + (value - low) / span * self.height)
+        self.line.points = points
+        return
+
+
+class TableRow(BoxLayout):
+    """
+    Row of a table made by table_view(). The row data is {'cells': [text, ...]}, one label per cell.
+    """
+    cells = ListProperty([])
+
+    def on_cells(self, instance, value):
+        while len(self.children) < len(value):
+            self.add_widget(Label(shorten=True, shorten_from='right'))
+        while len(self.children) > len(value):
+            self.remove_widget(self.children[0])
+        # children are kept last added first
+        for label, text in zip(reversed(self.children), value):
+            label.text = text
+        return
+
+
+# RecycleView showing rows of text cells, only the rows on screen get widgets. Fill it with
+# view.data = [{'cells': [...]}, ...].
+def table_view(row_height: float = dp(26)) -> RecycleView:
+    view = RecycleView(viewclass='TableRow')
+    layout = RecycleBoxLayout(orientation='vertical', default_size=(None, row_height), default_size_hint=(1, None),
+                              size_hint_y=None)
+    layout.bind(minimum_height=layout.setter('height'))
+    view.add_widget(layout)
+    return view
@@ -2,7 +2,7 @@ from setuptools import setup
 
 
 setup(
-    entry_points={'console_scripts': ['vmtool=vmtool-kivy:main']},
+    entry_points={'console_scripts': ['vmtool=vmtool-kivy:main', 'vmtool-cli=VmtoolCli:main']},
     name='vmtool-kivy',
     version='0.1',
     packages=[''],
@@ -0,0 +1,21 @@
+"""
+Puts the program's modules, which live at the top of the repository rather than in a package, on the import path of
+the tests.
+
+-=baka0taku=-
+"""
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# a fresh DataTree for one test, the singleton is dropped again afterwards
+@pytest.fixture
+def data():
+    pytest.importorskip('pyVmomi')
+    from DataTree import DataTree
+    DataTree.__instance__ = None
+    yield DataTree.get_instance()
+    DataTree.__instance__ = None
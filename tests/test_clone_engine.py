@@ -0,0 +1,114 @@
+"""
+Tests of the clone engine's scheduling: the per host and per datastore limits, and retrying transient faults. Planning
+and sending tasks are replaced by a script of outcomes per clone, so no vCenter is needed.
+
+-=baka0taku=-
+"""
+from collections import Counter, deque
+import pytest
+
+pytest.importorskip('pyVmomi')
+
+from pyVmomi import vim, vmodl  # noqa: E402
+import CloneEngine  # noqa: E402
+from CloneEngine import BulkCloneEngine, CloneJob, percentile  # noqa: E402
+
+
+class ScriptedEngine(BulkCloneEngine):
+    """
+    Plans the given jobs and finishes each task at once with the next error scripted for its clone, None meaning
+    success. Records the highest load seen on every host and datastore.
+    """
+
+    def __init__(self, data, jobs: list, outcomes: dict = None, **limits) -> None:
+        super().__init__(data, **limits)
+        self.jobs = jobs
+        self.outcomes = outcomes or dict()
+        self.attempts = Counter()
+        self.peak_host = Counter()
+        self.peak_datastore = Counter()
+        self.peak_in_flight = 0
+
+    def plan(self, vm_names: list, num_of_clones: int) -> tuple:
+        return deque(self.jobs), list()
+
+    def account(self, job: CloneJob, amount: int) -> None:
+        super().account(job, amount)
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        self.peak_host[job.host] = max(self.peak_host[job.host], self.host_load[job.host])
+        for ds in job.datastores:
+            self.peak_datastore[ds] = max(self.peak_datastore[ds], self.datastore_load[ds])
+        return
+
+    def submit(self, job: CloneJob, results) -> None:
+        self.attempts[job.name] += 1
+        errors = self.outcomes.get(job.name, list())
+        results.put((job, errors.pop(0) if errors else None))
+        return
+
+
+# a clone job placed on the given host and datastores
+def job(data, name: str, host: str = 'host-1', datastores: tuple = ('ds-1',)) -> CloneJob:
+    props = {'runtime.host': vim.HostSystem(host), 'datastore': [vim.Datastore(ds) for ds in datastores]}
+    return CloneJob(vim.VirtualMachine('vm-1'), props, name, data)
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(CloneEngine, 'RETRY_DELAY', 0)
+
+
+def test_host_limit(data):
+    jobs = [job(data, 'c%d' % number, datastores=('ds-%d' % number,)) for number in range(10)]
+    engine = ScriptedEngine(data, jobs, per_host=3)
+    report = engine.run(['web'], 10)
+    assert len(report.created) == 10
+    assert engine.peak_host['host-1'] == 3
+
+
+def test_datastore_limit(data):
+    jobs = [job(data, 'c%d' % number, host='host-%d' % number) for number in range(10)]
+    engine = ScriptedEngine(data, jobs, per_datastore=2)
+    report = engine.run(['web'], 10)
+    assert len(report.created) == 10
+    assert engine.peak_datastore['ds-1'] == 2
+
+
+def test_in_flight_limit(data):
+    jobs = [job(data, 'c%d' % number, host='host-%d' % number, datastores=('ds-%d' % number,)) for number in range(10)]
+    engine = ScriptedEngine(data, jobs, max_in_flight=4)
+    engine.run(['web'], 10)
+    assert engine.peak_in_flight == 4
+
+
+def test_transient_fault_is_retried(data):
+    outcomes = {'c1': [vim.fault.TaskInProgress(), vmodl.fault.HostCommunication()]}
+    engine = ScriptedEngine(data, [job(data, 'c1')], outcomes)
+    report = engine.run(['web'], 1)
+    assert report.created == ['c1']
+    assert report.retries == 2
+    assert engine.attempts['c1'] == 3
+
+
+def test_retries_run_out(data):
+    outcomes = {'c1': [vim.fault.FileLocked(msg='locked')] * 3}
+    engine = ScriptedEngine(data, [job(data, 'c1')], outcomes, retries=2)
+    report = engine.run(['web'], 1)
+    assert report.created == list()
+    assert report.failed == [('c1', 'locked')]
+    assert engine.attempts['c1'] == 3
+
+
+def test_other_faults_are_not_retried(data):
+    outcomes = {'c1': [vim.fault.FileNotFound(msg='no such disk')]}
+    engine = ScriptedEngine(data, [job(data, 'c1'), job(data, 'c2')], outcomes)
+    report = engine.run(['web'], 2)
+    assert report.created == ['c2']
+    assert report.failed == [('c1', 'no such disk')]
+    assert report.retries == 0
+
+
+def test_percentile():
+    assert percentile([], 95) == 0.0
+    assert percentile([4, 1, 3, 2], 50) == 2
+    assert percentile(list(range(1, 101)), 95) == 95
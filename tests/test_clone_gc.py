@@ -0,0 +1,134 @@
+"""
+Tests of how the clone collector recognises clones and decides which ones go.
+
+-=baka0taku=-
+"""
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+import pytest
+
+pytest.importorskip('pyVmomi')
+
+from pyVmomi import vim  # noqa: E402
+from CloneGC import CLONE_REGEX, CloneGC, CloneInfo, find_clone_names, has_child_disks  # noqa: E402
+
+NOW = datetime(2026, 10, 18, tzinfo=timezone.utc)
+
+
+# a disk backed by a file, or by a child of parent_file
+def disk(parent_file: str = None) -> vim.vm.device.VirtualDisk:
+    backing = vim.vm.device.VirtualDisk.FlatVer2BackingInfo(fileName='[ds] vm/vm.vmdk')
+    if parent_file is not None:
+        backing.parent = vim.vm.device.VirtualDisk.FlatVer2BackingInfo(fileName=parent_file)
+    return vim.vm.device.VirtualDisk(backing=backing)
+
+
+# a clone that the default collector collects, with some fields replaced
+def clone(**changes) -> CloneInfo:
+    info = CloneInfo(vm=None, name='webLC-000001', kind='linked', parent='web', parent_exists=True, power='poweredOff',
+                     created=NOW - timedelta(days=30), child_disks=True, size=0, verdict='')
+    return info._replace(**changes)
+
+
+@pytest.mark.parametrize('name, parent, tag', [
+    ('webLC-000001', 'web', 'LC'),
+    ('webIC-123456', 'web', 'IC'),
+    ('appLC-000001IC-000002', 'appLC-000001', 'IC')
+])
+def test_clone_regex_matches_generated_names(name, parent, tag):
+    match = CLONE_REGEX.match(name)
+    assert match is not None
+    assert (match.group('parent'), match.group('tag')) == (parent, tag)
+
+
+@pytest.mark.parametrize('name', ['webLC-1', 'webLC-0000001', 'webLC-00000a', 'LC-000001', 'webXC-000001',
+                                  'webLC-000001-old'])
+def test_clone_regex_rejects_other_names(name):
+    assert CLONE_REGEX.match(name) is None
+
+
+def test_has_child_disks():
+    assert has_child_disks([disk('[ds] web/web.vmdk')])
+    assert has_child_disks([vim.vm.device.VirtualCdrom(), disk(), disk('[ds] web/web.vmdk')])
+    assert not has_child_disks([disk()])
+    assert not has_child_disks(None)
+
+
+def test_verdict_collects_old_powered_off_clones(data):
+    assert CloneGC(data).verdict(clone(), NOW) == 'collect'
+
+
+@pytest.mark.parametrize('changes, verdict', [
+    ({'child_disks': False}, 'keep: not a clone'),
+    ({'created': None}, 'keep: age unknown'),
+    ({'created': NOW - timedelta(days=1)}, 'keep: too new'),
+    ({'power': 'poweredOn'}, 'keep: powered on'),
+    ({'parent': 'db'}, 'keep: other parent')
+])
+def test_verdict_keeps(data, changes, verdict):
+    job = CloneGC(data, parents=['web'])
+    assert job.verdict(clone(**changes), NOW) == verdict
+
+
+def test_verdict_options(data):
+    assert CloneGC(data, include_powered_on=True).verdict(clone(power='poweredOn'), NOW) == 'collect'
+    assert CloneGC(data, min_age_days=0).verdict(clone(created=NOW), NOW) == 'collect'
+    # unknown ages are kept whatever the minimum age
+    assert CloneGC(data, min_age_days=0).verdict(clone(created=None), NOW) == 'keep: age unknown'
+
+
+def test_find_clone_names(data):
+    source = data.add_source('vc01')
+    for moid, name in (('vm-1', 'web'), ('vm-2', 'webLC-000001'), ('vm-3', 'webLC-1'), ('vm-4', 'dbIC-000007')):
+        data.add_object(vim.VirtualMachine(moid, source.placeholder), name)
+    found = find_clone_names(data)
+    assert sorted(found) == ['dbIC-000007', 'webLC-000001']
+    assert found['dbIC-000007'].group('parent') == 'db'
+
+
+class FakeVm:
+    """
+    A VM that records the tasks started on it, with its disks and power state as the server reports them now.
+    """
+
+    def __init__(self, power: str, child_disks: bool = True) -> None:
+        devices = [disk('[ds] web/web.vmdk' if child_disks else None)]
+        self.config = vim.vm.ConfigInfo(hardware=vim.vm.VirtualHardware(device=devices))
+        self.runtime = vim.vm.RuntimeInfo(powerState=power)
+        self.tasks = list()
+
+    def PowerOffVM_Task(self):
+        self.tasks.append('power off')
+
+    def Destroy_Task(self):
+        self.tasks.append('destroy')
+
+
+@pytest.fixture
+def finished_tasks(monkeypatch):
+    future = Future()
+    future.set_result(None)
+    monkeypatch.setattr('CloneGC.watch_task', lambda task: future)
+
+
+def test_destroy_powers_off_what_is_on_now(finished_tasks):
+    vm = FakeVm('poweredOn')
+    CloneGC.destroy(vm, True)
+    assert vm.tasks == ['power off', 'destroy']
+    vm = FakeVm('poweredOff')
+    CloneGC.destroy(vm, True)
+    assert vm.tasks == ['destroy']
+
+
+def test_destroy_skips_clones_powered_on_since_the_scan(finished_tasks):
+    vm = FakeVm('poweredOn')
+    with pytest.raises(ValueError):
+        CloneGC.destroy(vm, False)
+    assert vm.tasks == list()
+
+
+def test_destroy_skips_promoted_clones(finished_tasks):
+    vm = FakeVm('poweredOff', child_disks=False)
+    with pytest.raises(ValueError):
+        CloneGC.destroy(vm, True)
+    assert vm.tasks == list()
@@ -0,0 +1,40 @@
+"""
+Tests of handing out clone names: numbering after the highest taken, reserving them and giving them back.
+
+-=baka0taku=-
+"""
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip('pyVmomi')
+
+from pyVmomi import vim  # noqa: E402
+import CloneSpec  # noqa: E402
+from CloneSpec import LINKED_CLONE_TAG, next_clone_names, release_clone_names  # noqa: E402
+from FuncLib import make_linked_clone  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def reserved(monkeypatch):
+    names = set()
+    monkeypatch.setattr(CloneSpec, 'reserved_clone_names', names)
+    return names
+
+
+def test_numbered_after_the_highest_taken(data):
+    data.add_object(vim.VirtualMachine('vm-1'), 'webLC-000004')
+    assert next_clone_names('web', LINKED_CLONE_TAG, 2, data) == ['webLC-000005', 'webLC-000006']
+    assert next_clone_names('web', LINKED_CLONE_TAG, 1, data) == ['webLC-000007']
+
+
+def test_released_names_are_handed_out_again(data, reserved):
+    names = next_clone_names('web', LINKED_CLONE_TAG, 2, data)
+    release_clone_names(names)
+    assert reserved == set()
+    assert next_clone_names('web', LINKED_CLONE_TAG, 1, data) == ['webLC-000001']
+
+
+def test_linked_clone_without_snapshot_reserves_nothing(data, reserved):
+    vm = SimpleNamespace(name='web', parent=None, snapshot=None)
+    assert make_linked_clone(vm) is None
+    assert reserved == set()
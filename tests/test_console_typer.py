@@ -0,0 +1,63 @@
+"""
+Tests of compiling typed text with {ctrl+alt+del} style chords into USB key events.
+
+-=baka0taku=-
+"""
+import pytest
+
+pytest.importorskip('pyVmomi')
+
+from ConsoleTyper import chord_event, chunk_specs, compile_text  # noqa: E402
+from FuncLib import code_lookup  # noqa: E402
+
+
+# modifiers of a key event that are held down
+def held(event) -> set:
+    modifiers = event.modifiers
+    if modifiers is None:
+        return set()
+    return {name for name in ('leftControl', 'leftAlt', 'leftShift', 'leftGui') if getattr(modifiers, name)}
+
+
+def test_chord_with_modifiers():
+    event = chord_event('ctrl+alt+del')
+    assert event.usbHidCode == code_lookup('del')
+    assert held(event) == {'leftControl', 'leftAlt'}
+
+
+def test_chord_names_ignore_case_and_use_aliases():
+    assert chord_event('CTRL+Delete').usbHidCode == code_lookup('del')
+    assert chord_event('enter').usbHidCode == code_lookup('\n')
+    assert held(chord_event('enter')) == set()
+    assert chord_event('win+f1').usbHidCode == code_lookup('F1')
+    assert held(chord_event('win+f1')) == {'leftGui'}
+
+
+def test_bad_chords():
+    with pytest.raises(ValueError):
+        chord_event('hyper+a')
+    with pytest.raises(ValueError):
+        chord_event('ctrl+alt')
+    with pytest.raises(ValueError):
+        chord_event('ctrl+nosuchkey')
+
+
+def test_compile_text_mixes_text_and_chords():
+    events = compile_text('aB{enter}{ctrl+c}')
+    assert [event.usbHidCode for event in events] == [code_lookup('a'), code_lookup('b'), code_lookup('\n'),
+                                                      code_lookup('c')]
+    assert held(events[0]) == set()
+    assert held(events[1]) == {'leftShift'}
+    assert held(events[3]) == {'leftControl'}
+
+
+def test_compile_text_folds_crlf_and_caches():
+    assert len(compile_text('a\r\nb')) == 3
+    assert compile_text('a\r\nb') is compile_text('a\r\nb')
+
+
+def test_chunk_specs():
+    events = compile_text('abcdefg')
+    specs = chunk_specs(events, 3)
+    assert [len(spec.keyEvents) for spec in specs] == [3, 3, 1]
+    assert chunk_specs((), 3) == []
@@ -0,0 +1,66 @@
+"""
+Tests of filing the objects of several vCenters in one DataTree, where a name taken by another vCenter is tagged with
+the vCenter's FQDN.
+
+-=baka0taku=-
+"""
+import pytest
+
+pytest.importorskip('pyVmomi')
+
+from pyVmomi import vim  # noqa: E402
+
+
+# two vCenters with a VM named web each, filed vc01 first
+@pytest.fixture
+def two_webs(data):
+    vc01 = data.add_source('vc01')
+    vc02 = data.add_source('vc02')
+    first = vim.VirtualMachine('vm-1', vc01.placeholder)
+    second = vim.VirtualMachine('vm-1', vc02.placeholder)
+    return vc01, vc02, first, second, data.add_object(first, 'web'), data.add_object(second, 'web')
+
+
+def test_keys_carry_the_vcenter(data, two_webs):
+    vc01, vc02, first, second, first_name, second_name = two_webs
+    assert data.key_of(first) == 'vc01/vm-1'
+    assert data.key_of(second) == 'vc02/vm-1'
+    assert data.source_of(second) is vc02
+
+
+def test_a_taken_name_is_tagged(data, two_webs):
+    vc01, vc02, first, second, first_name, second_name = two_webs
+    assert (first_name, second_name) == ('web', 'web [vc02]')
+    assert data.vmdict['web'] is first
+    assert data.vmdict['web [vc02]'] is second
+    assert data.real_name(second) == 'web'
+
+
+def test_the_same_vcenter_does_not_tag(data):
+    vc01 = data.add_source('vc01')
+    vm = vim.VirtualMachine('vm-1', vc01.placeholder)
+    assert data.add_object(vm, 'web') == 'web'
+    # a refile of the same object keeps its name
+    assert data.add_object(vm, 'web') == 'web'
+    assert list(data.vmdict) == ['web']
+
+
+def test_rename_drops_the_old_name(data, two_webs):
+    vc01, vc02, first, second, first_name, second_name = two_webs
+    assert data.add_object(second, 'web2') == 'web2'
+    assert 'web [vc02]' not in data.vmdict
+    assert data.vmdict['web'] is first
+
+
+def test_remove_only_touches_its_own_vcenter(data, two_webs):
+    vc01, vc02, first, second, first_name, second_name = two_webs
+    assert data.remove_object(second) == 'web [vc02]'
+    assert data.vmdict == {'web': first}
+    assert data.remove_object(second) is None
+
+
+def test_remove_source_forgets_objects_and_stubs(data, two_webs):
+    vc01, vc02, first, second, first_name, second_name = two_webs
+    assert data.remove_source(vc01) == ['web']
+    assert data.source_of(first) is None
+    assert data.vmdict == {'web [vc02]': second}
@@ -0,0 +1,91 @@
+"""
+Tests of dropping stale cached stats on VM events, with the events built locally instead of read off a collector.
+
+-=baka0taku=-
+"""
+import pytest
+
+pytest.importorskip('pyVmomi')
+
+from pyVmomi import vim  # noqa: E402
+from EventWatcher import EventWatcher  # noqa: E402
+from Stats import host_stats_cache, vm_detail_cache  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def caches():
+    vm_detail_cache.invalidate()
+    host_stats_cache.invalidate()
+    yield
+    vm_detail_cache.invalidate()
+    host_stats_cache.invalidate()
+
+
+@pytest.fixture
+def source(data):
+    return data.add_source('vc01')
+
+
+@pytest.fixture
+def watcher(data, source):
+    return EventWatcher(data, source)
+
+
+@pytest.fixture
+def vm(data, source):
+    vm = vim.VirtualMachine('vm-1', source.placeholder)
+    data.add_object(vm, 'web01')
+    return vm
+
+
+# the argument naming a host in an event
+def host_argument(source, moid: str) -> vim.event.HostEventArgument:
+    return vim.event.HostEventArgument(host=vim.HostSystem(moid, source.placeholder), name=moid)
+
+
+# an event of the given type about vm
+def vm_event(event_type, key: int, vm, **fields) -> vim.event.VmEvent:
+    return event_type(key=key, vm=vim.event.VmEventArgument(vm=vm, name='web01'), **fields)
+
+
+def test_event_drops_the_vm_details(watcher, vm):
+    vm_detail_cache.put('vc01/vm-1', 'details')
+    vm_detail_cache.put('vc01/vm-2', 'other')
+    watcher.apply_events([vm_event(vim.event.VmReconfiguredEvent, 1, vm)])
+    assert vm_detail_cache.get('vc01/vm-1') is None
+    assert vm_detail_cache.get('vc01/vm-2') == 'other'
+
+
+def test_migration_drops_both_hosts(watcher, source, vm):
+    for key in ('vc01/host-1', 'vc01/host-2', 'vc01/host-3', 'all'):
+        host_stats_cache.put(key, 'stats')
+    event = vm_event(vim.event.DrsVmMigratedEvent, 1, vm, sourceHost=host_argument(source, 'host-1'),
+                     host=host_argument(source, 'host-2'))
+    watcher.apply_events([event])
+    assert host_stats_cache.get('vc01/host-1') is None
+    assert host_stats_cache.get('vc01/host-2') is None
+    assert host_stats_cache.get('all') is None
+    assert host_stats_cache.get('vc01/host-3') == 'stats'
+
+
+def test_power_event_leaves_the_tree_to_the_sync(watcher, data, vm):
+    data.attrdict['vc01/vm-1'] = {'power': 'poweredOff'}
+    watcher.apply_events([vm_event(vim.event.VmPoweredOnEvent, 1, vm)])
+    assert data.attrdict['vc01/vm-1'] == {'power': 'poweredOff'}
+    assert data.vmdict['web01'] is vm
+
+
+def test_events_apply_once_in_key_order(watcher, vm):
+    seen = list()
+    watcher.apply_event = lambda event: seen.append(event.key)
+    events = [vm_event(vim.event.VmPoweredOffEvent, key, vm) for key in (3, 1, 2)]
+    assert watcher.apply_events(events) == 3
+    assert watcher.apply_events(events + [vm_event(vim.event.VmPoweredOnEvent, 4, vm)]) == 1
+    assert seen == [1, 2, 3, 4]
+    assert watcher.applied == 4
+
+
+def test_event_without_a_vm_is_skipped(watcher):
+    vm_detail_cache.put('vc01/vm-1', 'details')
+    watcher.apply_events([vim.event.VmRemovedEvent(key=1)])
+    assert vm_detail_cache.get('vc01/vm-1') == 'details'
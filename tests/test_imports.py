@@ -0,0 +1,28 @@
+"""
+The vSphere core and the CLI must load without the GUI toolkits, and without the modules only some operations need.
+
+-=baka0taku=-
+"""
+import os
+import subprocess
+import sys
+import pytest
+
+pytest.importorskip('pyVmomi')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules that are either GUI only or imported on first use
+LAZY_MODULES = ('kivy', 'tkinter', 'requests', 'pyVim.connect')
+
+
+# modules of LAZY_MODULES loaded by importing module in a fresh interpreter
+def loaded_by(module: str) -> list:
+    code = 'import sys, ' + module + '; print(" ".join(m for m in ' + repr(LAZY_MODULES) + ' if m in sys.modules))'
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return output.stdout.split()
+
+
+@pytest.mark.parametrize('module', ['FuncLib', 'VmtoolCli'])
+def test_core_imports_no_gui_or_lazy_modules(module):
+    assert loaded_by(module) == []
@@ -0,0 +1,77 @@
+"""
+Tests of the on-disk inventory cache, written to a temporary directory: a round trip, and dropping files that are
+corrupt or too old.
+
+-=baka0taku=-
+"""
+import gzip
+import json
+import os
+import pytest
+
+pytest.importorskip('pyVmomi')
+
+from pyVmomi import vim  # noqa: E402
+import InventoryCache  # noqa: E402
+
+UUID = '5023bd4e-0000-0000-0000-000000000001'
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(InventoryCache, 'CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(InventoryCache, 'INDEX_FILE', str(tmp_path / 'index.json'))
+    return tmp_path
+
+
+# a DataTree holding one VM and one host of vc01, saved to the cache
+@pytest.fixture
+def saved(data):
+    source = data.add_source('vc01')
+    source.instance_uuid = UUID
+    data.add_object(vim.VirtualMachine('vm-1', source.placeholder), 'web01')
+    data.add_object(vim.HostSystem('host-1', source.placeholder), 'esx01')
+    assert InventoryCache.save_cache(data, source)
+    assert InventoryCache.save_index([source])
+    data.remove_source(source)
+    return data
+
+
+# read the cache document, let change edit it and write it back
+def rewrite(change) -> None:
+    path = InventoryCache.cache_path(UUID)
+    with open(path, 'rb') as f:
+        document = json.loads(gzip.decompress(f.read()).decode('utf-8'))
+    change(document)
+    with open(path, 'wb') as f:
+        f.write(gzip.compress(json.dumps(document).encode('utf-8')))
+
+
+def test_round_trip(saved):
+    assert InventoryCache.load_last_cache(saved) == (['vc01'], 2)
+    source = saved.sources['vc01']
+    assert saved.vmdict['web01']._moId == 'vm-1'
+    assert saved.source_of(saved.vmdict['web01']) is source
+    assert isinstance(saved.hostdict['esx01'], vim.HostSystem)
+    assert source.instance_uuid == UUID
+
+
+def test_save_needs_an_instance_uuid(data):
+    assert not InventoryCache.save_cache(data, data.add_source('vc01'))
+
+
+def test_checksum_mismatch_drops_the_file(saved):
+    rewrite(lambda document: document['inventory']['objects'][0].__setitem__(2, 'evil01'))
+    assert InventoryCache.load_cache(saved, saved.add_source('vc01'), UUID) == 0
+    assert saved.vmdict == dict()
+    assert not os.path.exists(InventoryCache.cache_path(UUID))
+
+
+def test_expired_cache_is_dropped(saved):
+    rewrite(lambda document: document.__setitem__('saved', document['saved'] - InventoryCache.CACHE_MAX_AGE - 1))
+    assert InventoryCache.load_cache(saved, saved.add_source('vc01'), UUID) == 0
+    assert not os.path.exists(InventoryCache.cache_path(UUID))
+
+
+def test_missing_cache_loads_nothing(data):
+    assert InventoryCache.load_last_cache(data) == (list(), 0)
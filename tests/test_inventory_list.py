@@ -0,0 +1,57 @@
+"""
+Tests of keeping the rows of an InventoryList sorted and filtered as names come and go, with the RecycleView replaced
+by a plain holder of its data.
+
+-=baka0taku=-
+"""
+import os
+from types import SimpleNamespace
+import pytest
+
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+pytest.importorskip('kivy')
+
+from Widgets import InventoryList  # noqa: E402
+
+
+# names of the rows on show
+def texts(inventory: InventoryList) -> list:
+    return [row['text'] for row in inventory.view.data]
+
+
+@pytest.fixture
+def inventory():
+    inventory = InventoryList(SimpleNamespace(data=list()), None)
+    inventory.rebuild(['web%02d' % number for number in range(1, 9)])
+    return inventory
+
+
+def test_small_batch_edits_the_rows_in_place(inventory):
+    rows = inventory.view.data
+    inventory.update({'app01': None}, ['web03'])
+    assert inventory.view.data is rows
+    assert texts(inventory) == ['app01', 'web01', 'web02', 'web04', 'web05', 'web06', 'web07', 'web08']
+
+
+def test_big_batch_replaces_the_rows_once(inventory):
+    rows = inventory.view.data
+    inventory.update({'db%02d' % number: None for number in range(1, 6)}, ['web01'])
+    assert inventory.view.data is not rows
+    assert texts(inventory) == ['db01', 'db02', 'db03', 'db04', 'db05', 'web02', 'web03', 'web04', 'web05', 'web06',
+                                'web07', 'web08']
+
+
+def test_batch_keeps_the_query(inventory):
+    inventory.set_query('web')
+    inventory.update({'web09': None, 'app01': None}, ['web08'])
+    assert texts(inventory) == ['web01', 'web02', 'web03', 'web04', 'web05', 'web06', 'web07', 'web09']
+    inventory.set_query('')
+    assert texts(inventory)[0] == 'app01'
+
+
+def test_removed_names_lose_their_selection(inventory):
+    inventory.select(['web01', 'web02'])
+    inventory.update(dict(), ['web01'])
+    assert inventory.selected == {'web02'}
+    assert inventory.view.data[0] == {'text': 'web02', 'callback': None, 'selected': True}
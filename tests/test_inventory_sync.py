@@ -0,0 +1,189 @@
+"""
+Tests of applying WaitForUpdatesEx deltas to DataTree, with the server side collector replaced by a queue of update
+sets.
+
+-=baka0taku=-
+"""
+from threading import Event, Thread
+import pytest
+
+pytest.importorskip('pyVmomi')
+
+from pyVmomi import vim, vmodl  # noqa: E402
+from Inventory import InventorySync  # noqa: E402
+
+PC = vmodl.query.PropertyCollector
+
+
+class FakeCollector:
+    """
+    Stands in for the private PropertyCollector, handing out the queued update sets one WaitForUpdatesEx at a time.
+    """
+
+    def __init__(self, *update_sets) -> None:
+        self.update_sets = list(update_sets)
+        self.versions = list()
+
+    def WaitForUpdatesEx(self, version, options):
+        self.versions.append(version)
+        if not self.update_sets:
+            return None
+        return self.update_sets.pop(0)
+
+
+class BlockingCollector:
+    """
+    Long-polls until CancelWaitForUpdates is called, or fails every poll with error. Records whether it was destroyed
+    while a poll was still waiting on it.
+    """
+
+    def __init__(self, error: Exception = None) -> None:
+        self.error = error
+        self.waiting = Event()
+        self.cancelled = Event()
+        self.destroyed = False
+        self.destroyed_while_waiting = False
+
+    def WaitForUpdatesEx(self, version, options):
+        if self.error is not None:
+            raise self.error
+        self.waiting.set()
+        self.cancelled.wait(5)
+        self.waiting.clear()
+        raise vmodl.fault.RequestCanceled()
+
+    def CancelWaitForUpdates(self):
+        self.cancelled.set()
+
+    def DestroyPropertyCollector(self):
+        self.destroyed_while_waiting = self.waiting.is_set()
+        self.destroyed = True
+
+
+# one object update, name is left out of the change set when it is None
+def obj_update(kind: str, obj, name: str = None) -> PC.ObjectUpdate:
+    changes = list()
+    if name is not None:
+        changes.append(PC.Change(name='name', op='assign', val=name))
+    return PC.ObjectUpdate(kind=kind, obj=obj, changeSet=changes)
+
+
+# an update set holding the given object updates
+def update_set(*updates, version: str = '1', truncated: bool = False) -> PC.UpdateSet:
+    return PC.UpdateSet(version=version, truncated=truncated, filterSet=[PC.FilterUpdate(objectSet=list(updates))])
+
+
+@pytest.fixture
+def source(data):
+    return data.add_source('vc01')
+
+
+@pytest.fixture
+def sync(data, source):
+    return InventorySync(data, source)
+
+
+def test_enter_files_the_object(sync, data, source):
+    vm = vim.VirtualMachine('vm-1', source.placeholder)
+    changes = sync.apply_update_set(update_set(obj_update('enter', vm, 'web01')))
+    assert changes == [(None, 'web01')]
+    assert data.vmdict['web01'] is vm
+
+
+def test_modify_renames_the_object(sync, data, source):
+    vm = vim.VirtualMachine('vm-1', source.placeholder)
+    sync.apply_update_set(update_set(obj_update('enter', vm, 'web01')))
+    changes = sync.apply_update_set(update_set(obj_update('modify', vm, 'web02')))
+    assert changes == [('web01', 'web02')]
+    assert 'web01' not in data.vmdict
+    assert data.vmdict['web02'] is vm
+
+
+def test_leave_removes_the_object(sync, data, source):
+    vm = vim.VirtualMachine('vm-1', source.placeholder)
+    sync.apply_update_set(update_set(obj_update('enter', vm, 'web01')))
+    changes = sync.apply_update_set(update_set(obj_update('leave', vm)))
+    assert changes == [('web01', None)]
+    assert data.vmdict == dict()
+
+
+def test_unchanged_name_reports_nothing(sync, data, source):
+    vm = vim.VirtualMachine('vm-1', source.placeholder)
+    sync.apply_update_set(update_set(obj_update('enter', vm, 'web01')))
+    assert sync.apply_update_set(update_set(obj_update('modify', vm, 'web01'))) == list()
+
+
+def test_initial_sync_pages_and_drops_stale_objects(sync, data, source):
+    stale = vim.VirtualMachine('vm-9', source.placeholder)
+    data.add_object(stale, 'gone')
+    first = vim.VirtualMachine('vm-1', source.placeholder)
+    second = vim.HostSystem('host-1', source.placeholder)
+    sync.collector = FakeCollector(update_set(obj_update('enter', first, 'web01'), version='1', truncated=True),
+                                   update_set(obj_update('enter', second, 'esx01'), version='2'))
+    changes = sync.initial_sync()
+    assert sync.collector.versions == ['', '1']
+    assert sync.version == '2'
+    assert sync.round_trips == 2
+    assert ('gone', None) in changes
+    assert set(data.vmdict) == {'web01'}
+    assert set(data.hostdict) == {'esx01'}
+
+
+def test_poll_follows_truncated_sets(sync, data, source):
+    first = vim.VirtualMachine('vm-1', source.placeholder)
+    second = vim.VirtualMachine('vm-2', source.placeholder)
+    sync.collector = FakeCollector(update_set(obj_update('enter', first, 'web01'), version='1', truncated=True),
+                                   update_set(obj_update('enter', second, 'web02'), version='2'))
+    changes = sync.poll(0)
+    assert changes == [(None, 'web01'), (None, 'web02')]
+    assert sync.version == '2'
+    assert sync.round_trips == 2
+
+
+def test_attributes_keep_moref_ids(sync, data, source):
+    vm = vim.VirtualMachine('vm-1', source.placeholder)
+    update = obj_update('enter', vm, 'web01')
+    host = vim.HostSystem('host-1', source.placeholder)
+    update.changeSet.append(PC.Change(name='runtime.host', op='assign', val=host))
+    update.changeSet.append(PC.Change(name='runtime.powerState', op='assign', val='poweredOn'))
+    sync.apply_update_set(update_set(update))
+    assert data.attrdict['vc01/vm-1'] == {'host': 'host-1', 'power': 'poweredOn'}
+
+
+def test_attribute_change_reports_the_same_name(sync, data, source):
+    vm = vim.VirtualMachine('vm-1', source.placeholder)
+    sync.apply_update_set(update_set(obj_update('enter', vm, 'web01')))
+    update = obj_update('modify', vm)
+    update.changeSet.append(PC.Change(name='runtime.powerState', op='assign', val='poweredOff'))
+    assert sync.apply_update_set(update_set(update)) == [('web01', 'web01')]
+
+
+# run the sync loop on collector in a thread the way start() does
+def start_thread(sync: InventorySync, collector) -> Thread:
+    sync.collector = collector
+    sync.running = True
+    sync.thread = Thread(target=sync.run, args=(collector,), daemon=True)
+    sync.thread.start()
+    return sync.thread
+
+
+def test_stop_leaves_the_collector_to_the_sync_thread(sync):
+    collector = BlockingCollector()
+    thread = start_thread(sync, collector)
+    assert collector.waiting.wait(5)
+    sync.stop()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert collector.destroyed
+    assert not collector.destroyed_while_waiting
+    assert sync.collector is None
+
+
+def test_failed_poll_stops_and_releases(sync):
+    collector = BlockingCollector(vim.fault.NotAuthenticated())
+    thread = start_thread(sync, collector)
+    thread.join(5)
+    assert isinstance(sync.error, vim.fault.NotAuthenticated)
+    assert not sync.is_alive()
+    assert collector.destroyed
+    assert sync.collector is None
@@ -0,0 +1,65 @@
+"""
+Tests of the sample ring buffer and the counter scaling of the performance monitor.
+
+-=baka0taku=-
+"""
+from math import isnan
+import pytest
+
+pytest.importorskip('pyVmomi')
+
+from PerfMonitor import RingBuffer, format_latest, scale_value  # noqa: E402
+
+
+def test_empty_buffer():
+    buffer = RingBuffer(3)
+    assert len(buffer) == 0
+    assert buffer.values() == []
+    assert isnan(buffer.latest())
+
+
+def test_buffer_keeps_the_newest_samples_in_order():
+    buffer = RingBuffer(3)
+    for value in range(1, 6):
+        buffer.append(value)
+    assert len(buffer) == 3
+    assert buffer.values() == [3.0, 4.0, 5.0]
+    assert buffer.latest() == 5.0
+
+
+def test_buffer_wraps_around_more_than_once():
+    buffer = RingBuffer(4)
+    for value in range(11):
+        buffer.append(value)
+    assert buffer.values() == [7.0, 8.0, 9.0, 10.0]
+
+
+def test_buffer_stores_missing_samples_as_nan():
+    buffer = RingBuffer(2)
+    buffer.append(1.5)
+    buffer.append(float('nan'))
+    values = buffer.values()
+    assert values[0] == 1.5 and isnan(values[1])
+    assert format_latest('cpu_ready', buffer) == '-'
+
+
+def test_scale_value_cpu_ready_is_a_percentage_of_the_interval():
+    # 2000 ms ready in a 20 s interval
+    assert scale_value('cpu_ready', 2000, 20) == pytest.approx(10.0)
+
+
+def test_scale_value_kilobytes_become_megabytes():
+    assert scale_value('balloon', 2048, 20) == 2.0
+    assert scale_value('disk_usage', 2048, 20) == 2048.0
+
+
+def test_scale_value_missing_samples():
+    assert isnan(scale_value('cpu_usage', -1, 20))
+    assert isnan(scale_value('cpu_usage', None, 20))
+
+
+def test_format_latest():
+    buffer = RingBuffer(2)
+    buffer.append(12.345)
+    assert format_latest('cpu_ready', buffer) == '12.3 %'
+    assert format_latest('cpu_ready', None) == '-'
@@ -0,0 +1,85 @@
+"""
+Tests of the trigram search index over inventory names.
+
+-=baka0taku=-
+"""
+from SearchIndex import SearchIndex, grams_of, parse_query
+
+NAMES = ['web01', 'web02', 'db01', 'WebProxy', 'dbLC-000001']
+
+ATTRS = {
+    'web01': {'power': 'poweredOn', 'host': 'esx01'},
+    'web02': {'power': 'poweredOff', 'host': 'esx02'},
+    'db01': {'power': 'poweredOn', 'host': 'esx02'},
+    'dbLC-000001': {'power': None, 'host': 'esx01'}
+}
+
+
+# an index of NAMES with ATTRS
+def make_index() -> SearchIndex:
+    index = SearchIndex()
+    index.rebuild(NAMES, ATTRS)
+    return index
+
+
+def test_grams_of():
+    assert grams_of('abcd') == {'abc', 'bcd'}
+    assert grams_of('ab') == set()
+
+
+def test_parse_query_splits_attribute_terms():
+    assert parse_query('Web host:ESX01 :x') == (['web', ':x'], [('host', 'esx01')])
+
+
+def test_substring_match_ignores_case():
+    assert make_index().search('eb0') == {'web01', 'web02'}
+    assert make_index().search('PROXY') == {'WebProxy'}
+
+
+def test_short_terms_match_the_start_of_the_name():
+    assert make_index().search('db') == {'db01', 'dbLC-000001'}
+    assert make_index().search('01') == set()
+
+
+def test_every_term_has_to_match():
+    assert make_index().search('web b01') == {'web01'}
+    assert make_index().search('web nothing') == set()
+
+
+def test_attribute_terms():
+    index = make_index()
+    assert index.search('power:poweredon') == {'web01', 'db01'}
+    assert index.search('host:esx02 web') == {'web02'}
+    # attributes without a value are not indexed
+    assert index.search('power:powered') == {'web01', 'web02', 'db01'}
+
+
+def test_empty_query_matches_everything():
+    assert make_index().search('') == set(NAMES)
+
+
+def test_add_and_remove():
+    index = make_index()
+    index.add('web03', {'host': 'esx03'})
+    assert index.search('web') == {'web01', 'web02', 'web03', 'WebProxy'}
+    assert index.search('we') == {'web01', 'web02', 'web03', 'WebProxy'}
+    index.remove('web01')
+    index.remove('missing')
+    assert 'web01' not in index
+    assert index.search('web0') == {'web02', 'web03'}
+    assert index.search('host:esx01') == {'dbLC-000001'}
+    assert len(index) == len(NAMES)
+
+
+def test_add_again_replaces_the_attributes():
+    index = make_index()
+    index.add('web01', {'power': 'poweredOff'})
+    assert index.search('power:poweredoff') == {'web01', 'web02'}
+    assert index.search('host:esx01') == {'dbLC-000001'}
+
+
+def test_matches_agrees_with_search():
+    index = make_index()
+    for query in ('web', 'we', 'db 01', 'power:poweredon', 'host:esx0 b0', 'x'):
+        found = index.search(query)
+        assert {name for name in NAMES if index.matches(name, query)} == found
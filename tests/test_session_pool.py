@@ -0,0 +1,45 @@
+"""
+Tests of binding managed object arguments to a pooled session and of finding the pool of their vCenter.
+
+-=baka0taku=-
+"""
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip('pyVmomi')
+
+from pyVmomi import vim  # noqa: E402
+from SessionPool import PooledSession, SessionPool, pool_of  # noqa: E402
+
+
+# a pooled session whose connection only carries a stub
+def session(stub) -> PooledSession:
+    pooled = PooledSession(0)
+    pooled.connection = SimpleNamespace(_stub=stub)
+    return pooled
+
+
+def test_bind_moves_a_managed_object_to_the_session():
+    stub = object()
+    vm = vim.VirtualMachine('vm-1', None)
+    bound = SessionPool.bind(vm, session(stub))
+    assert type(bound) is vim.VirtualMachine
+    assert bound._moId == 'vm-1'
+    assert bound._stub is stub
+
+
+def test_bind_leaves_other_arguments_alone():
+    spec = vim.vm.ConfigSpec(name='web01')
+    assert SessionPool.bind(spec, session(object())) is spec
+    assert SessionPool.bind('web01', session(object())) == 'web01'
+
+
+def test_pool_of_the_first_managed_object(data):
+    source = data.add_source('vc01')
+    source.pool = object()
+    assert pool_of(data, ['web01', vim.VirtualMachine('vm-1', source.placeholder)]) is source.pool
+
+
+def test_no_pool_without_a_known_managed_object(data):
+    assert pool_of(data, ['web01', 3]) is None
+    assert pool_of(data, [vim.VirtualMachine('vm-1', object())]) is None
@@ -0,0 +1,63 @@
+"""
+Tests of the expiring snapshot store behind the VM details, with the clock replaced so expiry is exact.
+
+-=baka0taku=-
+"""
+import pytest
+
+pytest.importorskip('pyVmomi')
+
+import Stats  # noqa: E402
+from Stats import SnapshotCache  # noqa: E402
+
+
+class Clock:
+    """
+    A monotonic clock that only moves when told to.
+    """
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(Stats, 'monotonic', clock)
+    return clock
+
+
+def test_served_until_the_ttl_runs_out(clock):
+    cache = SnapshotCache(ttl=15)
+    cache.put('vm-1', 'details')
+    clock.now += 15
+    assert cache.get('vm-1') == 'details'
+    clock.now += 0.5
+    assert cache.get('vm-1') is None
+
+
+def test_put_restarts_the_ttl(clock):
+    cache = SnapshotCache(ttl=15)
+    cache.put('vm-1', 'old')
+    clock.now += 10
+    cache.put('vm-1', 'new')
+    clock.now += 10
+    assert cache.get('vm-1') == 'new'
+
+
+def test_unknown_key_misses(clock):
+    assert SnapshotCache().get('vm-1') is None
+
+
+def test_invalidate_one_or_all(clock):
+    cache = SnapshotCache()
+    cache.put('vm-1', 'one')
+    cache.put('vm-2', 'two')
+    cache.invalidate('vm-1')
+    assert cache.get('vm-1') is None
+    assert cache.get('vm-2') == 'two'
+    cache.invalidate()
+    assert cache.get('vm-2') is None
@@ -0,0 +1,83 @@
+"""
+Tests of walking snapshot trees and adding up snapshot files from the properties of one collection.
+
+-=baka0taku=-
+"""
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip('pyVmomi')
+
+from pyVmomi import vim  # noqa: E402
+from SnapshotScanner import snapshot_bytes, snapshot_info, sort_infos, walk_trees  # noqa: E402
+
+DAY0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+# a snapshot taken days after DAY0
+def tree(name: str, days: int, children: list = None) -> vim.vm.SnapshotTree:
+    return vim.vm.SnapshotTree(name=name, createTime=DAY0 + timedelta(days=days), childSnapshotList=children or [])
+
+
+# a snapshot without a creation time, which pyVmomi types do not allow but the walk has to survive
+def undated_tree(name: str) -> SimpleNamespace:
+    return SimpleNamespace(name=name, createTime=None, childSnapshotList=None)
+
+
+def file_info(name: str, file_type: str, size: int) -> vim.vm.FileLayoutEx.FileInfo:
+    return vim.vm.FileLayoutEx.FileInfo(name=name, type=file_type, size=size)
+
+
+# a VM with the base disk of a parent VM, its own base disk, two delta disks and the files of one snapshot
+LAYOUT = [
+    file_info('[ds] web/web.vmx', 'config', 5),
+    file_info('[ds] web/web.vmdk', 'diskDescriptor', 1),
+    file_info('[ds] web/web-flat.vmdk', 'diskExtent', 1000),
+    file_info('[ds] web/web-000001.vmdk', 'diskDescriptor', 1),
+    file_info('[ds] web/web-000001-delta.vmdk', 'diskExtent', 200),
+    file_info('[ds] web/web-000002-sesparse.vmdk', 'diskExtent', 30),
+    file_info('[ds] web/web-Snapshot1.vmsn', 'snapshotData', 40),
+    file_info('[ds] web/web-Snapshot1.vmem', 'snapshotMemory', 400),
+    file_info('[ds] web/web.vmsd', 'snapshotList', 2),
+    file_info('[ds] base/base-000001-delta.vmdk', 'diskExtent', 5000)
+]
+
+
+def test_walk_trees_counts_depth_and_ends():
+    roots = [tree('a', 3, [tree('b', 5, [tree('c', 9)]), tree('d', 1)]), tree('e', 7)]
+    count, depth, oldest, newest = walk_trees(roots)
+    assert (count, depth) == (5, 3)
+    assert (oldest.name, newest.name) == ('d', 'c')
+
+
+def test_walk_trees_without_snapshots_or_times():
+    assert walk_trees(None) == (0, 0, None, None)
+    count, depth, oldest, newest = walk_trees([undated_tree('a')])
+    assert (count, depth, oldest, newest) == (1, 1, None, None)
+
+
+def test_snapshot_bytes_counts_snapshot_files_and_own_delta_disks():
+    # the delta disk in the parent's folder and the base disks do not count
+    assert snapshot_bytes(LAYOUT) == 1 + 200 + 30 + 40 + 400 + 2
+
+
+def test_snapshot_bytes_without_files():
+    assert snapshot_bytes([]) == 0
+
+
+def test_snapshot_info():
+    props = {'snapshot.rootSnapshotList': [tree('a', 3, [tree('b', 5)])], 'layoutEx.file': LAYOUT,
+             'summary.storage.committed': 6000}
+    info = snapshot_info('web', props)
+    assert (info.vm, info.snapshots, info.depth, info.oldest_name) == ('web', 2, 2, 'a')
+    assert info.size == 673
+    assert info.share() == pytest.approx(673 / 6000)
+    assert snapshot_info('db', {'snapshot.rootSnapshotList': None}) is None
+
+
+def test_sort_by_age_puts_undated_vms_last():
+    dated = snapshot_info('old', {'snapshot.rootSnapshotList': [tree('a', 1)]})
+    newer = snapshot_info('new', {'snapshot.rootSnapshotList': [tree('a', 5)]})
+    undated = snapshot_info('undated', {'snapshot.rootSnapshotList': [undated_tree('a')]})
+    assert [info.vm for info in sort_infos([undated, newer, dated], 'Age')] == ['old', 'new', 'undated']
@@ -0,0 +1,165 @@
+"""
+Tests of resolving task Futures from ListView updates, with the ListView and the PropertyCollector replaced by fakes
+that record what the tracker asks of the server.
+
+-=baka0taku=-
+"""
+from queue import Empty, Queue
+import pytest
+
+pytest.importorskip('pyVmomi')
+
+from pyVmomi import vim, vmodl  # noqa: E402
+from TaskTracker import TaskTracker, wait_tasks, watch_tasks  # noqa: E402
+
+PC = vmodl.query.PropertyCollector
+
+
+class FakeListView:
+    """
+    Records every ModifyListView call, tasks in missing are reported back as unresolved.
+    """
+
+    def __init__(self) -> None:
+        self.calls = list()
+        self.missing = set()
+
+    def ModifyListView(self, add=None, remove=None):
+        self.calls.append(('add', list(add)) if add is not None else ('remove', list(remove)))
+        return [task for task in (add or list()) if task._moId in self.missing]
+
+    def DestroyView(self):
+        self.calls.append(('destroy', list()))
+
+
+class FakeCollector:
+    """
+    Hands the tracker thread whatever update sets the test queues, an exception in the queue is raised instead.
+    """
+
+    def __init__(self) -> None:
+        self.queue = Queue()
+        self.destroyed = False
+
+    def WaitForUpdatesEx(self, version, options):
+        try:
+            item = self.queue.get(timeout=0.05)
+        except Empty:
+            return None
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def CancelWaitForUpdates(self):
+        return
+
+    def DestroyPropertyCollector(self):
+        self.destroyed = True
+
+
+# an update set reporting the given info properties of one task
+def task_update(task: vim.Task, **info) -> PC.UpdateSet:
+    changes = [PC.Change(name='info.' + name, op='assign', val=val) for name, val in info.items()]
+    object_update = PC.ObjectUpdate(kind='modify', obj=task, changeSet=changes)
+    return PC.UpdateSet(version='1', filterSet=[PC.FilterUpdate(objectSet=[object_update])])
+
+
+# a tracker with fake server side objects, registered as the tracker of its stub
+@pytest.fixture
+def tracker(monkeypatch):
+    stub = object()
+    tracker = TaskTracker(stub)
+    tracker.list_view = FakeListView()
+    tracker.collector = FakeCollector()
+    monkeypatch.setitem(TaskTracker.__trackers__, stub, tracker)
+    yield tracker
+    tracker.fail_all(vmodl.fault.RequestCanceled())
+
+
+def test_success_resolves_with_the_result(tracker):
+    task = vim.Task('task-1')
+    future = tracker.submit(task)
+    tracker.collector.queue.put(task_update(task, state=vim.TaskInfo.State.success, result='done'))
+    assert future.result(timeout=5) == 'done'
+    assert tracker.list_view.calls == [('add', [task]), ('remove', [task])]
+    assert tracker.pending() == 0
+
+
+def test_error_raises_the_fault(tracker, monkeypatch):
+    seen = list()
+    monkeypatch.setattr(TaskTracker, 'on_error', lambda task, fault: seen.append((task, fault)))
+    task = vim.Task('task-1')
+    fault = vim.fault.FileNotFound(file='[ds] web01')
+    future = tracker.submit(task)
+    tracker.collector.queue.put(task_update(task, state=vim.TaskInfo.State.error, error=fault))
+    with pytest.raises(vim.fault.FileNotFound):
+        future.result(timeout=5)
+    assert seen == [(task, fault)]
+
+
+def test_progress_is_reported(tracker, monkeypatch):
+    seen = list()
+    monkeypatch.setattr(TaskTracker, 'on_progress', lambda task, percent: seen.append(percent))
+    task = vim.Task('task-1')
+    tracker.submit(task)
+    tracker.apply_update_set(task_update(task, state=vim.TaskInfo.State.running, progress=40))
+    assert seen == [40]
+    assert tracker.pending() == 1
+
+
+def test_task_gone_before_it_was_watched(tracker):
+    task = vim.Task('task-1')
+    tracker.list_view.missing.add('task-1')
+    future = tracker.submit(task)
+    with pytest.raises(vmodl.fault.ManagedObjectNotFound):
+        future.result(timeout=5)
+    assert tracker.pending() == 0
+
+
+def test_lost_session_fails_every_task(tracker):
+    futures = [tracker.submit(vim.Task('task-%d' % number)) for number in range(3)]
+    tracker.collector.queue.put(vim.fault.NotAuthenticated())
+    for future in futures:
+        with pytest.raises(vim.fault.NotAuthenticated):
+            future.result(timeout=5)
+    assert tracker.pending() == 0
+
+
+def test_tasks_are_added_in_one_call(tracker):
+    tasks = [vim.Task('task-%d' % number, tracker.stub) for number in range(3)]
+    futures = watch_tasks(tasks)
+    assert [future.task for future in futures] == tasks
+    assert tracker.list_view.calls == [('add', tasks)]
+    for task in tasks:
+        tracker.collector.queue.put(task_update(task, state=vim.TaskInfo.State.success, result=task._moId))
+    assert [future.result(timeout=5) for future in futures] == ['task-0', 'task-1', 'task-2']
+
+
+def test_wait_tasks_adds_in_one_call(tracker):
+    tasks = [vim.Task('task-%d' % number, tracker.stub) for number in range(2)]
+    for task in tasks:
+        tracker.collector.queue.put(task_update(task, state=vim.TaskInfo.State.success))
+    done, not_done = wait_tasks(tasks, timeout=5)
+    assert len(done) == 2
+    assert not not_done
+    assert tracker.list_view.calls[0] == ('add', tasks)
+
+
+def test_failing_all_releases_the_server_side_objects(tracker):
+    collector = tracker.collector
+    list_view = tracker.list_view
+    future = tracker.submit(vim.Task('task-1'))
+    tracker.fail_all(vim.fault.NotAuthenticated())
+    assert collector.destroyed
+    assert list_view.calls[-1] == ('destroy', list())
+    assert tracker.collector is None and tracker.list_view is None
+    with pytest.raises(vim.fault.NotAuthenticated):
+        future.result(timeout=5)
+
+
+def test_finish_after_the_list_view_is_gone(tracker):
+    task = vim.Task('task-1')
+    tracker.tasks['task-1'] = task
+    tracker.list_view = None
+    tracker.finish('task-1', {'info.state': vim.TaskInfo.State.success})
+    assert tracker.pending() == 0
@@ -0,0 +1,41 @@
+"""
+Tests of the CLI reporting a vCenter that fails to load as an error message instead of a traceback.
+
+-=baka0taku=-
+"""
+from argparse import Namespace
+from http.client import RemoteDisconnected
+import pytest
+
+pytest.importorskip('pyVmomi')
+
+from pyVmomi import vim  # noqa: E402
+import VmtoolCli  # noqa: E402
+
+
+# make get_content raise error once vc01 is connected
+@pytest.fixture
+def failing(data, monkeypatch):
+    def connect(dataset, fqdn, user, passwd):
+        source = dataset.add_source(fqdn)
+        source.connection = object()
+        return source
+
+    def fail(error):
+        def get_content(dataset, source):
+            raise error
+        monkeypatch.setattr(VmtoolCli, 'get_content', get_content)
+
+    monkeypatch.setattr(VmtoolCli, 'make_connection', connect)
+    return fail
+
+
+@pytest.mark.parametrize('error, text', [
+    (vim.fault.NotAuthenticated(msg='session gone'), 'session gone'),
+    (ConnectionResetError('connection reset'), 'connection reset'),
+    (RemoteDisconnected('closed without response'), 'closed without response')
+])
+def test_load_errors_become_messages(data, failing, error, text):
+    failing(error)
+    args = Namespace(user='admin', page_size=100, sessions=1)
+    assert VmtoolCli.open_source(data, 'vc01', args, 'secret') == 'vc01: ' + text
@@ -1,7 +1,10 @@
+from concurrent.futures import ThreadPoolExecutor
 from threading import Thread
-from datetime import date
+from datetime import date, datetime, timezone
+from time import perf_counter
 
 from kivy.app import App
+from kivy.clock import Clock, mainthread
 from kivy.core.window import Window
 from kivy.metrics import dp
 from kivy.properties import StringProperty, NumericProperty
@@ -10,12 +13,33 @@ from kivy.uix.button import Button
 from kivy.uix.checkbox import CheckBox
 from kivy.uix.dropdown import DropDown
 from kivy.uix.gridlayout import GridLayout
+from kivy.uix.label import Label
 from kivy.uix.modalview import ModalView
+from kivy.uix.popup import Popup
 from kivy.uix.scrollview import ScrollView
+from kivy.uix.spinner import Spinner
 from kivy.uix.tabbedpanel import TabbedPanel
 from kivy.uix.textinput import TextInput
 
+from BulkFreeze import FREEZE_SCRIPTS, BulkFreeze, FreezeResult, summarize
+from BulkPower import ACTIONS, BulkPower, PowerResult
+from CloneGC import CLONE_COLUMNS, DEFAULT_MIN_AGE_DAYS, CloneGC, GCResult
+from CloneGC import summarize as summarize_gc
+from ConsoleTyper import ConsoleTyper
+from DatastoreBrowser import FILE_COLUMNS, DatastoreBrowser
+from EventWatcher import EventWatcher
 from FuncLib import *
+from Inventory import DEFAULT_PAGE_SIZE, InventorySync
+from InventoryCache import load_last_cache, save_cache, save_index
+from PerfMonitor import HOST_COUNTERS, SERIES_TITLES, SERIES_UNITS, VM_COUNTERS, PerfMonitor
+from PortgroupBuilder import DEFAULT_NAME_PATTERN, PLAN_COLUMNS, BuildReport, PortgroupBuilder, compare_text
+from SessionPool import DEFAULT_POOL_SIZE, SessionPool
+from SnapshotScanner import SNAPSHOT_COLUMNS, SORT_KEYS, SnapshotScanner, sort_infos
+from Stats import (HostStats, VmDetails, get_all_datastore_stats, get_all_host_stats, get_vm_details, host_stats_cache,
+                   vm_detail_cache)
+from TaskHistory import SCOPES, TASK_COLUMNS, TASK_STATES, TIME_RANGES, TaskHistory, scope_entity, task_row
+from TaskTracker import TaskTracker, error_text
+from Widgets import InventoryList, Sparkline, TableRow, table_view
 
 Window.size = (dp(630), dp(210))
 
@@ -25,264 +49,605 @@ class MainTabs(TabbedPanel):
     progress_bar = NumericProperty(0)
     vm_object = None
     host_object = None
+    page_size = DEFAULT_PAGE_SIZE
+    round_trips = 0
+    connecting = False
+    pool_size = DEFAULT_POOL_SIZE
+    expected_objects = 0
+    host_monitor = None
+    vm_monitor = None
+    vm_perf_grid = None
+    vm_perf_header = None
+    task_history = None
+    task_loading = False
+    ds_browser = None
+    pg_busy = False
 
     def __init__(self, data: DataTree, **kwargs):
         super(MainTabs, self).__init__(**kwargs)
         self.dataset = data
+        # objects seen so far by the initial pass of each vCenter
+        self.seen = dict()
+        # key -> VM whose realtime counters are charted
+        self.vm_watch = dict()
+        # key -> (row widget, series -> (Sparkline, Label)) of the open perf panel
+        self.vm_charts = dict()
+        # portgroup name -> row of the portgroup table
+        self.pg_rows = dict()
+        # mode -> last BuildReport, for comparing batched with one by one creation
+        self.pg_reports = dict()
+        self.vm_list = InventoryList(view=self.ids.vm_list, callback=self.vm_select)
+        self.host_list = InventoryList(view=self.ids.host_list, callback=self.host_select)
+        TaskTracker.on_error = self.task_failed
+        Clock.schedule_once(self.warm_start)
+
+    # show the inventory of the last used vCenters before connecting
+    def warm_start(self, dt):
+        start = perf_counter()
+        fqdns, num_of_objects = load_last_cache(data=self.dataset)
+        if num_of_objects == 0:
+            return
+        self.ids.address.text = ', '.join(fqdns)
+        self.build_lists()
+        self.status_bar = 'Loaded ' + str(num_of_objects) + ' cached objects in ' + \
+                          str(int((perf_counter() - start) * 1000)) + ' ms'
+        return
+
+    # save the inventory so the next start can show it straight away
+    def save_inventory(self):
+        sources = [source for source in self.dataset.connected_sources() if source.sync is not None]
+        if not sources:
+            return
+        for source in sources:
+            save_cache(data=self.dataset, source=source, version=source.sync.version)
+        save_index(sources)
+        return
+
+    # report tasks that fail after they were sent
+    @mainthread
+    def task_failed(self, task: vim.Task, fault: vmodl.MethodFault):
+        message = fault.msg if fault is not None and fault.msg else 'Task failed.'
+        p = Popup(title='Task Error', content=Label(text=message, text_size=(dp(280), None)), size_hint=(.4, .3))
+        p.open()
+        return
+
+    # say a task was sent, or why it was not, and put how it ended in the status bar. Failures also get the
+    # task_failed popup.
+    def report_task(self, future, label: str, not_sent: str = None):
+        if future is None:
+            p = Popup(title='Error', content=Label(text=not_sent or label + ' task not sent.'), size_hint=(.2, .2))
+            p.open()
+            return
+        p = Popup(title='Info', content=Label(text=label + ' task sent.'), size_hint=(.2, .2))
+        p.open()
+        future.add_done_callback(lambda done: self.task_done(label, done))
+        return
+
+    @mainthread
+    def task_done(self, label: str, future):
+        self.status_bar = label + (' task finished.' if future.exception() is None else ' task failed.')
+        return
+
+    # show progress from a background thread
+    @mainthread
+    def set_status(self, text: str, progress: float = None):
+        self.status_bar = text
+        if progress is not None:
+            self.progress_bar = progress
+        return
 
+    # the address field takes several vCenters separated by commas
     def start_connect(self):
-        t = Thread(target=self.connect)
-        t.start()
-        t.join()
-        self.build_lists()
+        if self.connecting or self.dataset.connected_sources():
+            return
+        fqdns = [fqdn.strip() for fqdn in self.ids.address.text.split(',') if fqdn.strip()]
+        if not fqdns:
+            return
+        self.connecting = True
+        # the cached inventory on show tells how many objects to expect
+        self.expected_objects = len(self.dataset.moiddict)
+        self.seen = dict()
+        self.progress_bar = 0
+        Thread(target=self.connect, args=(fqdns,), daemon=True).start()
+        return
+
+    # runs off the UI thread, every vCenter connects in its own thread so this takes as long as the slowest one
+    def connect(self, fqdns: list):
+        self.set_status("Connecting...", .05)
+        with ThreadPoolExecutor(max_workers=len(fqdns)) as executor:
+            errors = [error for error in executor.map(self.connect_source, fqdns) if error is not None]
+        self.save_inventory()
+        self.connect_done(errors)
+        return
 
-    def connect(self):
-        self.status_bar = "Connecting..."
-        make_connection(dataset=self.dataset,
-                        fqdn=self.ids.address.text,
-                        user=self.ids.username.text,
-                        passwd=self.ids.password.text)
-        # get all content
-        if self.dataset.connection is None:
-            self.status_bar = "Idle..."
-            return
-        self.status_bar = "Getting Content..."
-        self.dataset.content = self.dataset.connection.RetrieveContent()
-
-        # VM View
-        self.status_bar = "Getting Views..."
-        self.dataset.vmobjlist = self.dataset.content.viewManager.CreateContainerView(
-            self.dataset.content.rootFolder,
-            [vim.VirtualMachine], True)
-        # Hosts View
-        self.dataset.hostobjlist = self.dataset.content.viewManager.CreateContainerView(
-            self.dataset.content.rootFolder,
-            [vim.HostSystem], True)
-        # Datastore View
-        self.dataset.datastoreobjlist = self.dataset.content.viewManager.CreateContainerView(
-            self.dataset.content.rootFolder,
-            [vim.Datastore], True)
-
-        # Network View
-        self.dataset.networkobjlist = self.dataset.content.viewManager.CreateContainerView(
-            self.dataset.content.rootFolder,
-            [vim.Network], True)
-
-        # DVSwitch View
-        self.dataset.dvswitchobjlist = self.dataset.content.viewManager.CreateContainerView(
-            self.dataset.content.rootFolder,
-            [vim.DistributedVirtualSwitch], True)
-
-        # build dictionaries
-        self.status_bar = "Building Host Dictionary..."
-        for host in self.dataset.hostobjlist.view:
-            self.dataset.hostdict[host.name] = host
-        self.status_bar = "Building Datastore Dictionary..."
-        for ds in self.dataset.datastoreobjlist.view:
-            self.dataset.datastoredict[ds.name] = ds
-        self.status_bar = "Building DVSwitch Dictionary..."
-        for dvs in self.dataset.dvswitchobjlist.view:
-            self.dataset.dvswitchdict[dvs.name] = dvs
-        # build VM dict
-        self.status_bar = "Building VM Dictionary..."
-        obj_specs: list = list()
-        for vm in self.dataset.vmobjlist.view:
-            obj_spec = vmodl.query.PropertyCollector.ObjectSpec(obj=vm)
-            obj_specs.append(obj_spec)
-        filter_spec = vmodl.query.PropertyCollector.FilterSpec()
-        filter_spec.objectSet = obj_specs
-        prop_set = vmodl.query.PropertyCollector.PropertySpec(all=False)
-        prop_set.type = vim.VirtualMachine
-        prop_set.pathSet = ['name']
-        filter_spec.propSet = [prop_set]
-        prop_collector = self.dataset.content.propertyCollector
-        options = vmodl.query.PropertyCollector.RetrieveOptions()
-        results = list()
+    # connect to one vCenter and page in its inventory, every page is handed to inventory_page as it arrives.
+    # Returns an error message or None.
+    def connect_source(self, fqdn: str) -> str:
+        source = make_connection(dataset=self.dataset,
+                                 fqdn=fqdn,
+                                 user=self.ids.username.text,
+                                 passwd=self.ids.password.text)
+        if source.connection is None:
+            return 'Could not connect to ' + fqdn + '.'
+        self.set_status(fqdn + ': Getting Content...')
+        try:
+            get_content(self.dataset, source)
+        except Exception as e:
+            return fqdn + ': getting content failed: ' + error_text(e)
+
+        # collect every managed type in one traversal and keep it in sync afterwards
+        self.set_status(fqdn + ': Building Inventory...')
+        source.sync = InventorySync(data=self.dataset, source=source, page_size=self.page_size,
+                                    on_change=self.inventory_changed,
+                                    on_page=lambda changes, seen: self.inventory_page(fqdn, changes, seen))
+        error = self.load_sync(source)
+        if error is None:
+            self.open_pool(source)
+        return error
+
+    # page in the inventory of a vCenter with its sync and start it, runs off the UI thread. Returns an error
+    # message or None.
+    def load_sync(self, source: Source) -> str:
         try:
-            result = prop_collector.RetrievePropertiesEx([filter_spec], options)
-            results.append(result)
-            while result.token is not None:
-                result = prop_collector.ContinueRetrievePropertiesEx(result.token)
-                results.append(result)
-            for result in results:
-                for obj in result.objects:
-                    self.dataset.vmdict[obj.propSet[0].val] = obj.obj
-        except vmodl.fault.ManagedObjectNotFound:
-            pass
-
-        # build net dict
-        self.status_bar = "Building DVPortgroup Dictionary..."
-        net_specs = list()
-        for net in self.dataset.networkobjlist.view:
-            net_spec = vmodl.query.PropertyCollector.ObjectSpec(obj=net)
-            net_specs.append(net_spec)
-        filter_spec = vmodl.query.PropertyCollector.FilterSpec()
-        filter_spec.objectSet = net_specs
-        prop_set = vmodl.query.PropertyCollector.PropertySpec(all=False)
-        prop_set.pathSet = ['name']
-        prop_set.type = vim.Network
-        filter_spec.propSet = [prop_set]
-        prop_collector = self.dataset.content.propertyCollector
-        options = vmodl.query.PropertyCollector.RetrieveOptions()
+            source.sync.start()
+        except Exception as e:
+            # socket errors are not MethodFaults, either way the UI has to leave the connecting state
+            return source.fqdn + ': inventory failed: ' + error_text(e)
+        self.watch_events(source)
+        return None
+
+    # subscribe to the VM events of a vCenter to keep the cached stats fresh, the inventory sync keeps the list
+    def watch_events(self, source: Source):
+        if source.events is not None:
+            source.events.stop()
+        source.events = EventWatcher(data=self.dataset, source=source)
         try:
-            result = prop_collector.RetrievePropertiesEx([filter_spec], options)
-            results.clear()
-            results.append(result)
-            while result.token is not None:
-                result = prop_collector.ContinueRetrievePropertiesEx(result.token)
-                results.append(result)
-            for result in results:
-                for obj in result.objects:
-                    self.dataset.dvportgroupdict[obj.propSet[0].val] = obj.obj
-        except vmodl.fault.ManagedObjectNotFound:
-            pass
+            source.events.start()
+        except Exception:
+            source.events.stop()
+            source.events = None
+        return
+
+    # log in the extra sessions bulk operations are sent over, the app works without them
+    def open_pool(self, source: Source):
+        if source.pool is not None or self.pool_size < 2:
+            return
+        self.set_status(source.fqdn + ': Opening ' + str(self.pool_size) + ' sessions...')
+        pool = SessionPool(source=source, user=self.ids.username.text, passwd=self.ids.password.text,
+                           size=self.pool_size)
+        try:
+            pool.open()
+        except Exception:
+            pool.close()
+            return
+        source.pool = pool
+        return
+
+    @mainthread
+    def connect_done(self, errors: list):
+        self.connecting = False
+        sources = self.dataset.connected_sources()
+        self.round_trips = sum(source.sync.round_trips for source in sources if source.sync is not None)
+        if errors:
+            self.status_bar = '; '.join(errors)
+        else:
+            self.status_bar = 'Done (' + str(len(sources)) + ' vCenter(s), ' + str(self.round_trips) + ' round trips)'
+        self.progress_bar = 1 if sources else 0
+        if sources:
+            self.start_host_monitor()
+        return
+
+    # sample CPU ready, ballooning, disk latency and network usage of every host in the background
+    def start_host_monitor(self):
+        if self.host_monitor is None:
+            self.host_monitor = PerfMonitor(data=self.dataset, entities=lambda: list(self.dataset.hostdict.values()),
+                                            on_sample=self.host_perf_updated)
+        self.host_monitor.start()
+        return
+
+    # redraw the charts when the selected host got a new sample
+    @mainthread
+    def host_perf_updated(self, keys: list):
+        if self.host_object is not None and self.dataset.key_of(self.host_object) in keys:
+            self.show_host_perf()
+        return
+
+    def show_host_perf(self):
+        if self.host_monitor is None or self.host_object is None:
+            return
+        key = self.dataset.key_of(self.host_object)
+        for series in HOST_COUNTERS.values():
+            self.ids['host_' + series].set_values(self.host_monitor.values_of(key, series))
+            self.ids['host_' + series + '_value'].text = self.host_monitor.latest_of(key, series)
+        return
+
+    # add the selected VM to the watched VMs and show the charts of every watched VM
+    def watch_vm_perf(self):
+        if self.vm_object is not None:
+            key = self.dataset.key_of(self.vm_object)
+            if key not in self.vm_watch:
+                self.vm_watch[key] = self.vm_object
+                if self.vm_monitor is None:
+                    self.vm_monitor = PerfMonitor(data=self.dataset, entities=lambda: list(self.vm_watch.values()),
+                                                  counters=VM_COUNTERS, on_sample=self.vm_perf_updated)
+                self.vm_monitor.start()
+                # the new VM gets its first sample now instead of at the end of the interval
+                self.vm_monitor.sample_now()
+        if not self.vm_watch:
+            self.status_bar = 'Select a VM to chart.'
+            return
+        if self.vm_perf_grid is None:
+            self.open_vm_perf()
+        else:
+            for key, vmobj in self.vm_watch.items():
+                if key not in self.vm_charts:
+                    self.add_vm_perf_row(key, vmobj)
+        return
+
+    def open_vm_perf(self):
+        mv = ModalView(size_hint=(.95, .9))
+        bl = BoxLayout(orientation='vertical')
+        self.vm_perf_header = Label(text='Waiting for the first sample...', size_hint_y=None, height=dp(30))
+        bl.add_widget(self.vm_perf_header)
+        headings = BoxLayout(size_hint_y=None, height=dp(30))
+        headings.add_widget(Label(text='VM', underline=True, size_hint_x=.2))
+        for series in VM_COUNTERS.values():
+            headings.add_widget(Label(text=SERIES_TITLES[series] + ' (' + SERIES_UNITS[series] + ')', underline=True))
+        headings.add_widget(Label(text='', size_hint_x=.08))
+        bl.add_widget(headings)
+        sv = ScrollView()
+        self.vm_perf_grid = GridLayout(cols=1, size_hint_y=None, spacing=dp(2))
+        self.vm_perf_grid.bind(minimum_height=self.vm_perf_grid.setter('height'))
+        sv.add_widget(self.vm_perf_grid)
+        bl.add_widget(sv)
+        bl.add_widget(Button(text='Close', size_hint_y=None, height=dp(40), on_release=mv.dismiss))
+        mv.add_widget(bl)
+        mv.bind(on_dismiss=self.close_vm_perf)
+        for key, vmobj in self.vm_watch.items():
+            self.add_vm_perf_row(key, vmobj)
+        mv.open()
+        return
+
+    # chart row of one watched VM, drawn from the history the monitor already holds
+    def add_vm_perf_row(self, key: str, vmobj: vim.VirtualMachine):
+        start = perf_counter()
+        row = BoxLayout(size_hint_y=None, height=dp(50))
+        row.add_widget(Label(text=self.dataset.real_name(vmobj), size_hint_x=.2, shorten=True))
+        charts = dict()
+        for series in VM_COUNTERS.values():
+            cell = BoxLayout(orientation='vertical', padding=dp(2))
+            line = Sparkline(capacity=self.vm_monitor.samples)
+            value = Label(text='-', size_hint_y=None, height=dp(16))
+            cell.add_widget(line)
+            cell.add_widget(value)
+            row.add_widget(cell)
+            charts[series] = (line, value)
+        row.add_widget(Button(text='X', size_hint_x=.08, on_release=lambda btn: self.unwatch_vm_perf(key)))
+        self.vm_perf_grid.add_widget(row)
+        self.vm_charts[key] = (row, charts)
+        self.draw_vm_perf(key)
+        self.status_bar = 'Chart added in ' + str(round((perf_counter() - start) * 1000, 1)) + ' ms'
+        return
+
+    def unwatch_vm_perf(self, key: str):
+        self.vm_watch.pop(key, None)
+        row = self.vm_charts.pop(key, (None, None))[0]
+        if row is not None and self.vm_perf_grid is not None:
+            self.vm_perf_grid.remove_widget(row)
+        if not self.vm_watch and self.vm_monitor is not None:
+            self.vm_monitor.stop()
+            self.vm_monitor = None
+        return
+
+    # the monitor keeps sampling the watched VMs while the panel is closed
+    def close_vm_perf(self, instance):
+        self.vm_charts = dict()
+        self.vm_perf_grid = None
+        self.vm_perf_header = None
+        return
+
+    def draw_vm_perf(self, key: str):
+        charts = self.vm_charts.get(key)
+        if charts is None or self.vm_monitor is None:
+            return
+        for series, (line, value) in charts[1].items():
+            line.set_values(self.vm_monitor.values_of(key, series))
+            value.text = self.vm_monitor.latest_of(key, series)
+        return
+
+    # redraw only the rows of the VMs that got a new sample, and show what watching one VM costs
+    @mainthread
+    def vm_perf_updated(self, keys: list):
+        if self.vm_perf_grid is None or self.vm_monitor is None:
+            return
+        for key in keys:
+            self.draw_vm_perf(key)
+        cost = self.vm_monitor.watch_cost()
+        self.vm_perf_header.text = (str(cost['entities']) + ' VM(s), last round ' +
+                                    str(round(cost['round_seconds'] * 1000)) + ' ms, ' +
+                                    str(round(cost['seconds_per_entity'] * 1000, 1)) + ' ms and ' +
+                                    str(round(cost['bytes_per_entity'] / 1024, 1)) + ' KB of history per VM')
+        return
+
+    # merge one page of the initial inventory pass of a vCenter into the lists
+    @mainthread
+    def inventory_page(self, fqdn: str, changes: list, seen: int) -> None:
+        vms = dict()
+        hosts = dict()
+        gone = list()
+        for old_name, new_name in changes:
+            if old_name is not None and old_name != new_name:
+                gone.append(old_name)
+            if new_name is None:
+                continue
+            vmobj = self.dataset.vmdict.get(new_name)
+            if vmobj is not None:
+                vms[new_name] = self.dataset.attrs_of(vmobj)
+            elif new_name in self.dataset.hostdict:
+                hosts[new_name] = None
+        self.vm_list.update(vms, [name for name in gone if name not in self.dataset.vmdict])
+        self.host_list.update(hosts, [name for name in gone if name not in self.dataset.hostdict])
+        self.seen[fqdn] = seen
+        seen = sum(self.seen.values())
+        # without a cache the total is unknown, so the bar creeps towards the end one page at a time
+        total = max(self.expected_objects, seen) or 1
+        if not self.expected_objects:
+            total = seen + self.page_size
+        self.progress_bar = .15 + .85 * seen / total
+        self.status_bar = 'Loaded ' + str(seen) + ' objects...'
+        return
 
     def build_lists(self):
-        # populate VM List
-        num_of_vms = len(list(self.dataset.vmdict.keys()))
-        # change height of list based on number of VMs
-        self.ids.vm_list.height = dp(num_of_vms * 30)
-        button_number = 0
-        for vm_name in sorted(list(self.dataset.vmdict.keys()), key=str.lower):
-            self.status_bar = "Creating VM List..."
-            tb = Button(text=vm_name, size_hint_y=None, height=dp(30))
-            tb.bind(on_release=self.vm_select)
-            self.ids.vm_list.add_widget(tb)
-            button_number += 1
-            self.progress_bar = button_number / num_of_vms
-
-        # do the same thing for hosts
-        num_of_hosts = len(list(self.dataset.hostdict.keys()))
-        self.ids.host_list.height = dp(num_of_hosts * 30)
-        button_number = 0
-        for host_name in sorted(list(self.dataset.hostdict.keys()), key=str.lower):
-            b = Button(text=host_name, size_hint_y=None, height=dp(30))
-            b.bind(on_release=self.host_select)
-            self.ids.host_list.add_widget(b)
-            button_number += 1
+        self.status_bar = "Creating VM List..."
+        vm_attrs = dict()
+        for vm_name, vmobj in list(self.dataset.vmdict.items()):
+            vm_attrs[vm_name] = self.dataset.attrs_of(vmobj)
+        self.vm_list.rebuild(list(vm_attrs.keys()), vm_attrs)
+        self.host_list.rebuild(list(self.dataset.hostdict.keys()))
+        self.progress_bar = 1
+        self.status_bar = 'Done (' + str(self.round_trips) + ' round trips)'
+        return
 
-        self.status_bar = 'Done'
+    # apply inventory deltas from the sync thread to the lists
+    @mainthread
+    def inventory_changed(self, changes: list) -> None:
+        for old_name, new_name in changes:
+            if old_name is not None:
+                if old_name not in self.dataset.vmdict:
+                    self.vm_list.remove(old_name)
+                if old_name not in self.dataset.hostdict:
+                    self.host_list.remove(old_name)
+            if new_name is not None:
+                vmobj = self.dataset.vmdict.get(new_name)
+                if vmobj is not None:
+                    self.vm_list.add(new_name, self.dataset.attrs_of(vmobj))
+                if new_name in self.dataset.hostdict:
+                    self.host_list.add(new_name)
+        self.status_bar = 'Synced ' + str(len(changes)) + ' change(s)'
         return
 
     def disconnect(self):
+        if self.connecting:
+            self.status_bar = 'Still connecting...'
+            return
         self.status_bar = 'Disconnecting...'
-        Disconnect(self.dataset.connection)
-        self.ids.vm_list.clear_widgets()
-        self.ids.host_list.clear_widgets()
+        self.save_inventory()
+        if self.host_monitor is not None:
+            self.host_monitor.stop()
+            self.host_monitor = None
+        if self.vm_monitor is not None:
+            self.vm_monitor.stop()
+            self.vm_monitor = None
+        self.vm_watch = dict()
+        close_connection(self.dataset)
+        self.vm_list.clear()
+        self.host_list.clear()
         self.dataset.clear_data()
         self.status_bar = 'Idle...'
         self.progress_bar = 0
         return
 
     def vm_select(self, instance):
+        vmobj = self.dataset.vmdict.get(instance.text)
+        if vmobj is None:
+            return
+        # ctrl-click adds to or takes from the selection bulk operations work on
+        if 'ctrl' in Window.modifiers:
+            self.vm_list.toggle(instance.text)
+            self.status_bar = str(len(self.vm_list.selected)) + ' VM(s) selected'
+            return
+        self.vm_list.select([instance.text])
+        # cached entries have no connection behind them yet
+        if not self.dataset.is_live(vmobj):
+            self.status_bar = 'Connect to load VM details.'
+            return
         # set vm object for class
-        self.vm_object = self.dataset.vmdict.get(instance.text)
-
-        # fill status fields
-        self.ids.num_of_cpu.text = get_num_processors(vmobj=self.vm_object)
-        self.ids.cpu_usage.text = get_cpu_usage(vm=self.vm_object)
-        self.ids.memory_usage.text = get_memory_usage(vm=self.vm_object)
-        self.ids.total_memory.text = get_total_mem(vmobj=self.vm_object)
-        self.ids.disk_usage.text = get_disk_usage(vm=self.vm_object)
-        self.ids.powered_on.text = str(is_powered_on(vm=self.vm_object))
-        self.ids.frozen.text = str(is_frozen(vm=self.vm_object))
-        self.ids.num_of_disks.text = get_num_disks(vm=self.vm_object)
-        self.ids.num_of_snapshots.text = get_num_snapshots(vm=self.vm_object)
-        self.ids.num_of_files_per_disk.text = get_num_disk_files(vm=self.vm_object)
-        self.ids.swapped_memory.text = get_swapped_ram(vmobj=self.vm_object)
-        self.ids.host_name.text = get_host_name(vmobj=self.vm_object)
+        self.vm_object = vmobj
+        # fill status fields straight from the cache, otherwise fetch them off the UI thread
+        details = vm_detail_cache.get(self.dataset.key_of(self.vm_object))
+        if details is not None:
+            self.show_vm_details(self.vm_object, details)
+            return
+        self.status_bar = 'Loading VM details...'
+        Thread(target=self.load_vm_details, args=(self.vm_object,), daemon=True).start()
+        return
+
+    def load_vm_details(self, vmobj: vim.VirtualMachine):
+        try:
+            details = get_vm_details(data=self.dataset, vm=vmobj)
+        except Exception as e:
+            self.set_status('Loading VM details failed: ' + error_text(e))
+            return
+        self.show_vm_details(vmobj, details)
+        return
+
+    @mainthread
+    def show_vm_details(self, vmobj: vim.VirtualMachine, details: VmDetails):
+        # the user may have clicked another VM while this one was loading
+        if vmobj is not self.vm_object:
+            return
+        self.ids.num_of_cpu.text = details.num_cpu
+        self.ids.cpu_usage.text = details.cpu_usage
+        self.ids.memory_usage.text = details.memory_usage
+        self.ids.total_memory.text = details.total_memory
+        self.ids.disk_usage.text = details.disk_usage
+        self.ids.powered_on.text = details.powered_on
+        self.ids.frozen.text = details.frozen
+        self.ids.num_of_disks.text = details.num_disks
+        self.ids.num_of_snapshots.text = details.num_snapshots
+        self.ids.num_of_files_per_disk.text = details.num_files_per_disk
+        self.ids.swapped_memory.text = details.swapped_memory
+        self.ids.host_name.text = details.host_name
+        self.status_bar = 'Done'
         return
 
     def host_select(self, instance):
+        hostobj = self.dataset.hostdict.get(instance.text)
+        if hostobj is None:
+            return
+        if not self.dataset.is_live(hostobj):
+            self.status_bar = 'Connect to load host details.'
+            return
         # set host object for class
-        self.host_object = self.dataset.hostdict.get(instance.text)
-        # get stats
-        self.ids.host_cpu.text = str(get_host_cpu_usage(hostobj=self.host_object)) + ' %'
-        self.ids.cpu_bar.value = get_host_cpu_usage(hostobj=self.host_object)
-        self.ids.host_mem.text = str(get_host_memory_usage(hostobj=self.host_object)) + ' %'
-        self.ids.mem_bar.value = get_host_memory_usage(hostobj=self.host_object)
-        self.ids.storage_free.text = str(get_host_storage_usage(hostobj=self.host_object)) + ' %'
-        self.ids.storage_bar.value = get_host_storage_usage(hostobj=self.host_object)
-        self.ids.host_powered_on.text = str(is_host_powered_on(hostobj=self.host_object))
-        self.ids.host_maintenance_mode.text = str(is_host_in_maint_mode(hostobj=self.host_object))
+        self.host_object = hostobj
+        self.show_host_perf()
+        stats = host_stats_cache.get(self.dataset.key_of(self.host_object))
+        if stats is not None:
+            self.show_host_stats(self.host_object, stats)
+            return
+        # one collection covers every host, so the next clicks come from the cache
+        self.status_bar = 'Loading host stats...'
+        Thread(target=self.load_host_stats, args=(self.host_object,), daemon=True).start()
+        return
+
+    def load_host_stats(self, hostobj: vim.HostSystem):
+        try:
+            snapshot = get_all_host_stats(data=self.dataset, use_cache=False)
+        except Exception as e:
+            self.set_status('Loading host stats failed: ' + error_text(e))
+            return
+        stats = snapshot.hosts.get(self.dataset.key_of(hostobj))
+        if stats is not None:
+            self.show_host_stats(hostobj, stats)
+        return
+
+    @mainthread
+    def show_host_stats(self, hostobj: vim.HostSystem, stats: HostStats):
+        if hostobj is not self.host_object:
+            return
+        self.ids.host_cpu.text = str(stats.cpu_usage) + ' %'
+        self.ids.cpu_bar.value = stats.cpu_usage
+        self.ids.host_mem.text = str(stats.memory_usage) + ' %'
+        self.ids.mem_bar.value = stats.memory_usage
+        self.ids.storage_free.text = str(stats.storage_free) + ' %'
+        self.ids.storage_bar.value = stats.storage_free
+        self.ids.host_powered_on.text = str(stats.powered_on)
+        self.ids.host_maintenance_mode.text = str(stats.maintenance_mode)
+        self.status_bar = 'Done'
         return
 
     def power_on_vm(self):
-        res = power_on_vm(self.vm_object)
-        if res:
-            pop = Popup(title="Info", content=Label(text='Power On Sent'), size_hint=(.2, .2),)
-            pop.open()
+        self.report_task(power_on_vm(self.vm_object), 'Power on')
         return
 
+    # browse the task history of the selected VM, or of its host, cluster or datacenter
     def task_view(self):
-        task_manager = self.dataset.content.taskManager
-        filter_spec = vim.TaskFilterSpec()
-        by_entity = vim.TaskFilterSpec.ByEntity()
-        if self.vm_object is None:
+        target = self.vm_object if self.vm_object is not None else self.host_object
+        if target is None or not self.dataset.is_live(target):
             pop = Popup(title="Error", content=Label(text='Select a VM first.'), size_hint=(.2, .2), )
             pop.open()
             return
-        by_entity.entity = self.vm_object
-        by_entity.recursion = 'self'
-        filter_spec.entity = by_entity
-        task_collector = task_manager.CreateCollectorForTasks(filter=filter_spec)
-
-        # create inner class for tasks
-        class TaskObj:
-            def __init__(self):
-                self.start_date = None
-                self.state = None
-                self.description_id = None
-                self.start_time = None
-                self.complete_time = None
-                self.time_to_complete = None
-                self.progress = None
-
-        # init list of task objects
-        task_objs = list()
-        # package tasks in objects and append to list
         mv = ModalView(size_hint=(.9, .8))
-        gl = GridLayout(cols=7)
-        for task in task_collector.latestPage:
-            tmp_obj = TaskObj()
-            tmp_obj.start_date = str(task.startTime.date())
-            tmp_obj.state = task.state
-            tmp_obj.description_id = task.descriptionId
-            tmp_obj.start_time = str(task.startTime.time())[:str(task.startTime.time()).rfind('.')]
-            if task.completeTime is not None:
-                tmp_obj.complete_time = str(task.completeTime.time())[:str(task.completeTime.time()).rfind('.')]
-                tmp_obj.time_to_complete = task.completeTime - task.startTime
-                tmp_obj.time_to_complete = str(tmp_obj.time_to_complete)[:str(tmp_obj.time_to_complete).rfind('.')]
-                tmp_obj.progress = 100
-            else:
-                tmp_obj.complete_time = 0
-                tmp_obj.time_to_complete = 0
-                tmp_obj.progress = task.progress
-            task_objs.append(tmp_obj)
-        gl.add_widget(Label(text="Start Date", underline=True))
-        gl.add_widget(Label(text="State", underline=True))
-        gl.add_widget(Label(text="Description ID", underline=True))
-        gl.add_widget(Label(text="Start Time", underline=True))
-        gl.add_widget(Label(text="Complete Time", underline=True))
-        gl.add_widget(Label(text="Time to Complete", underline=True))
-        gl.add_widget(Label(text="Progress", underline=True))
-        for i in range(len(task_objs)):
-            gl.add_widget(Label(text=str(task_objs[i].start_date)))
-            gl.add_widget(Label(text=str(task_objs[i].state)))
-            gl.add_widget(Label(text=str(task_objs[i].description_id)))
-            gl.add_widget(Label(text=str(task_objs[i].start_time)))
-            gl.add_widget(Label(text=str(task_objs[i].complete_time)))
-            gl.add_widget(Label(text=str(task_objs[i].time_to_complete)))
-            gl.add_widget(Label(text=str(task_objs[i].progress)))
-        mv.add_widget(gl)
+        bl = BoxLayout(orientation='vertical')
+        controls = BoxLayout(size_hint_y=None, height=dp(40))
+        scope = Spinner(text='VM' if isinstance(target, vim.VirtualMachine) else 'Host', values=SCOPES)
+        state = Spinner(text='Any state', values=('Any state',) + TASK_STATES)
+        since = Spinner(text='Any time', values=list(TIME_RANGES.keys()))
+        load = Button(text='Load')
+        older = Button(text='Older Tasks')
+        for widget in (scope, state, since, load, older):
+            controls.add_widget(widget)
+        bl.add_widget(controls)
+        status = Label(text='', size_hint_y=None, height=dp(30))
+        bl.add_widget(status)
+        bl.add_widget(TableRow(cells=list(TASK_COLUMNS), size_hint_y=None, height=dp(30)))
+        view = table_view()
+        bl.add_widget(view)
+        bl.add_widget(Button(text='Close', size_hint_y=None, height=dp(40), on_release=mv.dismiss))
+        mv.add_widget(bl)
+
+        def start_load(*args):
+            states = None if state.text == 'Any state' else [state.text]
+            self.load_task_history(target, scope.text, states, TIME_RANGES[since.text], view, status)
+            return
+        load.bind(on_release=start_load)
+        older.bind(on_release=lambda instance: self.more_task_history(view, status))
+        # scrolled to the bottom, fetch the page before it
+        view.bind(scroll_y=lambda instance, value: self.more_task_history(view, status) if value <= 0 else None)
+        mv.bind(on_dismiss=lambda instance: self.stop_task_history())
         mv.open()
+        start_load()
+        return
+
+    def load_task_history(self, target: vim.ManagedEntity, scope: str, states: list, since, view, status):
+        self.stop_task_history()
+        view.data = []
+        status.text = 'Loading ' + scope + ' tasks...'
+        history = TaskHistory(data=self.dataset, entity=target, states=states, since=since)
+        self.task_history = history
+        self.task_loading = True
+        Thread(target=self.read_task_page, args=(history, scope, view, status), daemon=True).start()
+        return
+
+    # read the page before the ones shown, pages are only read when asked for
+    def more_task_history(self, view, status):
+        history = self.task_history
+        if history is None or self.task_loading or history.exhausted:
+            return
+        self.task_loading = True
+        status.text = 'Loading older tasks...'
+        Thread(target=self.read_task_page, args=(history, None, view, status), daemon=True).start()
+        return
+
+    # read one page off the UI thread, the first page of a history finds the entity of its scope first
+    def read_task_page(self, history: TaskHistory, scope: str, view, status):
+        try:
+            if scope is not None:
+                history.entity = scope_entity(history.entity, scope)
+                if history.entity is None:
+                    self.task_page(history, view, status, [], 'Not in a ' + scope.lower() + '.')
+                    return
+            rows = [task_row(task) for task in history.next_page()]
+        except Exception as e:
+            self.task_page(history, view, status, [], 'Reading tasks failed: ' + error_text(e))
+            history.close()
+            return
+        more = 'no older tasks' if history.exhausted else 'scroll down for older tasks'
+        self.task_page(history, view, status, rows, str(history.read) + ' task(s) in ' + str(history.pages) +
+                       ' page(s), ' + more)
+        return
+
+    # pages of a history that was replaced or closed are dropped
+    @mainthread
+    def task_page(self, history: TaskHistory, view, status, rows: list, message: str):
+        if history is not self.task_history:
+            return
+        self.task_loading = False
+        view.data.extend([{'cells': row} for row in rows])
+        status.text = message
+        return
+
+    # the collector is destroyed off the UI thread once a page being read is done
+    def stop_task_history(self):
+        history = self.task_history
+        self.task_history = None
+        self.task_loading = False
+        if history is not None:
+            Thread(target=history.close, daemon=True).start()
         return
 
     def power_off_vm(self):
-        res = poweroff_vm(self.vm_object)
-        if res:
-            pop = Popup(title="Info", content=Label(text='Power Off Sent'), size_hint=(.2, .2))
-            pop.open()
+        self.report_task(poweroff_vm(self.vm_object), 'Power off', 'VM not found.')
         return
 
     def rename_vm(self):
@@ -293,8 +658,8 @@ class MainTabs(TabbedPanel):
         bl.add_widget(ti)
 
         def rn(instance):
-            rename_obj(self.vm_object, ti.text, self.dataset)
             mv.dismiss()
+            self.report_task(rename_obj(self.vm_object, ti.text), 'Rename')
             return
 
         b = Button(text='Rename')
@@ -302,14 +667,10 @@ class MainTabs(TabbedPanel):
         mv.add_widget(bl)
         b.bind(on_release=rn)
         mv.open()
-        p = Popup(title='Info', content=Label(text="Rename task sent."), size_hint=(.2, .2))
-        p.open()
         return
 
     def promote_vm(self):
-        promote_clone(vmobj=self.vm_object)
-        p = Popup(title='Info', content=Label(text="Promote task sent."), size_hint=(.2, .2))
-        p.open()
+        self.report_task(promote_clone(vmobj=self.vm_object), 'Promote')
         return
 
     def clone_vm(self):
@@ -320,8 +681,8 @@ class MainTabs(TabbedPanel):
         bl.add_widget(ti)
 
         def clone(instance):
-            clone_vm(self.vm_object, ti.text)
             mv.dismiss()
+            self.report_task(clone_vm(self.vm_object, ti.text), 'Clone')
             return
 
         b = Button(text='Clone')
@@ -329,8 +690,6 @@ class MainTabs(TabbedPanel):
         mv.add_widget(bl)
         b.bind(on_release=clone)
         mv.open()
-        p = Popup(title='Info', content=Label(text="Clone task sent."), size_hint=(.2, .2))
-        p.open()
         return
 
     def create_snapshot(self):
@@ -352,11 +711,10 @@ class MainTabs(TabbedPanel):
         bl.add_widget(quiesce)
 
         def cs(instance):
-            create_snapshot(snapshot_name=name.text, vm=self.vm_object, snapshot_desc=description.text,
-                            snapshot_memory=memory.active, snapshot_quiesce=quiesce.active)
+            future = create_snapshot(snapshot_name=name.text, vm=self.vm_object, snapshot_desc=description.text,
+                                     snapshot_memory=memory.active, snapshot_quiesce=quiesce.active)
             mv.dismiss()
-            p = Popup(title='Info', content=Label(text="Snapshot task sent."), size_hint=(.2, .2))
-            p.open()
+            self.report_task(future, 'Snapshot')
             return
 
         b = Button(text='Snapshot')
@@ -371,82 +729,64 @@ class MainTabs(TabbedPanel):
 
         mv = ModalView(size_hint=(.8, .8))
         bl1 = BoxLayout(orientation='vertical')
+        search = TextInput(multiline=False, size_hint_y=None, height=dp(30), hint_text='Search hosts')
+        bl1.add_widget(search)
         sv = ScrollView()
         bl1.add_widget(sv)
-        bl = BoxLayout(orientation='vertical')
+        bl = BoxLayout(orientation='vertical', size_hint_y=None)
+        bl.bind(minimum_height=bl.setter('height'))
         sv.add_widget(bl)
 
         def mig1(instance):
             self.host_object = self.dataset.hostdict.get(instance.text)
+            bl1.remove_widget(search)
             bl.clear_widgets()
             for ds in self.host_object.datastore:
                 dsdict[ds.name] = ds
-                but = Button(text=ds.name)
+                but = Button(text=ds.name, size_hint_y=None, height=dp(30))
                 but.bind(on_release=mig2)
                 bl.add_widget(but)
-        # add hosts
-        for host_name in sorted(list(self.dataset.hostdict.keys())):
-            b = Button(text=host_name)
-            b.bind(on_release=mig1)
-            bl.add_widget(b)
+
+        # add hosts matching the search, looked up in the host list index. A VM can only move within its own
+        # vCenter, so hosts of the others are left out.
+        source = self.dataset.source_of(self.vm_object)
+
+        def show_hosts(instance, text):
+            bl.clear_widgets()
+            for host_name in sorted(self.host_list.index.search(text), key=str.lower):
+                hostobj = self.dataset.hostdict.get(host_name)
+                if hostobj is None or self.dataset.source_of(hostobj) is not source:
+                    continue
+                b = Button(text=host_name, size_hint_y=None, height=dp(30))
+                b.bind(on_release=mig1)
+                bl.add_widget(b)
+
+        search.bind(text=show_hosts)
+        show_hosts(search, '')
         mv.add_widget(bl1)
         mv.open()
 
         def mig2(instance):
-            migrate_vm(vmobj=self.vm_object, hostobj=self.host_object, dsobj=dsdict.get(instance.text))
+            future = migrate_vm(vmobj=self.vm_object, hostobj=self.host_object, dsobj=dsdict.get(instance.text))
             mv.dismiss()
+            self.report_task(future, 'Migrate')
         return
 
     def linked_clone(self):
-        res = make_linked_clone(vmobj=self.vm_object)
-        if res:
-            p = Popup(title='Info', content=Label(text="Linked Clone task sent."), size_hint=(.2, .2))
-            p.open()
+        self.report_task(make_linked_clone(vmobj=self.vm_object), 'Linked Clone', 'No Snapshot Found.')
         return
 
     def delete_vm(self):
-        res = delete_vm(vmobj=self.vm_object)
-        if res:
-            p = Popup(title='Info', content=Label(text="Delete task sent."), size_hint=(.2, .2))
-            p.open()
+        self.report_task(delete_vm(vmobj=self.vm_object), 'Delete')
         return
 
     def instant_clone(self):
-        res = make_instant_clone(vmobj=self.vm_object)
-        if res:
-            p = Popup(title='Info', content=Label(text="Instant Clone task sent."), size_hint=(.2, .2))
-            p.open()
+        self.report_task(make_instant_clone(vmobj=self.vm_object), 'Instant Clone')
         return
 
     def freeze_vm(self):
-        # define script object
-        class FreezeScript:
-            def __init__(self):
-                self.script_file_name = ''
-                self.script_content = r''
-
-        # instantiate script objects
-        windows_reboot_script = FreezeScript()
-        windows_fast_script = FreezeScript()
-        linbsd_reboot_script = FreezeScript()
-
-        # define scripts
-        windows_reboot_script.script_file_name = "freeze.bat"
-        windows_reboot_script.script_content = r'"C:\Program Files\VMware\VMware Tools\rpctool.exe" "instantclone.freeze" && shutdown /r /t 001'
-        windows_fast_script.script_file_name = 'fast-freeze.ps1'
-        windows_fast_script.script_content = r'cd "C:\Program Files\VMware\VMware Tools"; .\rpctool.exe "instantclone.freeze"; ping 127.0.0.1; Get-NetAdapter | Enable-NetAdapter; shutdown /l > output'
-        linbsd_reboot_script.script_file_name = 'freeze.sh'
-        linbsd_reboot_script.script_content = r'vmware-rpctool "instantclone.freeze" && init 6'
-
-        # define script dictionary
-        script_dictionary = {
-            "Windows Restart Script": windows_reboot_script,
-            "Windows Fast Script": windows_fast_script,
-            "Linux/BSD Restart Script": linbsd_reboot_script
-        }
-
         # define widgets
-        mv = ModalView(size_hint=(.4, .5))
+        mv = ModalView(size_hint=(.4, .6))
         bl = BoxLayout(orientation='vertical')
         dd = DropDown()
 
@@ -454,7 +794,7 @@ class MainTabs(TabbedPanel):
             dd.select(instance.text)
             return
 
-        for i in list(script_dictionary.keys()):
+        for i in list(FREEZE_SCRIPTS.keys()):
             b = Button(text=i, size_hint_y=None, height=dp(40))
             b.bind(on_release=dd_choose)
             dd.add_widget(b)
@@ -473,27 +813,34 @@ class MainTabs(TabbedPanel):
         bl.add_widget(Label(text='Password', size_hint_y=None, height=dp(40)))
         password = TextInput(multiline=False, password=True, size_hint_y=None, height=dp(40))
         bl.add_widget(password)
+        matching = self.search_matches()
+        bulk_row = BoxLayout(size_hint_y=None, height=dp(40))
+        bulk = CheckBox(size_hint_x=.2)
+        bulk_row.add_widget(bulk)
+        bulk_row.add_widget(Label(text='All ' + str(len(matching)) + ' VMs matching the search'))
+        bl.add_widget(bulk_row)
 
         def freeze_button_handler(instance) -> None:
             script_type: str = ddb.text
-            script_file_obj: FreezeScript = script_dictionary.get(script_type)
-            script_user: str = username.text
-            script_password: str = password.text
-
+            if script_type not in FREEZE_SCRIPTS:
+                return
+            mv.dismiss()
+            if bulk.active:
+                self.bulk_freeze(matching, username.text, password.text, script_type)
+                return
+            file_name, file_content = FREEZE_SCRIPTS[script_type]
             ret = freeze_vm(script_type=script_type,
-                            user=script_user,
-                            password=script_password,
-                            file_name=script_file_obj.script_file_name,
-                            file_content=script_file_obj.script_content,
+                            user=username.text,
+                            password=password.text,
+                            file_name=file_name,
+                            file_content=file_content,
                             data=self.dataset,
                             vm=self.vm_object)
             # a return value greater than 0 means success
             if ret > 0:
-                mv.dismiss()
                 p = Popup(title='Info', content=Label(text="Freeze Script Started."), size_hint=(.2, .2))
                 p.open()
             else:
-                mv.dismiss()
                 p = Popup(title='Info', content=Label(text="Freeze not started."), size_hint=(.2, .2))
                 p.open()
 
@@ -502,8 +849,371 @@ class MainTabs(TabbedPanel):
         bl.add_widget(freeze_button)
         mv.add_widget(bl)
         mv.open()
-        # handlers
+        return
+
+    # live VMs listed under the current search
+    def search_matches(self) -> list:
+        vms = [self.dataset.vmdict.get(name) for lower, name in self.vm_list.shown]
+        return [vm for vm in vms if vm is not None and self.dataset.is_live(vm)]
+
+    # freeze many VMs at once and fill a table with the outcome of each as it comes in
+    def bulk_freeze(self, vms: list, user: str, password: str, script_type: str):
+        job = BulkFreeze(data=self.dataset, user=user, password=password, script_type=script_type)
+        mv = ModalView(size_hint=(.8, .8))
+        bl = BoxLayout(orientation='vertical')
+        status = Label(text='Freezing ' + str(len(vms)) + ' VM(s), ' + str(job.workers) + ' at a time...',
+                       size_hint_y=None, height=dp(30))
+        bl.add_widget(status)
+        bl.add_widget(TableRow(cells=['VM', 'State', 'PID', 'Seconds', 'Error'], size_hint_y=None, height=dp(30)))
+        view = table_view()
+        bl.add_widget(view)
+        stop = Button(text='Stop', size_hint_y=None, height=dp(40))
+        stop.bind(on_release=lambda instance: job.stop())
+        bl.add_widget(stop)
+        bl.add_widget(Button(text='Close', size_hint_y=None, height=dp(40), on_release=mv.dismiss))
+        mv.add_widget(bl)
+        mv.open()
+        job.on_result = lambda result: self.freeze_result(view, status, len(vms), result)
+
+        def run():
+            try:
+                results = job.run(vms)
+            except Exception as e:
+                self.freeze_failed(status, error_text(e))
+                return
+            self.freeze_done(status, summarize(results))
+            return
+        Thread(target=run, daemon=True).start()
+        return
+
+    @mainthread
+    def freeze_result(self, view, status, total: int, result: FreezeResult):
+        view.data.append({'cells': [result.vm, result.state, str(result.pid or ''), str(round(result.seconds)),
+                                    result.error or '']})
+        status.text = str(len(view.data)) + ' of ' + str(total) + ' VM(s) done...'
+        return
+
+    @mainthread
+    def freeze_done(self, status, summary: dict):
+        status.text = (str(summary['ok']) + ' of ' + str(summary['total']) + ' VM(s) frozen or exited cleanly, ' +
+                       str(summary['total'] - summary['ok']) + ' failed')
+        return
+
+    @mainthread
+    def freeze_failed(self, status, error: str):
+        status.text = 'Freezing failed: ' + error
+        return
+
+    # type text with {ctrl+alt+del} style chords into the console of the selected VM or every VM matching the search
+    def type_text(self):
+        mv = ModalView(size_hint=(.5, .6))
+        bl = BoxLayout(orientation='vertical')
+        bl.add_widget(Label(text='Text to type, chords like {ctrl+alt+del} or {enter}', size_hint_y=None,
+                            height=dp(30)))
+        ti = TextInput(multiline=True)
+        bl.add_widget(ti)
+        matching = self.search_matches()
+        bulk_row = BoxLayout(size_hint_y=None, height=dp(40))
+        bulk = CheckBox(size_hint_x=.2)
+        bulk_row.add_widget(bulk)
+        bulk_row.add_widget(Label(text='All ' + str(len(matching)) + ' VMs matching the search'))
+        bl.add_widget(bulk_row)
+
+        def send(instance):
+            vms = matching if bulk.active else [self.vm_object]
+            if not vms or vms[0] is None:
+                return
+            try:
+                typer = ConsoleTyper(data=self.dataset, text=ti.text)
+            except ValueError as e:
+                self.status_bar = str(e)
+                return
+            mv.dismiss()
+            self.status_bar = 'Typing ' + str(len(typer.key_events)) + ' keys into ' + str(len(vms)) + ' VM(s)...'
+            Thread(target=lambda: self.typing_done(typer, typer.run(vms)), daemon=True).start()
+            return
+
+        b = Button(text='Type', size_hint_y=None, height=dp(40))
+        b.bind(on_release=send)
+        bl.add_widget(b)
+        mv.add_widget(bl)
+        mv.open()
+        return
+
+    @mainthread
+    def typing_done(self, typer: ConsoleTyper, results: list):
+        failed = [result for result in results if not result.ok]
+        text = ('Typed into ' + str(len(results) - len(failed)) + ' of ' + str(len(results)) + ' VM(s) at ' +
+                str(round(typer.keys_per_second(results))) + ' keys/s')
+        if failed:
+            text += '\n' + failed[0].vm + ': ' + failed[0].error
+        self.status_bar = text.splitlines()[0]
+        p = Popup(title='Info', content=Label(text=text), size_hint=(.4, .3))
+        p.open()
+        return
+
+    def select_matching(self):
+        self.vm_list.select_shown()
+        self.status_bar = str(len(self.vm_list.selected)) + ' VM(s) selected'
+        return
+
+    # live VMs in the selection
+    def selected_vms(self) -> list:
+        vms = [self.dataset.vmdict.get(name) for name in self.vm_list.selected]
+        return [vm for vm in vms if vm is not None and self.dataset.is_live(vm)]
+
+    # power operations on every selected VM, the pre-flight runs before any action can be picked
+    def bulk_power(self):
+        vms = self.selected_vms()
+        if not vms:
+            pop = Popup(title="Error", content=Label(text='Ctrl-click VMs or use Select Matching first.'),
+                        size_hint=(.3, .2))
+            pop.open()
+            return
+        job = BulkPower(data=self.dataset, vms=vms)
+        mv = ModalView(size_hint=(.8, .8))
+        bl = BoxLayout(orientation='vertical')
+        status = Label(text='Reading the state of ' + str(len(vms)) + ' VM(s)...', size_hint_y=None, height=dp(30))
+        bl.add_widget(status)
+        actions = BoxLayout(size_hint_y=None, height=dp(40), disabled=True)
+        bl.add_widget(actions)
+        bl.add_widget(TableRow(cells=['VM', 'State', 'Error'], size_hint_y=None, height=dp(30)))
+        view = table_view()
+        bl.add_widget(view)
+        bl.add_widget(Button(text='Close', size_hint_y=None, height=dp(40), on_release=mv.dismiss))
+        mv.add_widget(bl)
+        job.on_result = lambda result: self.power_result(view, result)
+
+        def run(action):
+            results = job.run(action)
+            # read the new states so the next action skips the right VMs
+            try:
+                job.preflight()
+            except Exception:
+                pass
+            self.power_done(status, actions, ACTIONS[action], results)
+            return
+
+        def start(instance, action):
+            actions.disabled = True
+            view.data = []
+            status.text = ACTIONS[action] + ' on ' + str(len(job.infos)) + ' VM(s)...'
+            Thread(target=run, args=(action,), daemon=True).start()
+            return
+
+        for action, label in ACTIONS.items():
+            b = Button(text=label)
+            b.bind(on_release=lambda instance, action=action: start(instance, action))
+            actions.add_widget(b)
+
+        def preflight():
+            try:
+                job.preflight()
+            except Exception as e:
+                self.preflight_done(status, actions, 'Pre-flight failed: ' + error_text(e), False)
+                return
+            counts = ', '.join(str(count) + ' ' + power for power, count in sorted(job.counts().items()))
+            self.preflight_done(status, actions, str(len(job.infos)) + ' VM(s): ' + counts, True)
+            return
+        mv.open()
+        Thread(target=preflight, daemon=True).start()
+        return
+
+    @mainthread
+    def preflight_done(self, status, actions, message: str, ok: bool):
+        status.text = message
+        actions.disabled = not ok
+        return
+
+    @mainthread
+    def power_result(self, view, result: PowerResult):
+        view.data.append({'cells': [result.vm, result.state, result.error or '']})
+        return
+
+    @mainthread
+    def power_done(self, status, actions, label: str, results: list):
+        failed = sum(1 for result in results if not result.ok)
+        skipped = sum(1 for result in results if result.state == 'skipped')
+        status.text = (label + ': ' + str(len(results) - failed - skipped) + ' done, ' + str(skipped) +
+                       ' skipped, ' + str(failed) + ' failed')
+        actions.disabled = False
+        return
+
+    # find every VM with snapshots across the connected vCenters, rows fill in page by page while the scan runs
+    def scan_snapshots(self):
+        if not self.dataset.connected_sources():
+            pop = Popup(title="Error", content=Label(text='Connect first.'), size_hint=(.3, .2))
+            pop.open()
+            return
+        job = SnapshotScanner(data=self.dataset)
+        infos = list()
+        mv = ModalView(size_hint=(.8, .8))
+        bl = BoxLayout(orientation='vertical')
+        status = Label(text='Scanning ' + str(len(self.dataset.vmdict)) + ' VM(s)...', size_hint_y=None,
+                       height=dp(30))
+        bl.add_widget(status)
+        sort_row = BoxLayout(size_hint_y=None, height=dp(40))
+        sort_row.add_widget(Label(text='Sort by'))
+        sort_by = Spinner(text='Size', values=list(SORT_KEYS.keys()))
+        sort_row.add_widget(sort_by)
+        bl.add_widget(sort_row)
+        bl.add_widget(TableRow(cells=list(SNAPSHOT_COLUMNS), size_hint_y=None, height=dp(30)))
+        view = table_view()
+        bl.add_widget(view)
+        stop = Button(text='Stop', size_hint_y=None, height=dp(40))
+        stop.bind(on_release=lambda instance: job.stop())
+        bl.add_widget(stop)
+        bl.add_widget(Button(text='Close', size_hint_y=None, height=dp(40), on_release=mv.dismiss))
+        mv.add_widget(bl)
+        mv.bind(on_dismiss=lambda instance: job.stop())
+        sort_by.bind(text=lambda instance, text: self.show_snapshots(view, infos, text))
+        job.on_page = lambda page, scanned: self.snapshot_page(view, status, sort_by, infos, page, scanned)
+
+        def run():
+            try:
+                found = job.run()
+            except Exception as e:
+                self.snapshots_done(status, 'Scan failed: ' + error_text(e))
+                return
+            size = sum(info.size for info in found)
+            self.snapshots_done(status, str(len(found)) + ' of ' + str(job.scanned) + ' VM(s) have snapshots, ' +
+                                str(round(size / 1073741824, 1)) + ' GB, scanned in ' + str(round(job.seconds, 1)) +
+                                ' s over ' + str(job.round_trips) + ' round trip(s)')
+            return
+        mv.open()
+        Thread(target=run, daemon=True).start()
+        return
+
+    @mainthread
+    def snapshot_page(self, view, status, sort_by, infos: list, page: list, scanned: int):
+        infos.extend(page)
+        status.text = 'Scanned ' + str(scanned) + ' VM(s), ' + str(len(infos)) + ' with snapshots...'
+        if page:
+            self.show_snapshots(view, infos, sort_by.text)
+        return
+
+    def show_snapshots(self, view, infos: list, sort_by: str):
+        now = datetime.now(timezone.utc)
+        view.data = [{'cells': info.cells(now)} for info in sort_infos(infos, sort_by)]
+        return
+
+    @mainthread
+    def snapshots_done(self, status, message: str):
+        status.text = message
+        return
+
+    # find stale linked and instant clones, list what would go and destroy it on request
+    def clone_gc(self):
+        if not self.dataset.connected_sources():
+            pop = Popup(title="Error", content=Label(text='Connect first.'), size_hint=(.3, .2))
+            pop.open()
+            return
+        mv = ModalView(size_hint=(.8, .8))
+        bl = BoxLayout(orientation='vertical')
+        options = BoxLayout(size_hint_y=None, height=dp(40))
+        options.add_widget(Label(text='Older than (days)'))
+        min_age = TextInput(text=str(DEFAULT_MIN_AGE_DAYS), multiline=False, input_filter='float')
+        options.add_widget(min_age)
+        powered_on = CheckBox(size_hint_x=.3)
+        options.add_widget(powered_on)
+        options.add_widget(Label(text='Include powered on'))
+        scan = Button(text='Dry Run')
+        options.add_widget(scan)
+        delete = Button(text='Destroy', disabled=True)
+        options.add_widget(delete)
+        bl.add_widget(options)
+        status = Label(text='Dry run lists the clones that would be destroyed.', size_hint_y=None, height=dp(30))
+        bl.add_widget(status)
+        bl.add_widget(TableRow(cells=list(CLONE_COLUMNS), size_hint_y=None, height=dp(30)))
+        view = table_view()
+        bl.add_widget(view)
+        bl.add_widget(Button(text='Close', size_hint_y=None, height=dp(40), on_release=mv.dismiss))
+        mv.add_widget(bl)
+        # the clones of the last dry run, destroy works on exactly these
+        found = dict()
+
+        # runs off the UI thread, every failure ends in gc_done so the buttons come back
+        def dry_run(job):
+            try:
+                infos = job.scan(self.vm_list.index)
+                found['job'] = job
+                found['infos'] = infos
+                summary = summarize_gc(job.run(infos, dry_run=True))
+            except Exception as e:
+                self.gc_done(status, scan, delete, 'Scan failed: ' + error_text(e), False)
+                return
+            orphans = sum(1 for info in infos if not info.parent_exists)
+            self.gc_scanned(view, infos)
+            self.gc_done(status, scan, delete, str(len(infos)) + ' clone(s), ' + str(orphans) + ' without a parent, ' +
+                         str(summary['total']) + ' to destroy freeing ' +
+                         str(round(summary['reclaimable_bytes'] / 1073741824, 1)) + ' GB', summary['total'] > 0)
+            return
+
+        def destroy(job):
+            try:
+                rows = {info.name: index for index, info in enumerate(found['infos'])}
+                job.on_result = lambda result: self.gc_result(view, rows, result)
+                summary = summarize_gc(job.run(found['infos'], dry_run=False))
+            except Exception as e:
+                self.gc_done(status, scan, delete, 'Destroying failed: ' + error_text(e), False)
+                return
+            self.gc_done(status, scan, delete, str(summary.get('destroyed', 0)) + ' clone(s) destroyed, ' +
+                         str(summary.get('failed', 0)) + ' failed, ' +
+                         str(round(summary['reclaimed_bytes'] / 1073741824, 1)) + ' GB reclaimed in ' +
+                         str(round(job.seconds, 1)) + ' s', False)
+            return
+
+        # the options are read here on the UI thread, bad input never reaches a worker
+        def start_dry_run(instance):
+            try:
+                min_age_days = float(min_age.text or '0')
+            except ValueError:
+                status.text = 'Older than must be a number of days.'
+                return
+            job = CloneGC(data=self.dataset, min_age_days=min_age_days, include_powered_on=powered_on.active)
+            start('Scanning clones...', dry_run, job)
+            return
+
+        def start_destroy(instance):
+            if 'job' not in found:
+                return
+            start('Destroying clones...', destroy, found['job'])
+            return
+
+        def start(message: str, target, job):
+            scan.disabled = True
+            delete.disabled = True
+            status.text = message
+            Thread(target=target, args=(job,), daemon=True).start()
+            return
+        scan.bind(on_release=start_dry_run)
+        delete.bind(on_release=start_destroy)
+        mv.bind(on_dismiss=lambda instance: found['job'].stop() if 'job' in found else None)
+        mv.open()
+        return
 
+    @mainthread
+    def gc_scanned(self, view, infos: list):
+        now = datetime.now(timezone.utc)
+        view.data = [{'cells': info.cells(now=now)} for info in infos]
+        return
+
+    # show the outcome of one clone in its row
+    @mainthread
+    def gc_result(self, view, rows: dict, result: GCResult):
+        index = rows.get(result.vm)
+        if index is None:
+            return
+        cells = list(view.data[index]['cells'])
+        cells[-1] = result.state if result.error is None else result.state + ': ' + result.error
+        view.data[index] = {'cells': cells}
+        return
+
+    @mainthread
+    def gc_done(self, status, scan, delete, message: str, can_destroy: bool):
+        status.text = message
+        scan.disabled = False
+        delete.disabled = not can_destroy
         return
 
     def bios_boot(self):
@@ -513,10 +1223,7 @@ class MainTabs(TabbedPanel):
         return
 
     def reset_vm(self):
-        res = reset_vm(vmobj=self.vm_object)
-        if res:
-            p = Popup(title='Info', content=Label(text="Reset task sent."), size_hint=(.2, .2))
-            p.open()
+        self.report_task(reset_vm(vmobj=self.vm_object), 'Reset')
         return
 
     def reboot_vm_guest(self):
@@ -539,11 +1246,220 @@ class MainTabs(TabbedPanel):
         p.open()
         return
 
+    # capacity of every datastore in one collection, most overcommitted first
+    def load_datastores(self):
+        if not self.dataset.connected_sources():
+            self.ids.ds_status.text = 'Connect first.'
+            return
+        self.ids.ds_status.text = 'Loading datastores...'
+        Thread(target=self.collect_datastores, daemon=True).start()
+        return
+
+    def collect_datastores(self):
+        try:
+            ranked = get_all_datastore_stats(data=self.dataset, use_cache=False)
+        except Exception as e:
+            self.show_ds_status('Loading datastores failed: ' + error_text(e))
+            return
+        self.show_datastores(ranked)
+        return
+
+    @mainthread
+    def show_ds_status(self, message: str):
+        self.ids.ds_status.text = message
+        return
+
+    @mainthread
+    def show_datastores(self, ranked: list):
+        self.ds_browser = None
+        self.ids.ds_choice.values = sorted((stats.name for stats in ranked), key=str.lower)
+        self.ids.ds_headings.cells = ['Datastore', 'Type', 'Capacity (GB)', 'Free (GB)', 'Uncommitted (GB)',
+                                      'Overcommit', 'VMs']
+        self.ids.ds_table.data = [{'cells': [stats.name, stats.type + ('' if stats.accessible else ' (offline)'),
+                                             str(round(stats.capacity / 1073741824)),
+                                             str(round(stats.free_space / 1073741824)),
+                                             str(round(stats.uncommitted / 1073741824)),
+                                             str(round(stats.overcommit() * 100)) + '%', str(stats.num_vms)]}
+                                  for stats in ranked]
+        over = sum(1 for stats in ranked if stats.overcommit() > 1)
+        self.ids.ds_status.text = str(len(ranked)) + ' datastore(s), ' + str(over) + ' overcommitted'
+        return
+
+    # list a datastore folder, or search it and every folder below it for the pattern
+    def browse_datastore(self, recursive: bool):
+        dsobj = self.dataset.datastoredict.get(self.ids.ds_choice.text)
+        if dsobj is None or not self.dataset.is_live(dsobj):
+            self.ids.ds_status.text = 'Load datastores and pick one first.'
+            return
+        patterns = [pattern for pattern in self.ids.ds_pattern.text.split() if pattern]
+        if recursive and not patterns:
+            # a search without a pattern would return every file of the datastore in one result
+            patterns = ['*.vmdk']
+            self.ids.ds_pattern.text = '*.vmdk'
+        browser = DatastoreBrowser(data=self.dataset, datastore=dsobj)
+        self.ds_browser = browser
+        self.ids.ds_headings.cells = list(FILE_COLUMNS)
+        self.ids.ds_table.data = []
+        self.ids.ds_status.text = ('Searching ' if recursive else 'Browsing ') + browser.name + '...'
+        Thread(target=self.read_datastore, args=(browser, recursive, self.ids.ds_folder.text, patterns),
+               daemon=True).start()
+        return
+
+    def read_datastore(self, browser: DatastoreBrowser, recursive: bool, folder: str, patterns: list):
+        pages = browser.search(folder, patterns) if recursive else browser.browse(folder, patterns)
+        try:
+            for page in pages:
+                # a newer browse replaced this one
+                if browser is not self.ds_browser:
+                    return
+                self.datastore_page(browser, [row.cells() for row in page], None)
+        except Exception as e:
+            self.datastore_page(browser, [], 'Reading ' + browser.name + ' failed: ' +
+                                error_text(e))
+            return
+        self.datastore_page(browser, [], str(browser.rows) + ' file(s) in ' + str(browser.folders) + ' folder(s)')
+        return
+
+    # append a page of file rows and/or show a message, pages of a replaced browse are dropped
+    @mainthread
+    def datastore_page(self, browser, rows: list, message: str):
+        if browser is not self.ds_browser:
+            return
+        if rows:
+            self.ids.ds_table.data.extend({'cells': cells} for cells in rows)
+            self.ids.ds_status.text = 'Read ' + str(len(self.ids.ds_table.data)) + ' file(s)...'
+        if message is not None:
+            self.ids.ds_status.text = message
+        return
+
+    # fill the parent choice from the portgroups already in the inventory
+    def load_portgroups(self):
+        names = [name for name, pgobj in self.dataset.dvportgroupdict.items() if self.dataset.is_live(pgobj)]
+        if not names:
+            self.ids.pg_status.text = 'Connect first.'
+            return
+        self.ids.pg_parent.values = sorted(names, key=str.lower)
+        self.ids.pg_status.text = str(len(names)) + ' portgroup(s)'
+        return
+
+    # plan portgroups cut from the chosen parent and show them, create them too when create is True
+    def plan_portgroups(self, create: bool):
+        if self.pg_busy:
+            self.ids.pg_status.text = 'Still working on the last batch.'
+            return
+        pgobj = self.dataset.dvportgroupdict.get(self.ids.pg_parent.text)
+        if pgobj is None or not self.dataset.is_live(pgobj):
+            self.ids.pg_status.text = 'Load portgroups and pick a parent first.'
+            return
+        try:
+            count = int(self.ids.pg_count.text or '1')
+            vlan_start = int(self.ids.pg_vlan_start.text) if self.ids.pg_vlan_start.text else None
+            vlan_step = int(self.ids.pg_vlan_step.text or '1')
+        except ValueError:
+            self.ids.pg_status.text = 'Count, VLAN start and VLAN step must be whole numbers.'
+            return
+        if count < 1:
+            self.ids.pg_status.text = 'Count must be at least 1.'
+            return
+        pattern = self.ids.pg_pattern.text or DEFAULT_NAME_PATTERN
+        batch = not self.ids.pg_single.active
+        self.pg_busy = True
+        self.ids.pg_status.text = 'Planning ' + str(count) + ' portgroup(s)...'
+        Thread(target=self.build_portgroups, args=(pgobj, count, pattern, vlan_start, vlan_step, create, batch),
+               daemon=True).start()
+        return
+
+    def build_portgroups(self, pgobj, count: int, pattern: str, vlan_start: int, vlan_step: int, create: bool,
+                         batch: bool):
+        builder = PortgroupBuilder(data=self.dataset, on_progress=self.portgroup_progress)
+        try:
+            plans = builder.plan(parent=pgobj, count=count, name_pattern=pattern, vlan_start=vlan_start,
+                                 vlan_step=vlan_step)
+        except Exception as e:
+            self.portgroups_done(None, 'Planning failed: ' + error_text(e))
+            return
+        self.show_portgroup_plans(plans, 'planned' if not create else 'sending')
+        if not create:
+            self.portgroups_done(None, str(len(plans)) + ' portgroup(s) planned, Create sends them as ' +
+                                 str(len({self.dataset.key_of(plan.switch) for plan in plans})) +
+                                 ' task(s) instead of ' + str(len(plans)))
+            return
+        try:
+            report = builder.create(plans, batch=batch)
+        except Exception as e:
+            self.portgroups_done(None, 'Creating failed: ' + error_text(e))
+            return
+        self.portgroups_done(report, None)
+        return
+
+    @mainthread
+    def show_portgroup_plans(self, plans: list, status: str):
+        self.ids.pg_headings.cells = list(PLAN_COLUMNS)
+        self.ids.pg_table.data = [{'cells': plan.cells(status)} for plan in plans]
+        self.pg_rows = {plan.name: index for index, plan in enumerate(plans)}
+        return
+
+    # mark one portgroup created or failed as its task finishes
+    @mainthread
+    def portgroup_progress(self, plan, error: str):
+        index = self.pg_rows.get(plan.name)
+        if index is None:
+            return
+        self.ids.pg_table.data[index] = {'cells': plan.cells('created' if error is None else 'failed: ' + error)}
+        return
+
+    @mainthread
+    def portgroups_done(self, report: BuildReport, message: str):
+        self.pg_busy = False
+        if report is not None:
+            other = self.pg_reports.get('single' if report.mode == 'batch' else 'batch')
+            self.pg_reports[report.mode] = report
+            message = compare_text(report, other)
+        self.ids.pg_status.text = message
+        return
+
+    # restart whatever has stopped of the inventory syncs and event watchers of some vCenters, runs off the UI thread
+    def resync(self, sources: list):
+        with ThreadPoolExecutor(max_workers=len(sources)) as executor:
+            errors = [error for error in executor.map(self.restart_source, sources) if error is not None]
+        self.save_inventory()
+        self.connect_done(errors)
+        self.refresh_done(errors)
+        return
+
+    # a vCenter whose inventory sync still runs only gets a new event watcher, one whose sync has died pages its
+    # inventory in again. Returns an error message or None.
+    def restart_source(self, source: Source) -> str:
+        if source.sync is None or source.sync.is_alive():
+            self.watch_events(source)
+            return None
+        source.sync.stop()
+        return self.load_sync(source)
+
     def refresh_list(self):
-        self.disconnect()
-        self.start_connect()
-        self.build_lists()
-        p = Popup(title='Info', content=Label(text="List Refreshed."), size_hint=(.2, .2))
+        if self.connecting:
+            return
+        # the sync threads apply changes as they happen, only restart the ones that have stopped
+        stopped = [source for source in self.dataset.connected_sources()
+                   if (source.sync is not None and not source.sync.is_alive()) or
+                   (source.events is not None and not source.events.is_alive())]
+        if not stopped:
+            self.refresh_done(list())
+            return
+        self.connecting = True
+        self.expected_objects = len(self.dataset.moiddict)
+        self.seen = dict()
+        Thread(target=self.resync, args=(stopped,), daemon=True).start()
+        return
+
+    # say the lists are current once the restarted syncs have caught up, or why they could not be restarted
+    @mainthread
+    def refresh_done(self, errors: list):
+        if errors:
+            p = Popup(title='Error', content=Label(text='\n'.join(errors), text_size=(dp(280), None)),
+                      size_hint=(.4, .3))
+        else:
+            p = Popup(title='Info', content=Label(text="List Refreshed."), size_hint=(.2, .2))
         p.open()
         return
 
@@ -556,6 +1472,9 @@ class VmtoolKivy(App):
         super().__init__(**kwargs)
         self.dataset = data
 
+    def on_stop(self):
+        self.root.save_inventory()
+
 
 def main():
     datatree = DataTree.get_instance()